@@ -14,43 +14,22 @@ from kivy.uix.scrollview import ScrollView
 from kivy.clock import Clock
 from kivy.uix.tabbedpanel import TabbedPanel, TabbedPanelItem
 from kivy.uix.spinner import Spinner
+import os
 import time
 import json
 import logging
+from collections import deque
 from datetime import datetime
 
-# 按优先级尝试导入传感器模块
-SENSOR_TYPE = None
-sensor_module = None
-
-# 首先尝试导入蓝牙传感器（最高优先级）
-try:
-    from sleep_monitor.sensors.bluetooth_sensor import BluetoothSensor
-    SENSOR_TYPE = 'bluetooth'
-    sensor_module = BluetoothSensor
-    print("蓝牙传感器模块已加载")
-except ImportError as e:
-    print(f"蓝牙传感器模块不可用: {e}")
-
-# 如果蓝牙不可用，尝试硬件传感器
-if SENSOR_TYPE is None:
-    try:
-        from sleep_monitor.sensors.hardware_sensor import HardwareSensor
-        SENSOR_TYPE = 'hardware'
-        sensor_module = HardwareSensor
-        print("硬件传感器模块已加载")
-    except ImportError as e:
-        print(f"硬件传感器模块不可用: {e}")
-
-# 如果都不行，使用模拟器
-if SENSOR_TYPE is None:
-    from sleep_monitor.sensors.sensor_simulator import SensorSimulator
-    SENSOR_TYPE = 'simulation'
-    sensor_module = SensorSimulator
-    print("使用传感器模拟器")
-
 from sleep_monitor.sleep_analysis.sleep_stage_detector import SleepStageDetector
+from sleep_monitor.sleep_analysis.resampler import create_resampler
 from sleep_monitor.alarm.smart_alarm import SmartAlarm
+from sleep_monitor.sensors.acquisition_worker import AcquisitionWorker
+from sleep_monitor.sensors.sampling_scheduler import SamplingScheduler
+from sleep_monitor.sensors.registry import create_sensor
+from sleep_monitor.utils.data_logger import DataLogger
+from sleep_monitor.utils.config_service import ConfigService
+from sleep_monitor.utils.time_utils import sample_timestamp
 
 # 配置日志
 logging.basicConfig(
@@ -59,6 +38,13 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 界面中保留的最近样本数
+LIVE_BUFFER_SIZE = 600
+# 每积累多少条样本写入一次磁盘
+SPILL_BATCH_SIZE = 60
+# 睡眠阶段历史显示的条数
+HISTORY_LINES = 10
+
 class SleepMonitorApp(App):
     def build(self):
         self.title = '红米手环2智能睡眠监测系统'
@@ -69,61 +55,42 @@ class SleepMonitorApp(App):
         # 初始化组件
         self.init_system()
         
+        # 监视配置文件的变化
+        self.config_service.start_watching()
+        
         # 创建主界面
         return self.create_main_layout()
     
     def load_config(self):
-        """加载配置文件"""
-        import os
-        from pathlib import Path
-        
-        # 首先尝试在当前目录查找
-        config_paths = [
-            'config.json',  # 当前目录
-            os.path.join(os.path.dirname(__file__), 'config.json'),  # sleep_monitor目录
-        ]
-        
-        for config_path in config_paths:
-            try:
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    logger.info(f"成功加载配置文件: {config_path}")
-                    return json.load(f)
-            except FileNotFoundError:
-                continue
-        
-        logger.warning("配置文件 config.json 未找到，使用默认配置")
-        return {
-            "sleep_detection": {
-                "sampling_rate": 60,  # 采样率（秒）
-                "deep_sleep_hr_threshold": 60,  # 深度睡眠心率阈值
-                "light_sleep_hr_threshold": 70,  # 浅度睡眠心率阈值
-                "movement_threshold": 5  # 体动阈值
-            },
-            "alarm_settings": {
-                "wake_time": "07:00",  # 默认唤醒时间
-                "alarm_window": 30,  # 唤醒时间窗口（分钟）
-                "alarm_duration": 5  # 闹钟持续时间（分钟）
-            }
-        }
+        """加载配置（由配置服务解析和校验，返回不可修改的快照）"""
+        if getattr(self, 'config_service', None) is None:
+            # 首先在当前目录查找，其次是程序所在目录
+            self.config_service = ConfigService([
+                'config.json',
+                os.path.join(os.path.dirname(__file__), 'config.json')
+            ])
+            self.config_service.subscribe(self.on_config_changed)
+        else:
+            self.config_service.reload(force=True)
+        return self.config_service.get()
+    
+    def on_config_changed(self, config):
+        """配置变化时（配置文件被修改或在界面中保存），阈值和唤醒设置直接更新到当前的检测器和闹钟"""
+        self.config = config
+        if getattr(self, 'sleep_detector', None) is not None:
+            self.sleep_detector.apply_config(config)
+        if getattr(self, 'smart_alarm', None) is not None:
+            self.smart_alarm.apply_config(config)
     
     def init_system(self):
         """初始化系统组件"""
-        # 根据配置决定使用哪种传感器
-        device_settings = self.config.get('device_settings', {})
-        preferred_sensor_type = device_settings.get('sensor_type', 'bluetooth')  # 默认使用蓝牙
-        
-        logger.info(f"使用传感器类型: {SENSOR_TYPE} (配置要求: {preferred_sensor_type})")
-        
-        # 初始化传感器（按优先级选择，但优先满足配置要求）
-        if SENSOR_TYPE == 'bluetooth' and preferred_sensor_type in ['bluetooth', 'auto']:
-            logger.info("初始化蓝牙传感器")
-            self.sensor = BluetoothSensor(self.config)
-        elif SENSOR_TYPE == 'hardware' and preferred_sensor_type in ['hardware', 'api', 'auto']:
-            logger.info("初始化硬件传感器")
-            self.sensor = HardwareSensor(self.config)
-        else:
-            logger.info("初始化传感器模拟器")
-            self.sensor = SensorSimulator(self.config)
+        # 重新初始化时先停止旧的采集线程，并保存尚未写入磁盘的数据
+        if getattr(self, 'acquisition_worker', None) is not None:
+            self.acquisition_worker.stop()
+            self.spill_sleep_data()
+        
+        # 根据配置的名称加载传感器后端，只导入需要的模块
+        self.sensor = create_sensor(self.config)
         
         self.sleep_detector = SleepStageDetector(self.config)
         self.smart_alarm = SmartAlarm(self.config)
@@ -131,7 +98,63 @@ class SleepMonitorApp(App):
         # 用于更新界面的变量
         self.current_sensor_data = {}
         self.current_sleep_stage = "未知"
-        self.sleep_data = []
+        self.current_device_info = {}
+        self.rendered_sequence = 0
+        
+        # 界面只保留最近的样本，较早的样本分批写入磁盘，整夜内存占用保持不变
+        self.sleep_data = deque(maxlen=LIVE_BUFFER_SIZE)
+        self.pending_spill = []
+        self.data_logger = DataLogger(os.path.join(self.user_data_dir, 'data'))
+        
+        # 睡眠阶段历史在记录样本时格式化，刷新时只拼接最近几行
+        self.history_lines = deque(maxlen=HISTORY_LINES)
+        self.history_dirty = False
+        
+        # 传感器读取和睡眠检测在后台线程中进行，避免阻塞界面
+        # 采样间隔由调度器根据睡眠状态、唤醒窗口和电池预算调整
+        self.sampling_scheduler = SamplingScheduler(self.config)
+        self.acquisition_worker = AcquisitionWorker(
+            self.sensor, self.sleep_detector, self.smart_alarm,
+            interval=self.sampling_scheduler.current_interval, on_alarm=self.request_alarm,
+            scheduler=self.sampling_scheduler,
+            skip_non_real=self.config.get('device_settings', {}).get('skip_non_real_samples', False),
+            resampler=create_resampler(self.config)
+        )
+        self.acquisition_worker.start()
+    
+    def on_stop(self):
+        """应用退出时停止采集线程并保存数据"""
+        self.acquisition_worker.stop(timeout=2)
+        self.config_service.stop_watching(timeout=2)
+        self.spill_sleep_data()
+    
+    def record_sleep_data(self, record):
+        """记录一条睡眠数据"""
+        self.sleep_data.append(record)
+        self.pending_spill.append(record)
+        if len(self.pending_spill) >= SPILL_BATCH_SIZE:
+            self.spill_sleep_data()
+        
+        # ISO时间戳的时间部分为第11到19个字符
+        self.history_lines.append(
+            f"{record['timestamp'][11:19]} - {record['sleep_stage']} (HR: {record['heart_rate']})\n")
+        self.history_dirty = True
+    
+    def spill_sleep_data(self):
+        """将尚未保存的样本追加写入磁盘"""
+        if not self.pending_spill:
+            return
+        try:
+            self.data_logger.append_sleep_data(self.pending_spill)
+            self.pending_spill = []
+        except OSError as e:
+            logger.error(f"保存睡眠数据失败: {e}")
+            # 写入失败时只保留最近一批，避免内存持续增长
+            del self.pending_spill[:-SPILL_BATCH_SIZE]
+    
+    def request_alarm(self):
+        """采集线程请求唤醒，切换到界面线程触发闹钟"""
+        Clock.schedule_once(self.trigger_alarm)
     
     def create_main_layout(self):
         """创建主界面布局"""
@@ -303,40 +326,45 @@ class SleepMonitorApp(App):
         return layout
     
     def update_status(self, dt):
-        """更新状态显示"""
+        """更新状态显示（显示最新快照，记录自上次刷新以来采集的全部样本）"""
+        snapshots = self.acquisition_worker.drain()
+        if not snapshots:
+            return
+        snapshot = snapshots[-1]
+        
         try:
-            # 获取传感器数据
-            sensor_data = self.sensor.get_sensor_data()
+            self.rendered_sequence = snapshot['sequence']
+            sensor_data = snapshot['sensor_data']
+            sleep_stage = snapshot['sleep_stage']
+            device_info = snapshot['device_info']
             self.current_sensor_data = sensor_data
-            
-            # 检测睡眠阶段
-            sleep_stage = self.sleep_detector.detect_stage(sensor_data)
             self.current_sleep_stage = sleep_stage
+            self.current_device_info = device_info
             
             # 更新UI
             self.status_label.text = f'系统状态: 运行中'
-            device_info = self.sensor.get_device_info()
             device_name = device_info.get("device_name", device_info.get("name", "未知设备"))
             self.sensor_status_label.text = f'传感器状态: 已连接 - {device_name}'
             self.sleep_stage_label.text = f'当前睡眠阶段: {sleep_stage}'
             self.heart_rate_label.text = f'心率: {sensor_data["heart_rate"]} BPM'
             self.movement_label.text = f'体动: {sensor_data["movement"]}'
             
-            # 记录睡眠数据
-            self.sleep_data.append({
-                'timestamp': datetime.now().isoformat(),
-                'heart_rate': sensor_data['heart_rate'],
-                'movement': sensor_data['movement'],
-                'sleep_stage': sleep_stage
-            })
-            
-            # 检查是否需要唤醒
-            current_time = datetime.now()
-            if self.smart_alarm.should_wake_up(sleep_stage, current_time):
-                self.trigger_alarm(None)
-                
         except Exception as e:
             logger.error(f"更新状态时出错: {e}")
+        
+        # 记录睡眠数据（两次刷新之间采集的样本全部记录）
+        for item in snapshots:
+            try:
+                item_data = item['sensor_data']
+                self.record_sleep_data({
+                    'timestamp': sample_timestamp(item_data),
+                    'heart_rate': item_data['heart_rate'],
+                    'movement': item_data['movement'],
+                    'sleep_stage': item['sleep_stage'],
+                    'provenance': item_data.get('provenance', 'real')
+                })
+            except Exception as e:
+                logger.error(f"记录睡眠数据时出错: {e}")
     
     def start_monitoring(self, instance):
         """开始监测"""
@@ -354,33 +382,32 @@ class SleepMonitorApp(App):
         """刷新监测数据"""
         # 更新监测数据显示
         if self.current_sensor_data:
-            data_str = f"时间: {self.current_sensor_data.get('timestamp', '未知')}\n"
+            data_str = f"时间: {sample_timestamp(self.current_sensor_data)}\n"
             data_str += f"心率: {self.current_sensor_data.get('heart_rate', '未知')} BPM\n"
             data_str += f"体动: {self.current_sensor_data.get('movement', '未知')}\n"
             data_str += f"睡眠阶段: {self.current_sleep_stage}\n"
-            data_str += f"设备信息: {self.sensor.get_device_info()}"
+            data_str += f"设备信息: {self.current_device_info}"
             self.monitor_data_label.text = data_str
         
-        # 更新睡眠历史
-        if self.sleep_data:
-            history_str = "睡眠阶段历史:\n"
-            # 显示最近10个数据点
-            recent_data = self.sleep_data[-10:]
-            for data in recent_data:
-                history_str += f"{data['timestamp'].split('T')[1][:8]} - {data['sleep_stage']} (HR: {data['heart_rate']})\n"
-            self.sleep_history_label.text = history_str
+        # 更新睡眠历史，只有新样本到达后才重新拼接
+        if self.history_dirty:
+            self.sleep_history_label.text = "睡眠阶段历史:\n" + ''.join(self.history_lines)
+            self.history_dirty = False
     
     def save_config(self, instance):
         """保存配置"""
         try:
-            # 更新配置
-            self.config['sleep_detection']['sampling_rate'] = int(self.sampling_rate_input.text)
-            self.config['sleep_detection']['deep_sleep_hr_threshold'] = int(self.deep_sleep_threshold_input.text)
-            self.config['sleep_detection']['light_sleep_hr_threshold'] = int(self.light_sleep_threshold_input.text)
-            self.config['sleep_detection']['movement_threshold'] = float(self.movement_threshold_input.text)
+            # 更新配置，校验通过后阈值由配置服务直接更新到检测器（保留窗口数据）
+            self.config_service.update({'sleep_detection': {
+                'sampling_rate': int(self.sampling_rate_input.text),
+                'deep_sleep_hr_threshold': int(self.deep_sleep_threshold_input.text),
+                'light_sleep_hr_threshold': int(self.light_sleep_threshold_input.text),
+                'movement_threshold': float(self.movement_threshold_input.text)
+            }})
             
-            # 重新初始化睡眠检测器
-            self.sleep_detector = SleepStageDetector(self.config)
+            # 重新初始化采样调度器
+            self.sampling_scheduler = SamplingScheduler(self.config)
+            self.acquisition_worker.scheduler = self.sampling_scheduler
             
             # 显示成功消息
             popup = Popup(title='配置保存',
@@ -397,6 +424,7 @@ class SleepMonitorApp(App):
     def load_config_from_file(self, instance):
         """从文件加载配置"""
         try:
+            previous = self.config
             self.config = self.load_config()
             
             # 更新界面显示
@@ -405,8 +433,9 @@ class SleepMonitorApp(App):
             self.light_sleep_threshold_input.text = str(self.config['sleep_detection']['light_sleep_hr_threshold'])
             self.movement_threshold_input.text = str(self.config['sleep_detection']['movement_threshold'])
             
-            # 重新初始化
-            self.init_system()
+            # 阈值和唤醒设置已直接更新，只有设备设置变化时才重新初始化
+            if self.config['device_settings'] != previous['device_settings']:
+                self.init_system()
             
             popup = Popup(title='配置加载',
                          content=Label(text='配置已从文件重新加载'),
@@ -432,12 +461,16 @@ class SleepMonitorApp(App):
     def save_alarm_config(self, instance):
         """保存闹钟配置"""
         try:
-            self.config['alarm_settings']['wake_time'] = self.wake_time_input.text
-            self.config['alarm_settings']['alarm_window'] = int(self.alarm_window_input.text)
-            self.config['alarm_settings']['alarm_duration'] = int(self.alarm_duration_input.text)
+            # 更新配置，校验通过后唤醒设置由配置服务直接更新到闹钟
+            self.config_service.update({'alarm_settings': {
+                'wake_time': self.wake_time_input.text,
+                'alarm_window': int(self.alarm_window_input.text),
+                'alarm_duration': int(self.alarm_duration_input.text)
+            }})
             
-            # 重新初始化闹钟
-            self.smart_alarm = SmartAlarm(self.config)
+            # 重新启用闹钟
+            self.smart_alarm.alarm_triggered = False
+            self.acquisition_worker.alarm_requested = False
             
             popup = Popup(title='闹钟配置保存',
                          content=Label(text='闹钟配置已成功保存'),
@@ -10,12 +10,16 @@ setup(
         "Flask==2.3.3",
         "PyBluez==0.23",
         "requests==2.31.0",
+        "numpy==1.26.4",
     ],
     entry_points={
         'console_scripts': [
             'sleep-monitor=sleep_monitor.main:main',
             'sleep-monitor-api=sleep_monitor.run_api:main',
+            'sleep-monitor-reprocess=sleep_monitor.reprocess:main',
+            'sleep-monitor-benchmark=sleep_monitor.benchmark:main',
+            'sleep-monitor-calibrate=sleep_monitor.calibrate:main',
         ],
     },
-    python_requires='>=3.6',
+    python_requires='>=3.9',
 )
\ No newline at end of file
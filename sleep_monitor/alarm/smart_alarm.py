@@ -28,12 +28,16 @@ class SmartAlarm:
         self.sleep_start_time = None
         self.light_sleep_start_time = None
     
-    def _parse_time_string(self, time_str):
-        """解析时间字符串（HH:MM格式）"""
+    def _parse_time_string(self, time_str, reference_time=None):
+        """
+        解析时间字符串（HH:MM格式）
+        :param time_str: 时间字符串
+        :param reference_time: 参考时间，返回其之后最近的该时刻，默认为当前时间
+        """
+        now = reference_time or datetime.now()
         try:
             hour, minute = map(int, time_str.split(':'))
             # 创建今天的时间对象
-            now = datetime.now()
             target_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
             
             # 如果目标时间已过今天，则设置为明天
@@ -43,9 +47,17 @@ class SmartAlarm:
             return target_time
         except ValueError:
             logger.error(f"时间格式错误: {time_str}，使用默认时间")
-            now = datetime.now()
             return now.replace(hour=7, minute=0, second=0, microsecond=0) + timedelta(days=1)
     
+    def is_in_wake_window(self, current_time):
+        """
+        判断是否处于唤醒时间窗口内
+        :param current_time: 当前时间
+        :return: 是否在唤醒窗口内
+        """
+        window_start = self.wake_time - timedelta(minutes=self.alarm_window)
+        return window_start <= current_time <= self.wake_time
+    
     def should_wake_up(self, sleep_stage, current_time):
         """
         判断是否应该唤醒用户
@@ -53,12 +65,8 @@ class SmartAlarm:
         :param current_time: 当前时间
         :return: 是否应该唤醒
         """
-        # 计算唤醒时间窗口
-        window_start = self.wake_time - timedelta(minutes=self.alarm_window)
-        window_end = self.wake_time
-        
         # 检查是否在唤醒时间窗口内
-        if not (window_start <= current_time <= window_end):
+        if not self.is_in_wake_window(current_time):
             return False
         
         # 检查当前睡眠阶段
@@ -139,7 +147,24 @@ class SmartAlarm:
             'current_time': datetime.now().strftime('%H:%M:%S')
         }
     
-    def update_wake_time(self, new_time_str):
-        """更新唤醒时间"""
-        self.wake_time = self._parse_time_string(new_time_str)
+    def apply_config(self, config):
+        """
+        应用新的配置（配置服务在配置变化时调用），保留睡眠开始时间和闹钟触发状态
+        :param config: 配置参数
+        """
+        alarm_settings = config['alarm_settings']
+        if alarm_settings['wake_time'] != self.alarm_settings['wake_time']:
+            self.update_wake_time(alarm_settings['wake_time'])
+        self.alarm_window = alarm_settings['alarm_window']
+        self.alarm_duration = alarm_settings['alarm_duration']
+        self.alarm_settings = alarm_settings
+        self.config = config
+    
+    def update_wake_time(self, new_time_str, reference_time=None):
+        """
+        更新唤醒时间
+        :param new_time_str: 唤醒时间（HH:MM格式）
+        :param reference_time: 参考时间（如回放数据的入睡时间），默认为当前时间
+        """
+        self.wake_time = self._parse_time_string(new_time_str, reference_time)
         logger.info(f"唤醒时间已更新为: {new_time_str}")
\ No newline at end of file
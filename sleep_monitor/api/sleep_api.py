@@ -3,12 +3,19 @@
 
 提供与小米运动健康App或设备同步的接口
 """
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, request, jsonify, render_template_string, g, Response, stream_with_context
 import json
 import logging
+import time
 from datetime import datetime, timedelta
 import os
 import importlib
+import threading
+
+from ..utils import metrics
+from ..utils.config_service import get_config_service, thaw
+from ..utils.event_bus import EventBus
+from ..utils.time_utils import epoch_ms_to_iso, iso_to_epoch_ms, sample_timestamp, with_timestamp
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -21,62 +28,130 @@ sensor = None
 detector = None
 alarm = None
 config = None
+_config_subscription = None
+
+# 最新样本缓存，心率、体动、传感器数据等接口共享同一次传感器读取
+sample_cache = None
+_sample_cache_lock = threading.Lock()
+_detected_sample = (None, None)  # (已检测的缓存样本, 睡眠阶段)
+_detect_lock = threading.Lock()
+
+# 按设备的检测器（使用设备的校准档案），第一次使用时创建
+detectors = None
+_detectors_lock = threading.Lock()
+
+# 异常检测：每个检测的样本都进入异常检测，事件发布到事件总线，由 /api/events 推送
+event_bus = EventBus()
+anomalies = None
+
+# 推送连接没有事件时发送保活注释的间隔（秒）
+EVENT_KEEPALIVE = 15
+
+# 请求指标，endpoint使用路由规则而不是实际路径，避免标签数量无限增长
+_REQUEST_SECONDS = metrics.histogram('http_request_duration_seconds', 'API请求处理耗时（秒）', ('endpoint', 'method'))
+_REQUESTS = metrics.counter('http_requests_total', 'API请求次数', ('endpoint', 'method', 'status'))
+
+
+@app.before_request
+def _start_request_timer():
+    """记录请求开始时间"""
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _record_request_metrics(response):
+    """记录请求耗时和状态码"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        _REQUEST_SECONDS.labels(endpoint, request.method).observe(time.perf_counter() - started)
+        _REQUESTS.labels(endpoint, request.method, response.status_code).inc()
+    return response
+
+
+@app.route('/metrics')
+def get_metrics():
+    """以Prometheus文本格式导出运行指标"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 
 def init_system():
     """初始化系统组件"""
-    global sensor, detector, alarm, config
+    global sensor, detector, alarm, config, anomalies
     
-    # 加载配置
-    try:
-        with open('config.json', 'r', encoding='utf-8') as f:
-            config = json.load(f)
-    except FileNotFoundError:
-        logger.warning("配置文件 config.json 未找到，使用默认配置")
-        config = {
-            "sleep_detection": {
-                "sampling_rate": 60,
-                "deep_sleep_hr_threshold": 60,
-                "light_sleep_hr_threshold": 70,
-                "movement_threshold": 5
-            },
-            "alarm_settings": {
-                "wake_time": "07:00",
-                "alarm_window": 30,
-                "alarm_duration": 5
-            },
-            "device_settings": {
-                "device_model": "Redmi Band 2",
-                "max_battery_usage": 20,
-                "data_sync_interval": 300,
-                "api_base_url": "http://localhost:5000/api",
-                "access_token": "",
-                "device_id": "",
-                "bluetooth_address": "",
-                "device_name": "Redmi Band 2",
-                "sensor_type": "bluetooth"
-            }
-        }
+    # 配置由配置服务加载和校验，配置文件变化时阈值和唤醒设置直接更新到检测器和闹钟
+    config_service = get_config_service()
+    config = config_service.get()
     
-    # 根据配置决定使用哪种传感器
-    device_settings = config.get('device_settings', {})
-    preferred_sensor_type = device_settings.get('sensor_type', 'bluetooth')
-    
-    # 动态导入传感器模块 - 使用相对导入
-    if preferred_sensor_type == 'bluetooth':
-        from ..sensors.bluetooth_sensor import BluetoothSensor
-        sensor = BluetoothSensor(config)
-    elif preferred_sensor_type == 'hardware':
-        from ..sensors.hardware_sensor import HardwareSensor
-        sensor = HardwareSensor(config)
-    else:  # 默认使用蓝牙
-        from ..sensors.bluetooth_sensor import BluetoothSensor
-        sensor = BluetoothSensor(config)
+    # 根据配置的名称加载传感器后端，只导入需要的模块
+    from ..sensors.registry import create_sensor
+    sensor = create_sensor(config)
     
     from ..sleep_analysis.sleep_stage_detector import SleepStageDetector
     from ..alarm.smart_alarm import SmartAlarm
     
     detector = SleepStageDetector(config)
     alarm = SmartAlarm(config)
+    
+    from ..sleep_analysis.anomaly import AnomalyMonitor
+    if anomalies is None:
+        anomalies = AnomalyMonitor(config, event_bus)
+    
+    global _config_subscription
+    if _config_subscription is None:
+        _config_subscription = config_service.subscribe(_apply_config)
+    config_service.start_watching()
+
+
+def _apply_config(snapshot):
+    """配置变化时更新全局配置，并把阈值和唤醒设置应用到当前的检测器和闹钟"""
+    global config
+    config = snapshot
+    if detector is not None:
+        detector.apply_config(snapshot)
+    if alarm is not None:
+        alarm.apply_config(snapshot)
+    if sample_cache is not None:
+        sample_cache.ttl = _sample_cache_ttl()
+    if detectors is not None:
+        detectors.apply_config(snapshot)
+    if anomalies is not None:
+        anomalies.apply_config(snapshot)
+
+
+def _sample_cache_ttl():
+    """最新样本的有效时间（秒），配置项 device_settings.sample_cache_ttl"""
+    from ..sensors.sample_cache import DEFAULT_TTL
+    return (config or {}).get('device_settings', {}).get('sample_cache_ttl', DEFAULT_TTL)
+
+
+def _latest_sample():
+    """
+    取得最新样本，有效时间内的请求和并发的请求共享同一次传感器读取
+    :return: CachedSample（样本是共享的，不要修改）
+    """
+    global sample_cache
+    
+    if not sensor:
+        init_system()
+    
+    cache = sample_cache
+    if cache is None or cache.sensor is not sensor:
+        # 第一次使用或传感器已更换（如连接了新的蓝牙设备）
+        from ..sensors.sample_cache import SampleCache
+        with _sample_cache_lock:
+            if sample_cache is None or sample_cache.sensor is not sensor:
+                sample_cache = SampleCache(sensor, _sample_cache_ttl())
+            cache = sample_cache
+    return cache.get()
+
+
+def _no_sample():
+    """传感器没有数据时（如回放已结束、设备未连接）的响应"""
+    return jsonify({
+        'success': False,
+        'message': '传感器暂无数据'
+    }), 503
 
 @app.route('/')
 def index():
@@ -115,6 +190,13 @@ def index():
             <div id="sleep-analysis"></div>
         </div>
         
+        <div class="section">
+            <h2>睡眠图表</h2>
+            <button class="btn" onclick="getChart()">最近一晚</button>
+            <div id="chart-info"></div>
+            <canvas id="chart" width="600" height="240" style="width: 100%; max-width: 600px;"></canvas>
+        </div>
+        
         <div class="section">
             <h2>设备控制</h2>
             <button class="btn" onclick="syncDevice()">同步设备数据</button>
@@ -141,6 +223,42 @@ def index():
                 document.getElementById('sleep-analysis').innerHTML = '<pre>' + JSON.stringify(data, null, 2) + '</pre>';
             }
             
+            async function getChart() {
+                const canvas = document.getElementById('chart');
+                const response = await fetch('/api/chart?points=' + canvas.width);
+                const data = await response.json();
+                if (!response.ok) {
+                    document.getElementById('chart-info').innerHTML = data.message;
+                    return;
+                }
+                document.getElementById('chart-info').innerHTML = data.night + '，共 ' + data.total_samples + ' 个样本';
+                
+                const ctx = canvas.getContext('2d');
+                ctx.clearRect(0, 0, canvas.width, canvas.height);
+                const hr = data.series.heart_rate;
+                if (!hr || hr.ts.length === 0) return;
+                const t0 = hr.ts[0], t1 = hr.ts[hr.ts.length - 1] || t0 + 1;
+                const x = t => (t - t0) / (t1 - t0 || 1) * canvas.width;
+                
+                // 睡眠图：清醒在上，深睡在下
+                const levels = { awake: 0, rem_sleep: 1, light_sleep: 2, deep_sleep: 3 };
+                ctx.fillStyle = '#cfe2ff';
+                for (const segment of data.hypnogram) {
+                    const level = levels[segment.stage] ?? 0;
+                    ctx.fillRect(x(segment.start), 160 + level * 20, Math.max(1, x(segment.end) - x(segment.start)), 20);
+                }
+                
+                // 心率曲线
+                const lo = Math.min(...hr.values), hi = Math.max(...hr.values);
+                ctx.strokeStyle = '#dc3545';
+                ctx.beginPath();
+                hr.ts.forEach((t, i) => {
+                    const y = 150 - (hr.values[i] - lo) / (hi - lo || 1) * 140;
+                    i === 0 ? ctx.moveTo(x(t), y) : ctx.lineTo(x(t), y);
+                });
+                ctx.stroke();
+            }
+            
             async function syncDevice() {
                 const response = await fetch('/api/device/sync', { method: 'POST' });
                 const data = await response.json();
@@ -178,13 +296,10 @@ def get_status():
 @app.route('/api/sensor_data')
 def get_sensor_data():
     """获取传感器数据"""
-    global sensor
-    
-    if not sensor:
-        init_system()
-    
-    data = sensor.get_sensor_data()
-    return jsonify(data)
+    data = _latest_sample().sample
+    if data is None:
+        return _no_sample()
+    return jsonify(with_timestamp(data))
 
 @app.route('/api/sleep_analysis', methods=['POST'])
 def get_sleep_analysis():
@@ -200,20 +315,91 @@ def get_sleep_analysis():
         'heart_rate': 68,
         'movement': 2.5
     }
+    if sensor_data is None:
+        return _no_sample()
+    
+    # 请求指定了设备时使用该设备的检测器（个性化阈值），否则使用全局检测器
+    device_detector = detector
+    if isinstance(sensor_data, dict) and sensor_data.get('device_id'):
+        device_detector = _detectors().get(sensor_data['device_id'])
     
-    # 检测睡眠阶段
-    sleep_stage = detector.detect_stage(sensor_data)
+    # 检测睡眠阶段，同时进行异常检测
+    sleep_stage = device_detector.detect_stage(sensor_data)
+    if anomalies is not None:
+        anomalies.process(sensor_data)
     
     # 获取睡眠总结
-    summary = detector.get_sleep_summary()
+    summary = device_detector.get_sleep_summary()
     
     return jsonify({
         'sleep_stage': sleep_stage,
-        'sensor_data': sensor_data,
+        'sensor_data': with_timestamp(sensor_data) if isinstance(sensor_data, dict) else sensor_data,
         'summary': summary,
         'timestamp': datetime.now().isoformat()
     })
 
+@app.route('/api/classifier')
+def get_classifier():
+    """获取睡眠阶段分类器信息"""
+    global detector
+    
+    if not detector:
+        init_system()
+    
+    return jsonify(detector.classifier.get_info())
+
+@app.route('/api/classifier/thresholds', methods=['POST'])
+def update_classifier_thresholds():
+    """运行时更新睡眠阶段阈值，无需重启服务"""
+    global detector
+    
+    if not detector:
+        init_system()
+    
+    thresholds = request.json or {}
+    try:
+        detector.update_thresholds(thresholds)
+        # 按设备的检测器同样更新（各设备档案中的阈值仍然优先）
+        _detectors().update_thresholds(thresholds)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    
+    logger.info(f"睡眠阶段阈值已更新: {thresholds}")
+    return jsonify({
+        'success': True,
+        'classifier': detector.classifier.get_info(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/api/classifier/tree', methods=['POST'])
+def load_classifier_tree():
+    """加载训练好的决策树并编译为查找表"""
+    global detector
+    
+    if not detector:
+        init_system()
+    
+    from ..sleep_analysis.classifiers import CompiledClassifier
+    
+    try:
+        classifier = CompiledClassifier.from_decision_tree(request.json or {})
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'message': f"决策树无效: {e}"
+        }), 400
+    
+    detector.set_classifier(classifier)
+    _detectors().set_classifier(classifier)
+    return jsonify({
+        'success': True,
+        'classifier': classifier.get_info(),
+        'timestamp': datetime.now().isoformat()
+    })
+
 @app.route('/api/alarm/check', methods=['POST'])
 def check_alarm():
     """检查是否应该唤醒"""
@@ -286,14 +472,11 @@ def sync_device():
 @app.route('/api/heart_rate')
 def get_heart_rate():
     """获取心率数据（用于模拟API接口）"""
-    global sensor
-    
-    if not sensor:
-        init_system()
-    
-    sensor_data = sensor.get_sensor_data()
+    sensor_data = _latest_sample().sample
+    if sensor_data is None:
+        return _no_sample()
     return jsonify({
-        'timestamp': sensor_data['timestamp'],
+        'timestamp': sample_timestamp(sensor_data),
         'heart_rate': sensor_data['heart_rate'],
         'device_id': sensor_data.get('device_id', 'default')
     })
@@ -301,14 +484,11 @@ def get_heart_rate():
 @app.route('/api/movement')
 def get_movement():
     """获取体动数据（用于模拟API接口）"""
-    global sensor
-    
-    if not sensor:
-        init_system()
-    
-    sensor_data = sensor.get_sensor_data()
+    sensor_data = _latest_sample().sample
+    if sensor_data is None:
+        return _no_sample()
     return jsonify({
-        'timestamp': sensor_data['timestamp'],
+        'timestamp': sample_timestamp(sensor_data),
         'movement': sensor_data['movement'],
         'device_id': sensor_data.get('device_id', 'default')
     })
@@ -316,22 +496,292 @@ def get_movement():
 @app.route('/api/sleep_data')
 def get_sleep_data():
     """获取睡眠数据（用于模拟API接口）"""
-    global sensor, detector
+    global sensor, detector, _detected_sample
     
     if not all([sensor, detector]):
         init_system()
     
-    sensor_data = sensor.get_sensor_data()
-    sleep_stage = detector.detect_stage(sensor_data)
+    entry = _latest_sample()
+    sensor_data = entry.sample
+    if sensor_data is None:
+        return _no_sample()
+    # 同一个样本只检测一次，缓存的样本不会重复进入检测窗口
+    with _detect_lock:
+        detected, sleep_stage = _detected_sample
+        if detected is not entry:
+            sleep_stage = detector.detect_stage(sensor_data)
+            if anomalies is not None:
+                anomalies.process(sensor_data)
+            _detected_sample = (entry, sleep_stage)
     
     return jsonify({
-        'timestamp': sensor_data['timestamp'],
+        'timestamp': sample_timestamp(sensor_data),
         'heart_rate': sensor_data['heart_rate'],
         'movement': sensor_data['movement'],
         'sleep_stage': sleep_stage,
         'device_id': sensor_data.get('device_id', 'default')
     })
 
+@app.route('/api/events')
+def stream_events():
+    """
+    异常事件推送（Server-Sent Events）：每个事件为一条 data 消息（JSON），
+    事件类型为 hr_spike、hr_spike_end、flatline 和 flatline_end
+    参数：device_id（只推送该设备的事件，默认推送全部设备）
+    """
+    device_id = request.args.get('device_id')
+    predicate = (lambda event: event['device_id'] == device_id) if device_id else None
+    subscription = event_bus.subscribe(predicate=predicate)
+    
+    def generate():
+        try:
+            yield ': connected\n\n'
+            while True:
+                event = subscription.get(EVENT_KEEPALIVE)
+                if event is None:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        finally:
+            subscription.close()
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _history():
+    """历史数据存储（第一次使用时打开，位置由 device_settings.history_path 指定）"""
+    from ..utils.history_store import get_history_store
+    return get_history_store(config or get_config_service().get())
+
+
+def _detectors():
+    """按设备的检测器注册表（第一次使用时创建，校准档案从历史数据库读取）"""
+    global detectors
+    if detectors is None:
+        from ..sleep_analysis.detector_registry import DetectorRegistry
+        with _detectors_lock:
+            if detectors is None:
+                detectors = DetectorRegistry(config or get_config_service().get(), _history())
+    return detectors
+
+
+def _time_arg(name):
+    """解析时间查询参数：epoch毫秒整数或ISO 8601字符串"""
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    if value.lstrip('-').isdigit():
+        return int(value)
+    return iso_to_epoch_ms(value)
+
+
+def _history_error(e):
+    return jsonify({
+        'success': False,
+        'message': str(e)
+    }), 400
+
+@app.route('/api/history/devices')
+def get_history_devices():
+    """已存储历史数据的设备"""
+    return jsonify({'devices': _history().devices()})
+
+@app.route('/api/history/samples')
+def get_history_samples():
+    """
+    按时间范围查询历史样本
+    参数：device_id、start/end（epoch毫秒或ISO时间，end不包含）、fields（逗号分隔）、
+    limit、cursor（上一页返回的next_cursor）、bucket（降采样的时间桶，秒）
+    """
+    try:
+        fields = request.args.get('fields')
+        bucket = request.args.get('bucket')
+        items, next_cursor = _history().query_samples(
+            device_id=request.args.get('device_id', 'default'),
+            start=_time_arg('start'),
+            end=_time_arg('end'),
+            fields=[field for field in fields.split(',') if field] if fields else None,
+            limit=request.args.get('limit', type=int),
+            cursor=request.args.get('cursor'),
+            bucket=float(bucket) if bucket else None
+        )
+    except ValueError as e:
+        return _history_error(e)
+    
+    for item in items:
+        item['timestamp'] = epoch_ms_to_iso(item['ts'])
+    return jsonify({'items': items, 'next_cursor': next_cursor})
+
+@app.route('/api/history/summaries')
+def get_history_summaries():
+    """
+    按日期范围查询每晚总结
+    参数：device_id、start/end（YYYYMMDD，包含）、limit、cursor
+    """
+    try:
+        items, next_cursor = _history().query_summaries(
+            device_id=request.args.get('device_id', 'default'),
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            limit=request.args.get('limit', type=int),
+            cursor=request.args.get('cursor')
+        )
+    except ValueError as e:
+        return _history_error(e)
+    return jsonify({'items': items, 'next_cursor': next_cursor})
+
+@app.route('/api/report')
+def get_sleep_report():
+    """
+    一晚的睡眠报告（入睡潜伏期、总睡眠时间、睡眠效率、WASO、觉醒次数、各阶段时长、睡眠周期数）
+    参数：device_id、night（YYYYMMDD，默认为最近一晚）
+    报告在夜晚导入时生成并保存，这里直接按 (设备, 夜晚) 读取
+    """
+    from ..sleep_analysis.report import get_report
+    
+    report = get_report(_history(), request.args.get('device_id', 'default'), request.args.get('night'))
+    if report is None:
+        return jsonify({
+            'success': False,
+            'message': '没有该晚的历史数据'
+        }), 404
+    return jsonify(report)
+
+@app.route('/api/trends')
+def get_trends():
+    """
+    按周或按月的睡眠趋势（由汇总表直接读取）
+    参数：device_id、period（week或month，默认week）、start/end（YYYYMMDD，包含所在的周期）
+    """
+    from ..sleep_analysis.trends import query_trends
+    
+    try:
+        items = query_trends(_history(), request.args.get('device_id', 'default'),
+                             request.args.get('period', 'week'), request.args.get('start'), request.args.get('end'))
+    except ValueError as e:
+        return _history_error(e)
+    return jsonify({'items': items})
+
+@app.route('/api/trends/summary')
+def get_trend_summary():
+    """
+    任意日期范围的睡眠汇总（合并月汇总和各晚的汇总）
+    参数：device_id、start/end（YYYYMMDD，包含）
+    """
+    from ..sleep_analysis.trends import aggregate_range
+    
+    start, end = request.args.get('start'), request.args.get('end')
+    if not start or not end:
+        return _history_error('需要提供 start 和 end（YYYYMMDD）')
+    try:
+        aggregate = aggregate_range(_history(), request.args.get('device_id', 'default'), start, end)
+    except ValueError as e:
+        return _history_error(e)
+    return jsonify(dict(start=start, end=end, **aggregate.summary()))
+
+@app.route('/api/quantiles')
+def get_quantiles():
+    """
+    心率、睡眠期间心率和体动的分位数（由分位数草图估计）
+    参数：device_id、start/end（YYYYMMDD，包含，都不提供时为设备的全部夜晚）、q（逗号分隔的分位点，默认0.05,0.5,0.95）
+    """
+    from ..sleep_analysis.trends import STATS_FIELDS, aggregate_range, device_aggregate
+    
+    device_id = request.args.get('device_id', 'default')
+    start, end = request.args.get('start'), request.args.get('end')
+    try:
+        qs = [float(q) for q in request.args.get('q', '0.05,0.5,0.95').split(',')]
+        if not all(0 <= q <= 1 for q in qs):
+            raise ValueError("q 必须在0到1之间")
+        if start and end:
+            aggregate = aggregate_range(_history(), device_id, start, end)
+        elif start or end:
+            raise ValueError("start 和 end 需要同时提供")
+        else:
+            aggregate = device_aggregate(_history(), device_id)
+    except ValueError as e:
+        return _history_error(e)
+    
+    fields = {}
+    for field in STATS_FIELDS:
+        stats = aggregate.fields[field]
+        fields[field] = {'count': stats.count, 'quantiles': dict(zip(map(str, qs), stats.quantiles(qs)))}
+    return jsonify({'device_id': device_id, 'start': start, 'end': end, 'nights': aggregate.nights, **fields})
+
+@app.route('/api/profile')
+def get_profile():
+    """
+    设备的校准档案（个人基线和个性化阈值）
+    参数：device_id
+    """
+    device_id = request.args.get('device_id', 'default')
+    profile = _history().get_profile(device_id)
+    if profile is None:
+        return jsonify({
+            'success': False,
+            'message': '该设备还没有校准档案'
+        }), 404
+    return jsonify(profile)
+
+@app.route('/api/profile/calibrate', methods=['POST'])
+def calibrate_profile():
+    """
+    根据设备最近若干晚的历史数据重新校准
+    参数：device_id、nights（参与校准的夜晚数，默认14）
+    """
+    from ..sleep_analysis.calibration import DEFAULT_NIGHTS, calibrate_device
+    
+    device_id = request.args.get('device_id', 'default')
+    nights = request.args.get('nights', DEFAULT_NIGHTS, type=int)
+    if nights <= 0:
+        return _history_error('nights 必须是正整数')
+    profile = calibrate_device(_history(), device_id, nights)
+    if profile is None:
+        return _history_error('历史数据不足，无法校准')
+    _detectors().invalidate(device_id)
+    return jsonify(profile)
+
+_chart_cache = None
+
+@app.route('/api/chart')
+def get_chart():
+    """
+    一晚的图表数据：心率和体动曲线用LTTB降采样到points个点，睡眠阶段为游程编码的睡眠图
+    参数：device_id、night（YYYYMMDD，默认为最近一晚）、points（每条曲线的点数，默认500）
+    结果按 (夜晚, 点数) 缓存
+    """
+    global _chart_cache
+    from ..sleep_analysis.chart import ChartCache, build_chart, check_points
+    
+    device_id = request.args.get('device_id', 'default')
+    try:
+        points = check_points(request.args.get('points', type=int))
+    except ValueError as e:
+        return _history_error(e)
+    
+    store = _history()
+    night = store.get_night(device_id, request.args.get('night'))
+    if night is None:
+        return jsonify({
+            'success': False,
+            'message': '没有该晚的历史数据'
+        }), 404
+    
+    if _chart_cache is None:
+        _chart_cache = ChartCache()
+    # 重新导入该晚的数据后时间范围或样本数会变化，缓存的结果不再使用
+    key = (device_id, night['night'], night['start_ts'], night['end_ts'],
+           night['summary'].get('total_records'), points)
+    body = _chart_cache.get(key)
+    if body is None:
+        end = night['end_ts'] + 1 if night['end_ts'] is not None else None
+        columns = store.load_columns(device_id, night['start_ts'], end, ('heart_rate', 'movement', 'sleep_stage'))
+        chart = build_chart(columns, points)
+        chart.update(device_id=device_id, night=night['night'])
+        body = json.dumps(chart, ensure_ascii=False)
+        _chart_cache.put(key, body)
+    return Response(body, content_type='application/json')
+
 @app.route('/api/bluetooth/devices')
 def get_bluetooth_devices():
     """搜索可用的蓝牙设备"""
@@ -385,8 +835,8 @@ def connect_bluetooth():
         }), 400
     
     try:
-        # 创建新的蓝牙传感器
-        new_config = config or {
+        # 创建新的蓝牙传感器（在配置副本上修改设备地址）
+        new_config = thaw(config) if config else {
             "sleep_detection": {
                 "sampling_rate": 60,
                 "deep_sleep_hr_threshold": 60,
@@ -411,7 +861,8 @@ def connect_bluetooth():
         new_config['device_settings']['device_name'] = device_name
         
         # 创建蓝牙传感器
-        sensor = BluetoothSensor(new_config)
+        from ..sensors.registry import create_sensor
+        sensor = create_sensor(new_config, 'bluetooth')
         
         return jsonify({
             'success': True,
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+红米手环2睡眠监测性能基准测试
+
+对热路径进行计时：睡眠阶段检测、数据记录、每日总结、蓝牙数据解析和API请求。
+测试数据由固定随机种子生成，结果以JSON格式输出，并可以与之前保存的基准结果对比，
+发现变慢的项目时返回非零退出码，用于部署前检查
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from sleep_monitor.sensors.sensor_simulator import SensorSimulator
+from sleep_monitor.sensors.registry import resolve_sensor
+from sleep_monitor.sleep_analysis.sleep_stage_detector import SleepStageDetector
+from sleep_monitor.sleep_analysis.anomaly import AnomalyMonitor
+from sleep_monitor.alarm.smart_alarm import SmartAlarm
+from sleep_monitor.utils.data_logger import DataLogger
+from sleep_monitor.utils.time_utils import sample_epoch_ms
+
+
+logger = logging.getLogger(__name__)
+
+SEED = 20230101
+
+# 结果文件格式版本，格式不兼容时对比会给出提示
+RESULTS_VERSION = 1
+
+# 基准测试使用的固定配置，与用户的配置文件无关，保证结果可比
+BENCH_CONFIG = {
+    'sleep_detection': {
+        'sampling_rate': 60,
+        'deep_sleep_hr_threshold': 60,
+        'light_sleep_hr_threshold': 70,
+        'movement_threshold': 5
+    },
+    'alarm_settings': {
+        'wake_time': '07:00',
+        'alarm_window': 30,
+        'alarm_duration': 5
+    },
+    'device_settings': {
+        'device_model': 'Redmi Band 2',
+        'sensor_type': 'simulator'
+    }
+}
+
+NIGHT_SAMPLES = 480
+
+# 已注册的基准测试：名称 -> 函数(scale)，函数返回 {结果名称: 计时结果}
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """注册基准测试的装饰器"""
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def measure(func, number=1, repeat=5):
+    """
+    计时：调用func number次为一轮，共repeat轮
+    :return: 计时结果，median和min为每次调用的耗时（秒）
+    """
+    func()  # 预热
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - started) / number)
+    return {'median': statistics.median(times), 'min': min(times), 'number': number, 'repeat': repeat}
+
+
+def per_item(result, items):
+    """将每次调用的耗时换算为每项的耗时"""
+    scaled = dict(result)
+    scaled['median'] = result['median'] / items
+    scaled['min'] = result['min'] / items
+    scaled['items'] = items
+    return scaled
+
+
+def night_samples(n_samples=NIGHT_SAMPLES, seed=SEED):
+    """生成一整晚的固定样本"""
+    simulator = SensorSimulator(BENCH_CONFIG)
+    return list(simulator.iter_night_samples(simulator.generate_night(n_samples, seed=seed)))
+
+
+def night_records(n_samples=NIGHT_SAMPLES, seed=SEED):
+    """生成一整晚与界面保存格式相同的记录"""
+    return [{
+        'timestamp': sample['timestamp'],
+        'heart_rate': sample['heart_rate'],
+        'movement': sample['movement'],
+        'sleep_stage': sample['sleep_phase'],
+        'provenance': sample['provenance']
+    } for sample in night_samples(n_samples, seed)]
+
+
+@benchmark('detect_stage')
+def bench_detect_stage(scale):
+    """睡眠阶段检测：每晚和每个样本的耗时"""
+    samples = night_samples()
+
+    def one_night():
+        detect = SleepStageDetector(BENCH_CONFIG).detect_stage
+        for sample in samples:
+            detect(sample)
+
+    result = measure(one_night, repeat=scale['repeat'])
+    return {
+        'detect_stage.per_night': result,
+        'detect_stage.per_sample': per_item(result, len(samples))
+    }
+
+
+@benchmark('anomaly')
+def bench_anomaly(scale):
+    """流式异常检测：1000个设备交替送入样本时每个样本的耗时"""
+    samples = night_samples()[:100]
+    epochs = [sample_epoch_ms(sample) for sample in samples]
+    devices = [f'band-{i}' for i in range(1000)]
+
+    def all_devices():
+        monitor = AnomalyMonitor(BENCH_CONFIG)
+        process = monitor.process
+        for sample, epoch in zip(samples, epochs):
+            for device_id in devices:
+                process(sample, device_id, epoch)
+
+    result = measure(all_devices, repeat=scale['repeat'])
+    return {'anomaly.per_sample': per_item(result, len(samples) * len(devices))}
+
+
+@benchmark('log_sleep_data')
+def bench_log_sleep_data(scale):
+    """逐条记录（读取并重写整个JSON文件）随文件增大的耗时，以及追加写入的对比"""
+    records = night_records()
+    results = {}
+    with tempfile.TemporaryDirectory() as data_dir:
+        data_logger = DataLogger(data_dir)
+        for existing in scale['log_sizes']:
+            filename = f'log_{existing}.json'
+            data_logger.export_to_json((records * (existing // len(records) + 1))[:existing], filename)
+            record = records[existing % len(records)]
+            results[f'log_sleep_data.records_{existing}'] = measure(
+                lambda: data_logger.log_sleep_data(record, filename), number=scale['number'], repeat=scale['repeat'])
+
+        batch = records[:60]
+        results['append_sleep_data.batch_60'] = measure(
+            lambda: data_logger.append_sleep_data(batch, 'append.jsonl'), number=scale['number'], repeat=scale['repeat'])
+    return results
+
+
+@benchmark('daily_summary')
+def bench_daily_summary(scale):
+    """每日总结：读取一晚的JSON和JSON Lines文件并统计"""
+    records = night_records()
+    date_str = '20230101'
+    with tempfile.TemporaryDirectory() as data_dir:
+        data_logger = DataLogger(data_dir)
+        half = len(records) // 2
+        data_logger.export_to_json(records[:half], f'sleep_data_{date_str}.json')
+        data_logger.append_sleep_data(records[half:], f'sleep_data_{date_str}.jsonl')
+        result = measure(lambda: data_logger.get_daily_summary(date_str), number=scale['number'], repeat=scale['repeat'])
+    return {'get_daily_summary.night': result}
+
+
+@benchmark('parse_sensor_data')
+def bench_parse_sensor_data(scale):
+    """蓝牙原始数据解析：JSON和逗号分隔两种格式各一半"""
+    rng = random.Random(SEED)
+    payloads = []
+    for i in range(1000):
+        heart_rate, movement, battery = rng.randint(45, 110), round(rng.uniform(0, 10), 2), rng.randint(20, 100)
+        if i % 2:
+            payloads.append(json.dumps({'heart_rate': heart_rate, 'movement': movement, 'battery': battery}).encode())
+        else:
+            payloads.append(f'{heart_rate},{movement},{battery}'.encode())
+
+    # 解析不依赖连接状态，直接调用而不创建传感器（创建时会尝试连接蓝牙设备）
+    parse = resolve_sensor('bluetooth')._parse_sensor_data
+
+    def parse_all():
+        for payload in payloads:
+            parse(None, payload)
+
+    result = measure(parse_all, repeat=scale['repeat'])
+    return {'parse_sensor_data.per_payload': per_item(result, len(payloads))}
+
+
+@benchmark('api')
+def bench_api(scale):
+    """通过Flask测试客户端的端到端请求耗时（使用模拟传感器，不读取配置文件）"""
+    from sleep_monitor.api import sleep_api
+
+    saved = (sleep_api.sensor, sleep_api.detector, sleep_api.alarm, sleep_api.config)
+    sleep_api.config = BENCH_CONFIG
+    sleep_api.sensor = SensorSimulator(BENCH_CONFIG)
+    sleep_api.detector = SleepStageDetector(BENCH_CONFIG)
+    sleep_api.alarm = SmartAlarm(BENCH_CONFIG)
+    client = sleep_api.app.test_client()
+    sample = night_samples(1)[0]
+
+    requests = {
+        'api.status': lambda: client.get('/api/status'),
+        'api.sensor_data': lambda: client.get('/api/sensor_data'),
+        'api.sleep_analysis': lambda: client.post('/api/sleep_analysis', json=sample),
+        'api.metrics': lambda: client.get('/metrics')
+    }
+    try:
+        return {name: measure(request, number=scale['number'], repeat=scale['repeat'])
+                for name, request in requests.items()}
+    finally:
+        sleep_api.sensor, sleep_api.detector, sleep_api.alarm, sleep_api.config = saved
+
+
+SCALES = {
+    'full': {'repeat': 7, 'number': 50, 'log_sizes': (0, 1000, 10000)},
+    'quick': {'repeat': 3, 'number': 10, 'log_sizes': (0, 1000)}
+}
+
+
+def run_benchmarks(names=None, scale='full'):
+    """
+    运行基准测试
+    :param names: 要运行的基准测试名称（正则表达式列表），默认全部
+    :param scale: 'full' 或 'quick'
+    :return: 结果文档（可直接保存为JSON）
+    """
+    import numpy as np
+
+    selected = [name for name in BENCHMARKS
+                if not names or any(re.search(pattern, name) for pattern in names)]
+    results = {}
+    for name in selected:
+        logger.info(f"运行 {name} ...")
+        results.update(BENCHMARKS[name](SCALES[scale]))
+
+    return {
+        'version': RESULTS_VERSION,
+        'meta': {
+            'created': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'seed': SEED,
+            'scale': scale
+        },
+        'results': results
+    }
+
+
+def compare_results(baseline, current, threshold=0.2, metric='min'):
+    """
+    与基准结果对比
+    :param baseline: 之前保存的结果文档
+    :param current: 当前的结果文档
+    :param threshold: 允许的相对变慢比例，超过即判为回归
+    :param metric: 用于比较的计时（min或median，最小值受系统干扰最小）
+    :return: 对比行列表，每行包含name、baseline、current、ratio、status（ok/regression/improved/new/missing）
+    """
+    if baseline.get('version') != current.get('version'):
+        raise ValueError(f"结果文件版本不一致: {baseline.get('version')} != {current.get('version')}")
+
+    rows = []
+    base_results, current_results = baseline['results'], current['results']
+    for name in sorted(set(base_results) | set(current_results)):
+        if name not in current_results:
+            rows.append({'name': name, 'baseline': base_results[name][metric], 'current': None,
+                         'ratio': None, 'status': 'missing'})
+            continue
+        if name not in base_results:
+            rows.append({'name': name, 'baseline': None, 'current': current_results[name][metric],
+                         'ratio': None, 'status': 'new'})
+            continue
+
+        before, after = base_results[name][metric], current_results[name][metric]
+        ratio = after / before if before > 0 else float('inf')
+        if ratio > 1 + threshold:
+            status = 'regression'
+        elif ratio < 1 / (1 + threshold):
+            status = 'improved'
+        else:
+            status = 'ok'
+        rows.append({'name': name, 'baseline': before, 'current': after, 'ratio': ratio, 'status': status})
+    return rows
+
+
+def _format_time(seconds):
+    """耗时的可读格式"""
+    if seconds is None:
+        return '-'
+    for unit, factor in (('s', 1), ('ms', 1e3), ('us', 1e6)):
+        if seconds * factor >= 1:
+            return f'{seconds * factor:.3f} {unit}'
+    return f'{seconds * 1e9:.1f} ns'
+
+
+def format_results(document, metric='median'):
+    """结果表格"""
+    results = document['results']
+    width = max((len(name) for name in results), default=10)
+    lines = [f"{'名称':<{width}}  {metric}"]
+    for name in sorted(results):
+        lines.append(f'{name:<{width}}  {_format_time(results[name][metric])}')
+    return '\n'.join(lines)
+
+
+def format_comparison(rows):
+    """对比表格"""
+    width = max((len(row['name']) for row in rows), default=10)
+    lines = [f"{'名称':<{width}}  {'基准':>12}  {'当前':>12}  {'比例':>7}  状态"]
+    for row in rows:
+        ratio = f"{row['ratio']:.2f}x" if row['ratio'] is not None else '-'
+        lines.append(f"{row['name']:<{width}}  {_format_time(row['baseline']):>12}  "
+                     f"{_format_time(row['current']):>12}  {ratio:>7}  {row['status']}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='睡眠监测热路径性能基准测试')
+    parser.add_argument('-o', '--output', help='结果输出文件（JSON）')
+    parser.add_argument('--compare', help='与之前保存的结果文件对比，发现回归时返回1')
+    parser.add_argument('--threshold', type=float, default=0.2, help='允许的相对变慢比例（默认0.2即20%%）')
+    parser.add_argument('--metric', choices=('min', 'median'), default='min', help='用于对比的计时')
+    parser.add_argument('--quick', action='store_true', help='减少重复次数，快速运行')
+    parser.add_argument('-k', '--select', action='append', help='只运行名称匹配的基准测试（正则表达式，可多次指定）')
+    parser.add_argument('--list', action='store_true', help='列出所有基准测试')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    # 被测代码的日志会影响计时
+    logging.getLogger('sleep_monitor').setLevel(logging.WARNING)
+
+    if args.list:
+        for name, func in BENCHMARKS.items():
+            print(f'{name}: {func.__doc__}')
+        return 0
+
+    document = run_benchmarks(args.select, 'quick' if args.quick else 'full')
+    print(format_results(document, args.metric))
+
+    if args.output:
+        output_dir = os.path.dirname(args.output)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(document, f, ensure_ascii=False, indent=2)
+        logger.info(f"结果已保存到 {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline['meta'].get('scale') != document['meta']['scale']:
+            logger.warning(f"基准结果的运行规模为 {baseline['meta'].get('scale')}，与当前不同，对比结果可能不准确")
+        rows = compare_results(baseline, document, args.threshold, args.metric)
+        if args.select:
+            # 只运行了部分基准测试时，未运行的项目不算缺失
+            rows = [row for row in rows if row['status'] != 'missing']
+        print(format_comparison(rows))
+        regressions = [row['name'] for row in rows if row['status'] == 'regression']
+        if regressions:
+            logger.error(f"以下项目变慢超过 {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
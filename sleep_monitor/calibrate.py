@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+红米手环2个性化阈值校准工具
+
+根据历史数据库中各设备最近若干晚的数据计算个人基线和阈值档案，
+档案保存在历史数据库中，检测器在设备下一次使用时加载
+"""
+import argparse
+import json
+import logging
+import sys
+
+from sleep_monitor.sleep_analysis.calibration import DEFAULT_NIGHTS, calibrate_device
+from sleep_monitor.utils.history_store import HistoryStore
+
+
+logger = logging.getLogger(__name__)
+
+
+def calibrate_all(store, device_ids=None, nights=DEFAULT_NIGHTS, save=True):
+    """
+    校准多个设备
+    :param store: 历史数据存储（HistoryStore）
+    :param device_ids: 设备ID列表，默认为历史数据库中的全部设备
+    :param nights: 参与校准的夜晚数
+    :param save: 是否保存档案
+    :return: {设备ID: 档案或None（数据不足）}
+    """
+    if not device_ids:
+        device_ids = [device['device_id'] for device in store.devices()]
+    results = {}
+    for device_id in device_ids:
+        profile = calibrate_device(store, device_id, nights, save)
+        if profile is None:
+            logger.warning(f"设备 {device_id} 的历史数据不足，跳过校准")
+        else:
+            logger.info(f"设备 {device_id} 校准完成: {profile['nights']}晚，阈值 {profile['thresholds']}")
+        results[device_id] = profile
+    return results
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='根据历史数据校准各设备的睡眠阶段阈值')
+    parser.add_argument('history', help='历史数据库路径')
+    parser.add_argument('-d', '--device', action='append', help='只校准该设备（可多次指定），默认为全部设备')
+    parser.add_argument('-n', '--nights', type=int, default=DEFAULT_NIGHTS, help=f'参与校准的夜晚数（默认{DEFAULT_NIGHTS}）')
+    parser.add_argument('--dry-run', action='store_true', help='只输出档案，不保存')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.nights <= 0:
+        parser.error('--nights 必须是正整数')
+
+    store = HistoryStore(args.history)
+    try:
+        results = calibrate_all(store, args.device, args.nights, not args.dry_run)
+    finally:
+        store.close()
+    if args.dry_run:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    return 0 if results and all(results.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,42 +5,17 @@
 本程序实现睡眠阶段检测和智能唤醒功能
  """
 import time
-import json
 import logging
-from datetime import datetime
-
-# 按优先级尝试导入传感器模块
-SENSOR_TYPE = None
-sensor_module = None
-
-# 首先尝试导入蓝牙传感器（最高优先级）
-try:
-    from sleep_monitor.sensors.bluetooth_sensor import BluetoothSensor
-    SENSOR_TYPE = 'bluetooth'
-    sensor_module = BluetoothSensor
-    print("蓝牙传感器模块已加载")
-except ImportError as e:
-    print(f"蓝牙传感器模块不可用: {e}")
-
-# 如果蓝牙不可用，尝试硬件传感器
-if SENSOR_TYPE is None:
-    try:
-        from sleep_monitor.sensors.hardware_sensor import HardwareSensor
-        SENSOR_TYPE = 'hardware'
-        sensor_module = HardwareSensor
-        print("硬件传感器模块已加载")
-    except ImportError as e:
-        print(f"硬件传感器模块不可用: {e}")
-
-# 如果都不行，使用模拟器
-if SENSOR_TYPE is None:
-    from sleep_monitor.sensors.sensor_simulator import SensorSimulator
-    SENSOR_TYPE = 'simulation'
-    sensor_module = SensorSimulator
-    print("使用传感器模拟器")
+from datetime import datetime, timedelta
 
 from sleep_monitor.sleep_analysis.sleep_stage_detector import SleepStageDetector
+from sleep_monitor.sleep_analysis.anomaly import AnomalyMonitor
 from sleep_monitor.alarm.smart_alarm import SmartAlarm
+from sleep_monitor.sensors.sampling_scheduler import SamplingScheduler
+from sleep_monitor.sensors.registry import create_sensor
+from sleep_monitor.sensors.provenance import is_real
+from sleep_monitor.utils.config_service import get_config_service
+from sleep_monitor.utils.time_utils import datetime_to_epoch_ms, epoch_ms_to_iso
 
 
 # 配置日志
@@ -52,38 +27,8 @@ logger = logging.getLogger(__name__)
 
 
 def load_config():
-    """加载配置文件"""
-    import os
-    from pathlib import Path
-    
-    # 首先尝试在当前目录查找
-    config_paths = [
-        'config.json',  # 当前目录
-        os.path.join(os.path.dirname(__file__), 'config.json'),  # sleep_monitor目录
-    ]
-    
-    for config_path in config_paths:
-        try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                logger.info(f"成功加载配置文件: {config_path}")
-                return json.load(f)
-        except FileNotFoundError:
-            continue
-    
-    logger.warning("配置文件 config.json 未找到，使用默认配置")
-    return {
-        "sleep_detection": {
-            "sampling_rate": 60,  # 采样率（秒）
-            "deep_sleep_hr_threshold": 60,  # 深度睡眠心率阈值
-            "light_sleep_hr_threshold": 70,  # 浅度睡眠心率阈值
-            "movement_threshold": 5  # 体动阈值
-        },
-        "alarm_settings": {
-            "wake_time": "07:00",  # 默认唤醒时间
-            "alarm_window": 30,  # 唤醒时间窗口（分钟）
-            "alarm_duration": 5  # 闹钟持续时间（分钟）
-        }
-    }
+    """加载配置（由配置服务解析和校验一次，返回不可修改的快照）"""
+    return get_config_service().get()
 
 
 def main():
@@ -91,27 +36,25 @@ def main():
     logger.info("红米手环2智能睡眠监测系统启动")
     
     # 加载配置
-    config = load_config()
+    config_service = get_config_service()
+    config = config_service.get()
     
-    # 根据配置决定使用哪种传感器
+    # 根据配置的名称（device_settings.sensor_type）加载传感器后端，只导入需要的模块
     device_settings = config.get('device_settings', {})
-    preferred_sensor_type = device_settings.get('sensor_type', 'bluetooth')  # 默认使用蓝牙
-    
-    logger.info(f"使用传感器类型: {SENSOR_TYPE} (配置要求: {preferred_sensor_type})")
-    
-    # 初始化传感器（按优先级选择，但优先满足配置要求）
-    if SENSOR_TYPE == 'bluetooth' and preferred_sensor_type in ['bluetooth', 'auto']:
-        logger.info("初始化蓝牙传感器")
-        sensor = BluetoothSensor(config)
-    elif SENSOR_TYPE == 'hardware' and preferred_sensor_type in ['hardware', 'api', 'auto']:
-        logger.info("初始化硬件传感器")
-        sensor = HardwareSensor(config)
-    else:
-        logger.info("初始化传感器模拟器")
-        sensor = SensorSimulator(config)
+    sensor = create_sensor(config)
     
     sleep_detector = SleepStageDetector(config)
     smart_alarm = SmartAlarm(config)
+    scheduler = SamplingScheduler(config)
+    # 心率持续升高和手环脱落的报警写入日志
+    anomaly_monitor = AnomalyMonitor(config)
+    
+    # 配置文件变化时，阈值和唤醒设置直接更新到检测器和闹钟
+    config_service.attach(sleep_detector)
+    config_service.attach(smart_alarm)
+    config_service.attach(anomaly_monitor)
+    config_service.start_watching()
+    skip_non_real = device_settings.get('skip_non_real_samples', False)
     
     logger.info("系统初始化完成，开始监测睡眠...")
     
@@ -119,21 +62,38 @@ def main():
         # 模拟睡眠监测过程
         sleep_data = []
         current_time = datetime.now()
+        end_time = current_time + timedelta(hours=8)  # 模拟8小时睡眠
+        next_report_time = current_time
         
-        # 模拟一晚的睡眠数据（实际应用中会从手环获取）
-        for i in range(480):  # 模拟8小时睡眠，每分钟采集一次数据
-            # 获取传感器数据（真实或模拟）
+        # 模拟一晚的睡眠数据（实际应用中会从手环获取），采样间隔由调度器动态调整
+        while current_time < end_time:
+            # 获取传感器数据（真实或模拟，provenance字段标记来源）
             sensor_data = sensor.get_sensor_data()
+            if sensor_data is None:
+                # 回放等有限的数据源已经结束
+                logger.info("传感器没有更多数据，结束监测")
+                break
+            # 样本时间使用模拟时间，检测器的时间窗口按模拟的一晚计算（加速模拟时墙钟时间只过去几秒）
+            ts = datetime_to_epoch_ms(current_time)
+            sensor_data = dict(sensor_data, ts=ts)
+            
+            # 按配置跳过非真实的样本，不参与检测和存储
+            if skip_non_real and not is_real(sensor_data):
+                time.sleep(0.01)
+                current_time += timedelta(seconds=scheduler.current_interval)
+                continue
             
             # 检测睡眠阶段
             sleep_stage = sleep_detector.detect_stage(sensor_data)
+            anomaly_monitor.process(sensor_data)
             
             # 记录数据
             sleep_data.append({
-                'timestamp': datetime.now().isoformat(),
+                'timestamp': epoch_ms_to_iso(ts),
                 'heart_rate': sensor_data['heart_rate'],
                 'movement': sensor_data['movement'],
-                'sleep_stage': sleep_stage
+                'sleep_stage': sleep_stage,
+                'provenance': sensor_data.get('provenance', 'real')
             })
             
             # 检查是否需要唤醒
@@ -142,18 +102,29 @@ def main():
                 smart_alarm.trigger_alarm()
                 break
             
+            if current_time >= next_report_time:  # 每小时报告一次
+                logger.info(f"睡眠监测进行中... 当前阶段: {sleep_stage}，采样间隔: {scheduler.current_interval:.0f}秒")
+                next_report_time += timedelta(hours=1)
+            
+            # 根据睡眠状态和唤醒窗口计算下一次采样的间隔
+            interval = scheduler.next_interval(
+                sensor_data, sleep_stage, current_time, smart_alarm.is_in_wake_window(current_time))
+            sleep_detector.set_sampling_interval(interval)
+            
             # 模拟时间流逝
             time.sleep(0.01)  # 加速模拟
-            current_time = datetime.fromtimestamp(current_time.timestamp() + 60)  # 增加1分钟
-            
-            if i % 60 == 0:  # 每小时报告一次
-                logger.info(f"睡眠监测进行中... 当前阶段: {sleep_stage}")
+            current_time += timedelta(seconds=interval)
     
     except KeyboardInterrupt:
         logger.info("用户中断程序")
     except Exception as e:
         logger.error(f"程序运行出错: {e}")
+    finally:
+        config_service.stop_watching()
     
+    provenance = sensor.get_device_info().get('provenance')
+    if provenance:
+        logger.info(f"样本来源统计: {provenance}")
     logger.info("睡眠监测完成")
 
 
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+红米手环2睡眠数据批量重处理工具
+
+对已存储的多晚睡眠数据重新进行睡眠阶段检测、唤醒判断和总结生成，
+按夜晚分片并行处理，支持中断后继续
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from sleep_monitor.sensors.replay_sensor import ReplaySensor, REPLAY_READERS
+from sleep_monitor.sensors.provenance import is_real, REAL
+from sleep_monitor.sleep_analysis.sleep_stage_detector import SleepStageDetector
+from sleep_monitor.sleep_analysis.report import generate_report
+from sleep_monitor.sleep_analysis.resampler import iter_buckets, resample_samples, resampling_enabled
+from sleep_monitor.alarm.smart_alarm import SmartAlarm
+from sleep_monitor.utils.time_utils import epoch_ms_to_datetime, sample_epoch_ms, sample_timestamp
+from sleep_monitor.utils.config_service import load_config, load_config_file
+from sleep_monitor.utils.history_store import HistoryStore, DEFAULT_DEVICE_ID
+
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+
+# 数据文件命名规则：sleep_data_YYYYMMDD.<扩展名>
+NIGHT_FILE_PATTERN = re.compile(r'^sleep_data_(\d{8})(\.\w+)$')
+
+# 同一晚存在多种格式时的优先顺序
+FORMAT_PRIORITY = ('.jsonl', '.json', '.csv')
+
+
+def find_nights(data_dir, start_date=None, end_date=None):
+    """
+    查找数据目录中的夜间数据文件
+    :param data_dir: 数据目录
+    :param start_date: 开始日期（YYYYMMDD，包含）
+    :param end_date: 结束日期（YYYYMMDD，包含）
+    :return: {日期: 文件路径} 字典，按日期排序
+    """
+    nights = {}
+    for name in os.listdir(data_dir):
+        match = NIGHT_FILE_PATTERN.match(name)
+        if not match:
+            continue
+
+        night, extension = match.group(1), match.group(2).lower()
+        if extension not in REPLAY_READERS:
+            continue
+        if start_date and night < start_date:
+            continue
+        if end_date and night > end_date:
+            continue
+
+        path = os.path.join(data_dir, name)
+        current = nights.get(night)
+        if current is None or _format_rank(extension) < _format_rank(os.path.splitext(current)[1]):
+            nights[night] = path
+
+    return dict(sorted(nights.items()))
+
+
+def _format_rank(extension):
+    """存储格式的优先级，数值越小越优先"""
+    extension = extension.lower()
+    return FORMAT_PRIORITY.index(extension) if extension in FORMAT_PRIORITY else len(FORMAT_PRIORITY)
+
+
+def config_hash(config):
+    """计算影响处理结果的配置的哈希值，配置变化后需要重新处理"""
+    relevant = {
+        'sleep_detection': config.get('sleep_detection', {}),
+        'alarm_settings': config.get('alarm_settings', {}),
+        'skip_non_real_samples': config.get('device_settings', {}).get('skip_non_real_samples', False)
+    }
+    if config.get('resampling'):
+        # 只在配置了重采样时加入，没有该配置的已有清单不需要重新处理
+        relevant['resampling'] = config['resampling']
+    encoded = json.dumps(relevant, sort_keys=True).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()
+
+
+def process_night(night, source, output_dir, config):
+    """
+    处理一晚的数据（在子进程中运行）
+    :param night: 日期（YYYYMMDD）
+    :param source: 数据文件路径
+    :param output_dir: 输出目录
+    :param config: 配置参数
+    :return: 写入清单的处理记录
+    """
+    started = time.monotonic()
+    sensor = ReplaySensor(config, source, speed=0)
+    detector = SleepStageDetector(config)
+    alarm = SmartAlarm(config)
+    alarm_settings = config['alarm_settings']
+    skip_non_real = config.get('device_settings', {}).get('skip_non_real_samples', False)
+
+    stages_name = f"stages_{night}.jsonl"
+    wake_up = None
+    heart_rates = []
+    movements = []
+    stage_counts = {}
+
+    # 按配置跳过插值或模拟的样本（来源统计仍包含这些样本）
+    samples = (sensor_data for sensor_data in sensor if not skip_non_real or is_real(sensor_data))
+    if resampling_enabled(config):
+        # 与实时采集使用同一个网格：整晚向量化重采样后逐桶检测，缺口桶不参与检测
+        samples = [bucket for bucket in iter_buckets(resample_samples(samples, config)) if not bucket['gap']]
+
+    with open(os.path.join(output_dir, stages_name + '.tmp'), 'w', encoding='utf-8') as stages_file:
+        for sensor_data in samples:
+            sleep_stage = detector.detect_stage(sensor_data)
+
+            heart_rates.append(sensor_data['heart_rate'])
+            movements.append(sensor_data['movement'])
+            stage_counts[sleep_stage] = stage_counts.get(sleep_stage, 0) + 1
+
+            stages_file.write(json.dumps({
+                'timestamp': sample_timestamp(sensor_data),
+                'heart_rate': sensor_data['heart_rate'],
+                'movement': sensor_data['movement'],
+                'sleep_stage': sleep_stage,
+                'provenance': sensor_data.get('provenance', REAL)
+            }, ensure_ascii=False) + '\n')
+
+            # 以该晚第一个处理的样本为参考时间计算唤醒时间，找到第一个唤醒时刻即可
+            current_time = epoch_ms_to_datetime(sample_epoch_ms(sensor_data))
+            if len(heart_rates) == 1:
+                alarm.update_wake_time(alarm_settings['wake_time'], reference_time=current_time)
+            if wake_up is None and alarm.should_wake_up(sleep_stage, current_time):
+                wake_up = {'time': current_time.isoformat(), 'sleep_stage': sleep_stage}
+
+    os.replace(os.path.join(output_dir, stages_name + '.tmp'), os.path.join(output_dir, stages_name))
+
+    summary = {
+        'date': night,
+        'total_records': len(heart_rates),
+        'avg_heart_rate': sum(heart_rates) / len(heart_rates) if heart_rates else 0,
+        'max_heart_rate': max(heart_rates) if heart_rates else 0,
+        'min_heart_rate': min(heart_rates) if heart_rates else 0,
+        'avg_movement': sum(movements) / len(movements) if movements else 0,
+        'sleep_stage_distribution': stage_counts,
+        'provenance': sensor.provenance.as_dict()
+    }
+
+    result_name = f"result_{night}.json"
+    _write_json_atomic(os.path.join(output_dir, result_name), {
+        'night': night,
+        'source': source,
+        'summary': summary,
+        'wake_up': wake_up
+    })
+
+    return {
+        'status': 'done',
+        'result': result_name,
+        'stages': stages_name,
+        'records': len(heart_rates),
+        'elapsed': round(time.monotonic() - started, 3)
+    }
+
+
+def _write_json_atomic(path, data):
+    """先写临时文件再替换，避免中断时留下不完整的文件"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_manifest(output_dir):
+    """加载处理清单"""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {'nights': {}}
+
+
+def _source_fingerprint(source):
+    """数据文件的大小和修改时间，用于判断是否需要重新处理"""
+    stat = os.stat(source)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def _is_up_to_date(entry, source, digest, output_dir):
+    """判断清单中的记录是否仍然有效"""
+    if not entry or entry.get('status') != 'done' or entry.get('config_hash') != digest:
+        return False
+    if entry.get('source') != source or {k: entry.get(k) for k in ('size', 'mtime')} != _source_fingerprint(source):
+        return False
+    return all(os.path.exists(os.path.join(output_dir, entry[key])) for key in ('result', 'stages'))
+
+
+def _import_night(history, output_dir, entry, device_id, night):
+    """
+    把一晚的处理结果导入历史数据库并生成睡眠报告（只在主进程中调用）
+    :return: 导入失败时返回错误信息，成功时返回None
+    """
+    try:
+        history.import_file(os.path.join(output_dir, entry['stages']), device_id, night)
+        generate_report(history, device_id, night)
+    except Exception as e:
+        logger.error(f"导入 {night} 到历史数据库失败: {e}")
+        return f"导入历史数据失败: {e}"
+    return None
+
+
+def reprocess(data_dir, output_dir, config, start_date=None, end_date=None, workers=None, force=False,
+              history=None, device_id=DEFAULT_DEVICE_ID):
+    """
+    并行重处理多晚睡眠数据
+    :param data_dir: 数据目录
+    :param output_dir: 输出目录
+    :param config: 配置参数
+    :param start_date: 开始日期（YYYYMMDD）
+    :param end_date: 结束日期（YYYYMMDD）
+    :param workers: 进程数，默认使用全部CPU核心
+    :param force: 是否忽略已有结果全部重新处理
+    :param history: 历史数据存储（HistoryStore，可选），处理完成的夜晚导入其中并生成睡眠报告，
+                    已处理但还没有导入的夜晚直接导入，不重新处理
+    :param device_id: 导入历史数据时使用的设备ID
+    :return: 处理清单
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    nights = find_nights(data_dir, start_date, end_date)
+    manifest = load_manifest(output_dir)
+    digest = config_hash(config)
+
+    pending = {
+        night: source for night, source in nights.items()
+        if force or not _is_up_to_date(manifest['nights'].get(night), source, digest, output_dir)
+    }
+    # 已是最新但历史数据库中没有的夜晚只需要导入
+    backfill = [night for night in nights if night not in pending and history is not None
+                and history.get_night(device_id, night) is None]
+    logger.info(f"共 {len(nights)} 晚数据，需要处理 {len(pending)} 晚，需要导入 {len(backfill)} 晚")
+
+    for night in backfill:
+        entry = manifest['nights'][night]
+        error = _import_night(history, output_dir, entry, device_id, night)
+        if error is not None:
+            entry.update(status='failed', error=error)
+            manifest['updated'] = datetime.now().isoformat()
+            _write_json_atomic(os.path.join(output_dir, MANIFEST_NAME), manifest)
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            futures = {
+                executor.submit(process_night, night, source, output_dir, config): night
+                for night, source in pending.items()
+            }
+            for future in as_completed(futures):
+                night = futures[future]
+                source = pending[night]
+                try:
+                    entry = future.result()
+                except Exception as e:
+                    logger.error(f"处理 {night} 失败: {e}")
+                    entry = {'status': 'failed', 'error': str(e)}
+
+                # 数据库只在主进程中写入，导入失败的夜晚标记为失败，下次运行时重新处理
+                if history is not None and entry['status'] == 'done':
+                    error = _import_night(history, output_dir, entry, device_id, night)
+                    if error is not None:
+                        entry.update(status='failed', error=error)
+
+                entry.update(_source_fingerprint(source))
+                entry['source'] = source
+                entry['config_hash'] = digest
+                entry['processed_at'] = datetime.now().isoformat()
+                manifest['nights'][night] = entry
+
+                # 每完成一晚就保存清单，中断后可以从这里继续
+                manifest['updated'] = datetime.now().isoformat()
+                _write_json_atomic(os.path.join(output_dir, MANIFEST_NAME), manifest)
+                logger.info(f"{night}: {entry['status']}")
+
+    return manifest
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='批量重处理已存储的睡眠数据')
+    parser.add_argument('data_dir', help='睡眠数据目录')
+    parser.add_argument('-o', '--output', default='reprocessed', help='输出目录')
+    parser.add_argument('--start', help='开始日期（YYYYMMDD）')
+    parser.add_argument('--end', help='结束日期（YYYYMMDD）')
+    parser.add_argument('-j', '--workers', type=int, help='进程数，默认使用全部CPU核心')
+    parser.add_argument('-c', '--config', help='配置文件路径')
+    parser.add_argument('--force', action='store_true', help='忽略已有结果，全部重新处理')
+    parser.add_argument('--history', help='历史数据库路径，处理结果导入其中供历史查询接口使用')
+    parser.add_argument('--device-id', default=DEFAULT_DEVICE_ID, help='导入历史数据时使用的设备ID')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.config:
+        config = load_config_file(args.config)
+    else:
+        config = load_config()
+
+    history = HistoryStore(args.history) if args.history else None
+    try:
+        manifest = reprocess(args.data_dir, args.output, config, args.start, args.end, args.workers, args.force,
+                             history, args.device_id)
+    finally:
+        if history is not None:
+            history.close()
+    failed = [night for night, entry in manifest['nights'].items() if entry['status'] != 'done']
+    if failed:
+        logger.error(f"以下夜晚处理失败: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,30 @@
 """
 红米手环2传感器模块
 
-该模块包含传感器模拟器、真实硬件接口和蓝牙接口
+该模块包含传感器模拟器、真实硬件接口、蓝牙接口和数据回放传感器
+各传感器按需导入（见registry），导入本包不会加载蓝牙或HTTP依赖
 """
-from .sensor_simulator import SensorSimulator
-from .hardware_sensor import HardwareSensor
-from .bluetooth_sensor import BluetoothSensor, BluetoothManager
+import importlib
 
-__all__ = ['SensorSimulator', 'HardwareSensor', 'BluetoothSensor', 'BluetoothManager']
\ No newline at end of file
+from .registry import create_sensor, register_sensor, resolve_sensor, sensor_types
+
+_LAZY_ATTRIBUTES = {
+    'SensorSimulator': '.sensor_simulator',
+    'HardwareSensor': '.hardware_sensor',
+    'BluetoothSensor': '.bluetooth_sensor',
+    'BluetoothManager': '.bluetooth_sensor',
+    'ReplaySensor': '.replay_sensor'
+}
+
+__all__ = ['SensorSimulator', 'HardwareSensor', 'BluetoothSensor', 'BluetoothManager', 'ReplaySensor',
+           'create_sensor', 'register_sensor', 'resolve_sensor', 'sensor_types']
+
+
+def __getattr__(name):
+    """第一次访问传感器类时才导入对应模块"""
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,160 @@
+"""
+传感器数据采集线程
+
+在后台线程中读取传感器数据、检测睡眠阶段并判断是否唤醒，
+界面线程读取最新的快照进行显示，并从有界队列中取出全部新快照进行记录
+（采集可能比界面刷新更快，如唤醒窗口内的快速采样）
+设置了重采样器时，样本先按固定网格分桶，每个结束的非缺口桶作为一个样本检测和发布
+"""
+import threading
+import time
+import logging
+from collections import deque
+from datetime import datetime
+
+from .provenance import is_real
+
+logger = logging.getLogger(__name__)
+
+# 等待界面线程取出的快照最多保留的数量，界面长时间未取出时丢弃最旧的快照
+DEFAULT_QUEUE_SIZE = 1024
+
+
+class AcquisitionWorker:
+    """后台传感器数据采集器"""
+
+    def __init__(self, sensor, detector, alarm, interval=1.0, on_alarm=None, scheduler=None, skip_non_real=False,
+                 queue_size=DEFAULT_QUEUE_SIZE, resampler=None):
+        """
+        初始化采集器
+        :param sensor: 传感器实例
+        :param detector: 睡眠阶段检测器
+        :param alarm: 智能闹钟
+        :param interval: 采集间隔（秒）
+        :param on_alarm: 需要唤醒时调用的回调，在采集线程中调用，应自行切换到界面线程
+        :param scheduler: 自适应采样调度器（可选），设置后采集间隔由调度器决定
+        :param skip_non_real: 是否跳过非真实（插值或模拟）的样本，跳过的样本不进行检测，也不会发布
+        :param queue_size: 等待取出的快照队列长度
+        :param resampler: 实时重采样器（StreamingResampler，可选），见create_resampler
+        """
+        self.sensor = sensor
+        self.detector = detector
+        self.alarm = alarm
+        self.interval = interval
+        self.on_alarm = on_alarm
+        self.scheduler = scheduler
+        self.resampler = resampler
+
+        # 最新快照，整体替换引用，读取方无需加锁
+        self.latest = None
+        self.sequence = 0
+        self.alarm_requested = False
+        self.skip_non_real = skip_non_real
+        self.skipped_samples = 0
+        self.dropped_snapshots = 0
+
+        # 已发布但尚未被drain取出的快照（deque的append和popleft是线程安全的）
+        self._pending = deque(maxlen=queue_size)
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """启动采集线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='sensor-acquisition', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """停止采集线程"""
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def is_running(self):
+        """采集线程是否在运行"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def drain(self):
+        """
+        取出自上次调用以来发布的全部快照（界面线程调用）
+        :return: 快照列表，按发布顺序
+        """
+        snapshots = []
+        pending = self._pending
+        while pending:
+            try:
+                snapshots.append(pending.popleft())
+            except IndexError:
+                break
+        return snapshots
+
+    def _run(self):
+        """采集循环"""
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            try:
+                self.acquire_once()
+            except Exception as e:
+                logger.error(f"采集传感器数据时出错: {e}")
+
+            delay = self.interval - (time.monotonic() - started)
+            self._stop_event.wait(max(0.0, delay))
+
+    def acquire_once(self):
+        """
+        采集一次数据并发布快照
+        :return: 最后发布的快照，传感器无数据、样本被跳过或重采样的桶尚未结束时返回None
+        """
+        sensor_data = self.sensor.get_sensor_data()
+        if sensor_data is None:
+            return None
+        if self.skip_non_real and not is_real(sensor_data):
+            self.skipped_samples += 1
+            return None
+
+        if self.resampler is None:
+            samples = (sensor_data,)
+        else:
+            # 缺口桶没有数据，不参与检测
+            samples = [bucket for bucket in self.resampler.add(sensor_data) if not bucket['gap']]
+        if not samples:
+            return None
+
+        device_info = self.sensor.get_device_info()
+        for sample in samples:
+            snapshot = self._publish(sample, self.detector.detect_stage(sample), device_info)
+        sensor_data, sleep_stage = snapshot['sensor_data'], snapshot['sleep_stage']
+
+        # 唤醒判断在采集线程中完成，触发闹钟交给回调切换到界面线程
+        current_time = datetime.now()
+        if not self.alarm_requested and self.alarm.should_wake_up(sleep_stage, current_time):
+            self.alarm_requested = True
+            if self.on_alarm is not None:
+                self.on_alarm()
+
+        # 根据最新状态调整下一次采集的间隔，并同步给检测器
+        if self.scheduler is not None:
+            self.interval = self.scheduler.next_interval(
+                sensor_data, sleep_stage, current_time, self.alarm.is_in_wake_window(current_time))
+            self.detector.set_sampling_interval(self.interval)
+
+        return snapshot
+
+    def _publish(self, sensor_data, sleep_stage, device_info):
+        """发布一个快照"""
+        self.sequence += 1
+        snapshot = {
+            'sequence': self.sequence,
+            'sensor_data': sensor_data,
+            'sleep_stage': sleep_stage,
+            'device_info': device_info
+        }
+        self.latest = snapshot
+        if len(self._pending) == self._pending.maxlen:
+            self.dropped_snapshots += 1
+        self._pending.append(snapshot)
+        return snapshot
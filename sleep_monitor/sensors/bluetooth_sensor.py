@@ -11,8 +11,17 @@ import random
 import threading
 import queue
 
+from ..utils.time_utils import now_ms
+from ..utils import metrics
+from .provenance import ProvenanceTracker, SIMULATED
+
 logger = logging.getLogger(__name__)
 
+_READ_SECONDS = metrics.histogram('sensor_read_seconds', '读取一次传感器数据的耗时（秒）', ('sensor',)).labels('bluetooth')
+_ERRORS = metrics.counter('sensor_errors_total', '传感器错误次数', ('sensor', 'kind'))
+_RECONNECTS = metrics.counter('bluetooth_reconnects_total', '蓝牙重新连接次数')
+_QUEUE_DEPTH = metrics.gauge('sensor_queue_depth', '传感器数据队列中等待读取的数据数', ('sensor',)).labels('bluetooth')
+
 try:
     import bluetooth  # PyBluez library for Bluetooth
     BLUETOOTH_AVAILABLE = True
@@ -46,6 +55,9 @@ class BluetoothSensor:
         self.monitoring_thread = None
         self.stop_monitoring = threading.Event()
         
+        # 样本来源标记和统计
+        self.provenance = ProvenanceTracker(config, 'bluetooth')
+        
         # 模拟数据模式（当蓝牙不可用时）
         self.use_simulation = not BLUETOOTH_AVAILABLE
         
@@ -133,17 +145,20 @@ class BluetoothSensor:
                         parsed_data = self._parse_sensor_data(data)
                         if parsed_data:
                             self.data_queue.put(parsed_data)
+                            _QUEUE_DEPTH.set(self.data_queue.qsize())
                 
                 time.sleep(0.1)  # 避免过度占用CPU
                 
             except bluetooth.btcommon.BluetoothError as e:
                 logger.error(f"蓝牙数据读取错误: {e}")
+                _ERRORS.labels('bluetooth', 'bluetooth').inc()
                 if "Connection reset by peer" in str(e) or "Connection timed out" in str(e):
                     # 尝试重新连接
                     self._reconnect()
                 break
             except Exception as e:
                 logger.error(f"监测数据时发生错误: {e}")
+                _ERRORS.labels('bluetooth', 'monitor').inc()
                 break
     
     def _parse_sensor_data(self, raw_data):
@@ -173,12 +188,14 @@ class BluetoothSensor:
         
         except Exception as e:
             logger.error(f"解析传感器数据失败: {e}")
+            _ERRORS.labels('bluetooth', 'parse').inc()
         
         return None
     
     def _reconnect(self):
         """重新连接到设备"""
         logger.info("尝试重新连接到设备...")
+        _RECONNECTS.inc()
         try:
             if self.sock:
                 self.sock.close()
@@ -191,29 +208,46 @@ class BluetoothSensor:
     def get_sensor_data(self):
         """
         获取传感器数据
+        provenance字段标记样本来源：实时数据为real，缺失的字段沿用最近的真实值（interpolated）或使用模拟值（simulated）
         :return: 包含心率和体动数据的字典
         """
         if self.use_simulation:
             # 返回模拟数据，但更贴近真实情况
-            return self._get_simulation_data()
+            return self.provenance.mark(self._get_simulation_data(), SIMULATED)
+        
+        started = time.perf_counter()
         
         # 首先尝试从队列获取实时数据
+        data = None
         try:
             while not self.data_queue.empty():
-                data = self.data_queue.get_nowait()
-                if data and isinstance(data, dict):
-                    return {
-                        'timestamp': datetime.now().isoformat(),
-                        'heart_rate': data.get('heart_rate', self._get_realistic_heart_rate()),
-                        'movement': data.get('movement', self._get_realistic_movement()),
-                        'battery_level': data.get('battery', random.randint(30, 100)),
-                        'device_status': 'connected'
-                    }
+                item = self.data_queue.get_nowait()
+                if item and isinstance(item, dict):
+                    data = item
+                    break
         except queue.Empty:
             pass
+        _QUEUE_DEPTH.set(self.data_queue.qsize())
         
-        # 如果队列为空，使用最近的实时数据或回退到模拟数据
-        return self._get_simulation_data()
+        # 队列为空时所有字段都缺失，沿用最近的实时数据或回退到模拟数据
+        data = data or {}
+        ts = now_ms()
+        sensor_data = {
+            'ts': ts,
+            'heart_rate': data.get('heart_rate'),
+            'movement': data.get('movement'),
+            'battery_level': data.get('battery'),
+            'device_status': 'connected'
+        }
+        sensor_data = self.provenance.fill(sensor_data, self._simulate_field)
+        _READ_SECONDS.observe(time.perf_counter() - started)
+        return sensor_data
+    
+    def _simulate_field(self, field):
+        """生成单个字段的模拟值"""
+        if field == 'heart_rate':
+            return self._get_realistic_heart_rate()
+        return self._get_realistic_movement()
     
     def _get_realistic_heart_rate(self):
         """获取符合当前时间的合理心率值"""
@@ -244,8 +278,9 @@ class BluetoothSensor:
         heart_rate = base_heart_rate + random.randint(-5, 5)
         movement = max(0, base_movement + random.uniform(-1, 2))
         
+        ts = now_ms()
         return {
-            'timestamp': datetime.now().isoformat(),
+            'ts': ts,
             'heart_rate': max(40, min(120, heart_rate)),
             'movement': round(max(0, movement), 2),
             'battery_level': random.randint(30, 100),
@@ -260,7 +295,8 @@ class BluetoothSensor:
             'device_address': self.device_address,
             'device_name': self.device_name,
             'use_simulation': self.use_simulation,
-            'bluetooth_available': BLUETOOTH_AVAILABLE
+            'bluetooth_available': BLUETOOTH_AVAILABLE,
+            'provenance': self.provenance.counter.as_dict()
         }
     
     def disconnect(self):
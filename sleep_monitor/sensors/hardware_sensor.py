@@ -10,8 +10,15 @@ from datetime import datetime
 import logging
 import random
 
+from ..utils.time_utils import now_ms
+from ..utils import metrics
+from .provenance import ProvenanceTracker, SIMULATED
+
 logger = logging.getLogger(__name__)
 
+_READ_SECONDS = metrics.histogram('sensor_read_seconds', '读取一次传感器数据的耗时（秒）', ('sensor',)).labels('hardware')
+_ERRORS = metrics.counter('sensor_errors_total', '传感器错误次数', ('sensor', 'kind'))
+
 
 class HardwareSensor:
     """红米手环2真实传感器数据接入类"""
@@ -27,6 +34,7 @@ class HardwareSensor:
         self.api_base_url = self.device_settings.get('api_base_url', 'http://localhost:8080/api')
         self.access_token = self.device_settings.get('access_token', '')
         self.device_id = self.device_settings.get('device_id', '')
+        self.request_timeout = self.device_settings.get('request_timeout', 5)  # API请求超时（秒）
         
         # API端点配置
         self.endpoints = {
@@ -41,6 +49,9 @@ class HardwareSensor:
         self.is_connected = False
         self.last_sync_time = None
         
+        # 样本来源标记和统计
+        self.provenance = ProvenanceTracker(config, 'hardware')
+        
         # 模拟连接到设备
         self._connect_device()
     
@@ -71,10 +82,13 @@ class HardwareSensor:
             self.is_connected = False
     
     def _make_api_request(self, endpoint, method='GET', data=None):
-        """执行API请求"""
+        """
+        执行API请求
+        :return: 响应数据，请求失败时返回None（由调用方决定如何处理缺失的数据）
+        """
         if not self.is_connected:
-            logger.warning("设备未连接，使用模拟数据")
-            return self._get_simulation_fallback()
+            logger.warning("设备未连接，无法请求API")
+            return None
         
         headers = {
             'Authorization': f'Bearer {self.access_token}',
@@ -84,11 +98,11 @@ class HardwareSensor:
         response = None
         try:
             if method == 'GET':
-                response = requests.get(endpoint, headers=headers)
+                response = requests.get(endpoint, headers=headers, timeout=self.request_timeout)
             elif method == 'POST':
-                response = requests.post(endpoint, headers=headers, json=data)
+                response = requests.post(endpoint, headers=headers, json=data, timeout=self.request_timeout)
             elif method == 'PUT':
-                response = requests.put(endpoint, headers=headers, json=data)
+                response = requests.put(endpoint, headers=headers, json=data, timeout=self.request_timeout)
             
             if response and response.status_code == 200:
                 return response.json()
@@ -97,36 +111,29 @@ class HardwareSensor:
                     logger.error(f"API请求失败: {response.status_code}, {response.text}")
                 else:
                     logger.error(f"API请求失败: 无响应")
-                return self._get_simulation_fallback()
+                _ERRORS.labels('hardware', 'http_status').inc()
+                return None
                 
         except requests.exceptions.RequestException as e:
             logger.error(f"API请求异常: {e}")
-            return self._get_simulation_fallback()
+            _ERRORS.labels('hardware', 'request').inc()
+            return None
         except Exception as e:
             logger.error(f"获取传感器数据异常: {e}")
-            return self._get_simulation_fallback()
-    
-    def _get_simulation_fallback(self):
-        """获取模拟数据作为备选方案"""
-        # 当无法获取真实数据时，返回模拟数据
-        # 这确保系统在没有真实设备时仍可运行
-        return {
-            'timestamp': datetime.now().isoformat(),
-            'heart_rate': random.randint(60, 80),
-            'movement': round(random.uniform(1, 10), 2),
-            'battery_level': random.randint(20, 100),
-            'device_status': 'normal'
-        }
+            _ERRORS.labels('hardware', 'response').inc()
+            return None
     
     def get_sensor_data(self):
         """
         获取真实传感器数据
+        缺失的字段沿用最近的真实值或使用模拟值，provenance字段标记样本来源
         :return: 包含心率和体动数据的字典
         """
         if not self.is_connected:
             logger.warning("设备未连接，使用模拟数据")
-            return self._get_realistic_simulation()
+            return self.provenance.mark(self._get_realistic_simulation(), SIMULATED)
         
+        started = time.perf_counter()
         try:
             # 从API获取心率数据
             heart_rate_data = self._make_api_request(self.endpoints['heart_rate'])
@@ -135,8 +142,9 @@ class HardwareSensor:
             movement_data = self._make_api_request(self.endpoints['movement'])
             
             # 合并数据
+            ts = now_ms()
             sensor_data = {
-                'timestamp': datetime.now().isoformat(),
+                'ts': ts,
                 'heart_rate': self._extract_heart_rate(heart_rate_data),
                 'movement': self._extract_movement(movement_data),
                 'battery_level': self._extract_battery_level(heart_rate_data),
@@ -146,11 +154,14 @@ class HardwareSensor:
             # 更新最后同步时间
             self.last_sync_time = datetime.now()
             
-            return sensor_data
+            return self.provenance.fill(sensor_data, self._simulate_field)
             
         except Exception as e:
             logger.error(f"获取传感器数据失败: {e}，返回模拟数据")
-            return self._get_realistic_simulation()
+            _ERRORS.labels('hardware', 'read').inc()
+            return self.provenance.mark(self._get_realistic_simulation(), SIMULATED)
+        finally:
+            _READ_SECONDS.observe(time.perf_counter() - started)
     
     def _extract_heart_rate(self, data):
         """从API响应中提取心率数据"""
@@ -162,8 +173,8 @@ class HardwareSensor:
             elif 'bpm' in data:
                 return max(40, min(120, data['bpm']))
         
-        # 如果无法从API获取，返回合理的随机值
-        return random.randint(60, 80)
+        # 无法从API获取时返回None，由来源标记决定如何补全
+        return None
     
     def _extract_movement(self, data):
         """从API响应中提取体动数据"""
@@ -175,14 +186,14 @@ class HardwareSensor:
             elif 'value' in data:
                 return max(0, min(20, data['value']))
         
-        # 如果无法从API获取，返回合理的随机值
-        return round(random.uniform(1, 8), 2)
+        # 无法从API获取时返回None，由来源标记决定如何补全
+        return None
     
     def _extract_battery_level(self, data):
         """从API响应中提取电池电量"""
         if isinstance(data, dict) and 'battery_level' in data:
             return max(0, min(100, data['battery_level']))
-        return random.randint(30, 100)
+        return None
     
     def _extract_device_status(self, data):
         """从API响应中提取设备状态"""
@@ -190,6 +201,12 @@ class HardwareSensor:
             return data['status']
         return 'normal'
     
+    def _simulate_field(self, field):
+        """生成单个字段的模拟值"""
+        if field == 'heart_rate':
+            return random.randint(60, 80)
+        return round(random.uniform(1, 8), 2)
+    
     def _get_realistic_simulation(self):
         """获取更贴近真实情况的模拟数据"""
         # 模拟真实传感器数据的变化模式
@@ -209,8 +226,9 @@ class HardwareSensor:
         heart_rate = base_heart_rate + random.randint(-10, 10)
         movement = max(0, base_movement + random.uniform(-1, 5))
         
+        ts = now_ms()
         return {
-            'timestamp': datetime.now().isoformat(),
+            'ts': ts,
             'heart_rate': max(40, min(120, heart_rate)),
             'movement': round(max(0, movement), 2),
             'battery_level': random.randint(20, 100),
@@ -232,7 +250,7 @@ class HardwareSensor:
             
             response = self._make_api_request(self.endpoints['sync'], 'POST', sync_data)
             
-            if 'success' in response and response['success']:
+            if response and response.get('success'):
                 logger.info("设备数据同步成功")
                 self.last_sync_time = datetime.now()
                 return True
@@ -252,14 +270,16 @@ class HardwareSensor:
     def get_device_info(self):
         """获取设备信息"""
         if not self.is_connected:
-            return {'connected': False, 'device_model': self.device_model}
+            return {'connected': False, 'device_model': self.device_model,
+                    'provenance': self.provenance.counter.as_dict()}
         
         return {
             'connected': True,
             'device_model': self.device_model,
             'device_id': self.device_id,
             'battery_level': self._get_current_battery_level(),
-            'last_sync': self.last_sync_time.isoformat() if self.last_sync_time else None
+            'last_sync': self.last_sync_time.isoformat() if self.last_sync_time else None,
+            'provenance': self.provenance.counter.as_dict()
         }
     
     def _get_current_battery_level(self):
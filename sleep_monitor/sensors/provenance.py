@@ -0,0 +1,133 @@
+"""
+样本来源标记
+
+每个样本带有provenance字段，说明数据的来源：
+- real: 设备实际测量的数据
+- interpolated: 设备暂时没有数据，沿用最近一次的真实测量值
+- simulated: 没有可用的真实数据，由模拟生成
+
+处理流程可以据此在检测和存储前跳过非真实样本，并统计一晚中真实数据的比例
+"""
+import threading
+
+from ..utils import metrics
+
+
+REAL = 'real'
+INTERPOLATED = 'interpolated'
+SIMULATED = 'simulated'
+
+# 按可信程度从高到低排列，多个字段来源不同时取最差的一个
+PROVENANCES = (REAL, INTERPOLATED, SIMULATED)
+
+# 非real的样本即为回退数据，按传感器和来源统计
+_SAMPLES = metrics.counter('sensor_samples_total', '按来源统计的传感器样本数', ('sensor', 'provenance'))
+
+
+def combine(*provenances):
+    """多个字段的来源合并为样本的来源（取可信程度最低的）"""
+    return max(provenances, key=PROVENANCES.index)
+
+
+def is_real(sensor_data):
+    """
+    样本是否为真实测量的数据
+    未标记来源的样本（加入该字段之前存储的数据）视为真实数据
+    """
+    return sensor_data.get('provenance', REAL) == REAL
+
+
+class ProvenanceCounter:
+    """按来源统计样本数量"""
+
+    def __init__(self, sensor=None):
+        """
+        :param sensor: 传感器名称，设置后同时计入运行指标sensor_samples_total
+        """
+        self._lock = threading.Lock()
+        self.counts = dict.fromkeys(PROVENANCES, 0)
+        self.sensor = sensor
+
+    def record(self, sensor_data):
+        """记录一个样本"""
+        provenance = sensor_data.get('provenance', REAL)
+        with self._lock:
+            self.counts[provenance] = self.counts.get(provenance, 0) + 1
+        if self.sensor is not None:
+            _SAMPLES.labels(self.sensor, provenance).inc()
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def as_dict(self):
+        """统计结果，real_ratio为真实样本的比例"""
+        with self._lock:
+            counts = dict(self.counts)
+        total = sum(counts.values())
+        counts['total'] = total
+        counts['real_ratio'] = round(counts[REAL] / total, 4) if total else None
+        return counts
+
+    def reset(self):
+        """清空统计（新的一晚开始时调用）"""
+        with self._lock:
+            self.counts = dict.fromkeys(PROVENANCES, 0)
+
+
+class ProvenanceTracker:
+    """
+    为传感器补全缺失的字段并标记来源
+
+    缺失的字段在最近一次真实测量不超过max_hold_seconds时沿用该值（interpolated），
+    否则由传感器提供的模拟函数生成（simulated）
+    """
+
+    FIELDS = ('heart_rate', 'movement')
+
+    def __init__(self, config, sensor=None):
+        """
+        :param config: 配置参数，device_settings.max_hold_seconds 为沿用真实值的最长时间（默认2个采样间隔）
+        :param sensor: 传感器名称，用于运行指标
+        """
+        sampling_rate = config.get('sleep_detection', {}).get('sampling_rate', 60)
+        self.max_hold_ms = config.get('device_settings', {}).get('max_hold_seconds', 2 * sampling_rate) * 1000
+        self.counter = ProvenanceCounter(sensor)
+        self._last_real = {}  # 字段 -> (值, epoch毫秒)
+
+    def fill(self, sensor_data, simulate):
+        """
+        补全样本中缺失（None）的字段，设置provenance并计数
+        :param sensor_data: 样本，必须包含ts
+        :param simulate: simulate(字段) 返回该字段的模拟值
+        :return: 补全后的样本
+        """
+        ts = sensor_data['ts']
+        provenances = []
+        for field in self.FIELDS:
+            value = sensor_data.get(field)
+            if value is not None:
+                self._last_real[field] = (value, ts)
+                provenances.append(REAL)
+                continue
+
+            last = self._last_real.get(field)
+            if last is not None and ts - last[1] <= self.max_hold_ms:
+                sensor_data[field] = last[0]
+                provenances.append(INTERPOLATED)
+            else:
+                sensor_data[field] = simulate(field)
+                provenances.append(SIMULATED)
+
+        sensor_data['provenance'] = combine(*provenances)
+        self.counter.record(sensor_data)
+        return sensor_data
+
+    def mark(self, sensor_data, provenance):
+        """
+        为整体生成的样本（如模拟数据）设置来源并计数
+        :return: 样本
+        """
+        sensor_data['provenance'] = provenance
+        self.counter.record(sensor_data)
+        return sensor_data
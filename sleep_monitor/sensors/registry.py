@@ -0,0 +1,112 @@
+"""
+传感器后端注册表
+
+按配置项 device_settings.sensor_type 的名称在需要时才导入对应的传感器模块，
+使用模拟器或回放时不会加载蓝牙、HTTP等依赖，命令行工具和测试可以快速启动
+"""
+import importlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# 名称 -> "模块:类名"（相对于本包），或接受config返回传感器的工厂函数
+SENSORS = {
+    'bluetooth': '.bluetooth_sensor:BluetoothSensor',
+    'hardware': '.hardware_sensor:HardwareSensor',
+    'simulator': '.sensor_simulator:SensorSimulator',
+    'replay': '.replay_sensor:ReplaySensor'
+}
+
+# 配置中使用过的其他名称
+ALIASES = {
+    'api': 'hardware',
+    'simulation': 'simulator'
+}
+
+DEFAULT_SENSOR_TYPE = 'bluetooth'
+
+# 未知名称或后端无法导入时使用的后端
+FALLBACK_SENSOR_TYPE = 'simulator'
+
+# sensor_type为auto时依次尝试的后端
+AUTO_ORDER = ('bluetooth', 'hardware', 'simulator')
+
+_resolved = {}
+
+
+def register_sensor(name, factory):
+    """
+    注册传感器后端
+    :param name: 名称，配置项 device_settings.sensor_type 使用
+    :param factory: "模块:类名"字符串（导入推迟到第一次使用），或接受config返回传感器的工厂函数
+    """
+    SENSORS[name] = factory
+    _resolved.pop(name, None)
+
+
+def sensor_types():
+    """已注册的后端名称"""
+    return sorted(SENSORS)
+
+
+def canonical_name(sensor_type):
+    """将别名转换为注册的名称"""
+    return ALIASES.get(sensor_type, sensor_type)
+
+
+def resolve_sensor(sensor_type):
+    """
+    取得后端的工厂（传感器类），第一次调用时才导入模块
+    :param sensor_type: 后端名称或别名
+    :return: 接受config返回传感器的可调用对象
+    :raises KeyError: 未注册的名称
+    :raises ImportError: 后端模块或其依赖无法导入
+    """
+    name = canonical_name(sensor_type)
+    factory = _resolved.get(name)
+    if factory is not None:
+        return factory
+
+    factory = SENSORS[name]
+    if isinstance(factory, str):
+        module_name, _, attribute = factory.partition(':')
+        module = importlib.import_module(module_name, __package__)
+        factory = getattr(module, attribute)
+    _resolved[name] = factory
+    return factory
+
+
+def _resolve_with_fallback(sensor_type):
+    """解析后端，失败时使用FALLBACK_SENSOR_TYPE，返回 (实际名称, 工厂)"""
+    if sensor_type == 'auto':
+        for name in AUTO_ORDER:
+            try:
+                return name, resolve_sensor(name)
+            except ImportError as e:
+                logger.info(f"传感器后端 {name} 不可用: {e}")
+        return FALLBACK_SENSOR_TYPE, resolve_sensor(FALLBACK_SENSOR_TYPE)
+
+    name = canonical_name(sensor_type)
+    try:
+        return name, resolve_sensor(name)
+    except KeyError:
+        logger.warning(f"未知的传感器类型 {sensor_type}，使用 {FALLBACK_SENSOR_TYPE}")
+    except ImportError as e:
+        logger.warning(f"传感器后端 {name} 不可用（{e}），使用 {FALLBACK_SENSOR_TYPE}")
+    return FALLBACK_SENSOR_TYPE, resolve_sensor(FALLBACK_SENSOR_TYPE)
+
+
+def create_sensor(config, sensor_type=None):
+    """
+    根据配置创建传感器
+    :param config: 配置参数
+    :param sensor_type: 后端名称，默认使用 device_settings.sensor_type（未设置时为bluetooth），
+                        auto按AUTO_ORDER选择第一个可用的后端
+    :return: 传感器实例
+    """
+    if sensor_type is None:
+        sensor_type = config.get('device_settings', {}).get('sensor_type', DEFAULT_SENSOR_TYPE)
+    name, factory = _resolve_with_fallback(sensor_type)
+    logger.info(f"使用传感器后端: {name} (配置要求: {sensor_type})")
+    return factory(config)
@@ -0,0 +1,319 @@
+"""
+红米手环2睡眠数据回放传感器
+
+从已存储的夜间记录（JSON、CSV、JSON Lines等）中按需读取样本，
+以与其他传感器相同的接口回放，支持倍速播放和定位
+"""
+import csv
+import json
+import os
+import time
+import logging
+from datetime import datetime
+
+from ..utils.time_utils import sample_epoch_ms, to_epoch_ms
+from .provenance import ProvenanceCounter
+
+logger = logging.getLogger(__name__)
+
+# 数值字段，CSV读取时需要转换类型
+_NUMERIC_FIELDS = ('heart_rate', 'movement', 'battery_level')
+
+
+def _read_json_array(path, chunk_size=65536):
+    """
+    逐条读取JSON数组文件（DataLogger.log_sleep_data的格式）
+    使用raw_decode增量解析，不会一次性加载整个文件
+    """
+    decoder = json.JSONDecoder()
+    whitespace = ' \t\r\n'
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = ''
+        pos = 0
+        eof = False
+        started = False
+
+        while True:
+            # 跳过空白和分隔符
+            while pos < len(buffer) and buffer[pos] in whitespace + (',' if started else ''):
+                pos += 1
+
+            if pos < len(buffer):
+                if not started:
+                    if buffer[pos] != '[':
+                        raise ValueError(f"不是JSON数组文件: {path}")
+                    pos += 1
+                    started = True
+                    continue
+                if buffer[pos] == ']':
+                    return
+                try:
+                    record, pos = decoder.raw_decode(buffer, pos)
+                    yield record
+                    continue
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+            elif eof:
+                return
+
+            # 缓冲区已耗尽或对象不完整，读取下一块
+            chunk = f.read(chunk_size)
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            if not chunk:
+                eof = True
+
+
+def _read_json_lines(path):
+    """逐行读取JSON Lines文件，无法解析的行（如追加写入中断留下的不完整行）跳过并记录"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.warning(f"跳过 {path} 第{line_number}行无法解析的数据: {e}")
+
+
+def _read_csv(path):
+    """逐行读取CSV文件（DataLogger.log_sleep_data_csv的格式）"""
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            for field in _NUMERIC_FIELDS:
+                value = row.get(field)
+                if value in (None, ''):
+                    continue
+                number = float(value)
+                row[field] = int(number) if number.is_integer() and '.' not in value else number
+            yield row
+
+
+# 按文件扩展名注册的读取器，可通过register_replay_reader扩展新的存储格式
+REPLAY_READERS = {
+    '.json': _read_json_array,
+    '.jsonl': _read_json_lines,
+    '.csv': _read_csv,
+}
+
+
+def register_replay_reader(extension, reader):
+    """
+    注册新的存储格式读取器
+    :param extension: 文件扩展名（如 '.parquet'）
+    :param reader: 接收文件路径、逐条生成样本字典的生成器函数
+    """
+    REPLAY_READERS[extension.lower()] = reader
+
+
+def iter_stored_samples(path):
+    """
+    按文件扩展名选择读取器，逐条生成已存储的样本
+    :param path: 数据文件路径
+    :return: 样本字典生成器
+    """
+    extension = os.path.splitext(path)[1].lower()
+    reader = REPLAY_READERS.get(extension)
+    if reader is None:
+        raise ValueError(f"不支持的数据文件格式: {path}")
+    return reader(path)
+
+
+class ReplaySensor:
+    """已存储睡眠数据的回放传感器"""
+
+    def __init__(self, config, source=None, speed=None, loop=False):
+        """
+        初始化回放传感器
+        :param config: 配置参数
+        :param source: 数据来源，可以是文件、目录、文件列表或样本字典的可迭代对象；
+            生成器等一次性的迭代器只能顺序回放一遍，不能循环回放，读取后也不能rewind或seek
+        :param speed: 回放倍速（1为实时，None或0为不限速）
+        :param loop: 数据回放完毕后是否从头开始
+        :raises ValueError: 一次性的迭代器与loop一起使用
+        """
+        self.config = config
+        self.device_settings = config.get('device_settings', {})
+
+        if source is None:
+            source = self.device_settings.get('replay_source', '')
+        if speed is None:
+            speed = self.device_settings.get('replay_speed', 0)
+
+        # 迭代器的iter()返回自身，重新迭代得不到已读取的样本
+        one_shot = not isinstance(source, str) and iter(source) is source
+        if one_shot and loop:
+            raise ValueError("一次性的迭代器（如生成器）不能循环回放，请传入列表或文件")
+
+        self.source = source
+        self.speed = speed
+        self.loop = loop
+        self._one_shot = one_shot
+        self._consumed = False  # 是否已从数据来源读取过样本
+        self.position = 0  # 已回放的样本数
+        self.exhausted = False
+
+        self._samples = None
+        self._first_sample_time = None
+        self._wall_start = None
+        # 按存储时记录的来源统计回放的样本，未标记来源的旧数据计为真实数据
+        self.provenance = ProvenanceCounter('replay')
+        self.rewind()
+
+    def _source_files(self):
+        """解析数据来源对应的文件列表"""
+        if isinstance(self.source, str):
+            if os.path.isdir(self.source):
+                return sorted(
+                    os.path.join(self.source, name)
+                    for name in os.listdir(self.source)
+                    if os.path.splitext(name)[1].lower() in REPLAY_READERS
+                )
+            return [self.source]
+        return list(self.source)
+
+    def _iter_source(self):
+        """按顺序逐条生成数据来源中的样本"""
+        if isinstance(self.source, str) or (
+                isinstance(self.source, (list, tuple)) and all(isinstance(item, str) for item in self.source)):
+            for path in self._source_files():
+                for record in iter_stored_samples(path):
+                    yield record
+        else:
+            for record in self.source:
+                yield record
+
+    def rewind(self):
+        """
+        回到数据开头
+        :raises ValueError: 一次性的迭代器已经读取过样本
+        """
+        if self._one_shot and self._consumed:
+            raise ValueError("一次性的迭代器（如生成器）读取后不能重新回放，请传入列表或文件")
+        self._samples = self._iter_source()
+        self.position = 0
+        self.exhausted = False
+        self._first_sample_time = None
+        self._wall_start = None
+        self.provenance.reset()
+
+    def seek(self, target):
+        """
+        定位到指定样本
+        :param target: 样本序号（int），或时间（datetime/ISO字符串），定位到不早于该时间的第一个样本
+        :return: 是否定位成功
+        :raises ValueError: 一次性的迭代器已经读取过样本（见rewind）
+        """
+        self.rewind()
+
+        if isinstance(target, int):
+            for _ in range(target):
+                if self._next_record() is None:
+                    return False
+            return True
+
+        target_time = to_epoch_ms(target)
+        while True:
+            record = self._next_record()
+            if record is None:
+                return False
+            record_time = self._record_time(record)
+            # 没有时间的记录无法比较，视为尚未到达目标时间
+            if record_time is not None and record_time >= target_time:
+                # 将该样本放回数据流的开头
+                self._samples = self._prepend(record, self._samples)
+                self.position -= 1
+                return True
+
+    @staticmethod
+    def _prepend(record, samples):
+        """在生成器前插入一条样本"""
+        yield record
+        for item in samples:
+            yield item
+
+    @staticmethod
+    def _record_time(record):
+        """获取样本时间（epoch毫秒）"""
+        if record.get('ts') is None and record.get('timestamp') is None:
+            return None
+        return sample_epoch_ms(record)
+
+    def _next_record(self):
+        """读取下一条原始记录，数据结束时返回None"""
+        self._consumed = True
+        try:
+            record = next(self._samples)
+        except StopIteration:
+            return None
+        self.position += 1
+        return record
+
+    def _wait_until_due(self, record):
+        """按回放倍速等待到样本对应的时刻"""
+        if not self.speed:
+            return
+
+        sample_time = self._record_time(record)
+        if sample_time is None:
+            return
+
+        if self._first_sample_time is None:
+            self._first_sample_time = sample_time
+            self._wall_start = time.monotonic()
+            return
+
+        elapsed = (sample_time - self._first_sample_time) / 1000 / self.speed
+        delay = self._wall_start + elapsed - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def get_sensor_data(self):
+        """
+        获取下一条回放数据
+        :return: 包含心率和体动数据的字典，数据回放完毕时返回None
+        """
+        record = self._next_record()
+        if record is None and self.loop and self.position > 0:
+            self.rewind()
+            record = self._next_record()
+
+        if record is None:
+            if not self.exhausted:
+                logger.info(f"回放数据已结束，共回放 {self.position} 条样本")
+            self.exhausted = True
+            return None
+
+        self._wait_until_due(record)
+
+        sensor_data = dict(record)
+        sensor_data.setdefault('timestamp', datetime.now().isoformat())
+        sensor_data.setdefault('ts', sample_epoch_ms(sensor_data))
+        self.provenance.record(sensor_data)
+        sensor_data.setdefault('device_status', 'replay')
+        return sensor_data
+
+    def __iter__(self):
+        """逐条生成剩余的回放数据"""
+        while True:
+            sensor_data = self.get_sensor_data()
+            if sensor_data is None:
+                return
+            yield sensor_data
+
+    def get_device_info(self):
+        """获取设备信息"""
+        return {
+            'connected': not self.exhausted,
+            'device_model': 'Replay Sensor',
+            'device_address': 'N/A',
+            'device_name': '回放传感器',
+            'use_simulation': False,
+            'bluetooth_available': False,
+            'source': self.source if isinstance(self.source, str) else 'iterable',
+            'position': self.position,
+            'speed': self.speed,
+            'provenance': self.provenance.as_dict()
+        }
@@ -0,0 +1,106 @@
+"""
+共享的最新样本缓存
+
+多个请求同时需要最新样本时（如仪表盘同时请求心率、体动和睡眠数据），
+只对传感器读取一次：
+- 缓存的样本在ttl秒内直接返回
+- 缓存过期时只有一个请求读取传感器，其他并发请求等待这次读取的结果（single-flight），
+  而不是各自访问设备
+"""
+import threading
+import time
+from collections import namedtuple
+
+from ..utils import metrics
+
+_REQUESTS = metrics.counter('sample_cache_requests_total', '最新样本缓存的请求次数（hit命中，miss读取传感器，coalesced等待同一次读取）',
+                            ('result',))
+
+DEFAULT_TTL = 1.0
+
+# 缓存的样本，sequence为读取序号（每次读取传感器加1），fetched_at为读取完成的时间（time.monotonic）
+CachedSample = namedtuple('CachedSample', ['sample', 'sequence', 'fetched_at'])
+
+
+class _Flight:
+    """一次正在进行的传感器读取"""
+
+    __slots__ = ('done', 'entry', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry = None
+        self.error = None
+
+
+class SampleCache:
+    """最新样本缓存"""
+
+    def __init__(self, sensor, ttl=DEFAULT_TTL, clock=time.monotonic):
+        """
+        初始化缓存
+        :param sensor: 传感器实例
+        :param ttl: 样本的有效时间（秒），0表示每次都读取（并发请求仍然合并为一次读取）
+        :param clock: 时间函数（测试使用）
+        """
+        self.sensor = sensor
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entry = None
+        self._flight = None
+        self._sequence = 0
+        self.stats = {'hit': 0, 'miss': 0, 'coalesced': 0}
+
+    def get(self, max_age=None):
+        """
+        取得最新样本，样本是共享的，调用方不应修改
+        :param max_age: 可以接受的最长样本时间（秒），默认为ttl
+        :return: CachedSample，传感器没有数据时sample为None（不缓存）
+        :raises Exception: 传感器读取失败时，本次读取和等待它的请求都收到同一个异常
+        """
+        max_age = self.ttl if max_age is None else max_age
+        with self._lock:
+            entry = self._entry
+            if entry is not None and self._clock() - entry.fetched_at <= max_age:
+                self._count('hit')
+                return entry
+
+            flight = self._flight
+            leader = flight is None
+            if leader:
+                flight = self._flight = _Flight()
+                self._count('miss')
+            else:
+                self._count('coalesced')
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.entry
+
+        try:
+            sample = self.sensor.get_sensor_data()
+            with self._lock:
+                self._sequence += 1
+                flight.entry = CachedSample(sample, self._sequence, self._clock())
+                if sample is not None:
+                    self._entry = flight.entry
+            return flight.entry
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flight = None
+            flight.done.set()
+
+    def invalidate(self):
+        """丢弃缓存的样本，下一次请求重新读取传感器"""
+        with self._lock:
+            self._entry = None
+
+    def _count(self, result):
+        self.stats[result] += 1
+        _REQUESTS.labels(result).inc()
@@ -0,0 +1,122 @@
+"""
+自适应采样调度器
+
+根据睡眠状态、唤醒窗口和电池预算动态调整传感器采样间隔
+"""
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class SamplingScheduler:
+    """自适应采样调度器"""
+
+    def __init__(self, config):
+        """
+        初始化调度器
+        :param config: 配置参数
+        """
+        self.config = config
+        self.sleep_detection = config['sleep_detection']
+        self.device_settings = config.get('device_settings', {})
+
+        # 采样间隔（秒）
+        self.base_interval = self.sleep_detection['sampling_rate']
+        self.min_interval = self.sleep_detection.get('min_sampling_interval', max(1, self.base_interval / 4))
+        self.max_interval = self.sleep_detection.get('max_sampling_interval', self.base_interval * 3)
+        self.movement_threshold = self.sleep_detection['movement_threshold']
+
+        # 深睡眠连续多少个样本后降低采样频率，状态变化后保持高频采样的样本数
+        self.stable_samples = self.sleep_detection.get('stable_deep_sleep_samples', 3)
+        self.fast_hold_samples = self.sleep_detection.get('fast_hold_samples', 3)
+
+        # 电池预算：整晚最多使用的电量百分比，以及每次采样消耗的电量百分比
+        self.max_battery_usage = self.device_settings.get('max_battery_usage', 20)
+        self.sample_battery_cost = self.device_settings.get('sample_battery_cost', 0.02)
+        self.night_duration = self.device_settings.get('night_duration', 8 * 3600)  # 秒
+
+        self.current_interval = self.base_interval
+        self.reason = 'base'
+        self.samples_taken = 0
+        self.started_at = None
+        self.last_stage = None
+        self.stable_count = 0
+        self.fast_remaining = 0
+
+    @property
+    def effective_rate(self):
+        """当前有效采样率（Hz）"""
+        return 1.0 / self.current_interval
+
+    @property
+    def battery_used(self):
+        """已使用的电池电量百分比（估算）"""
+        return self.samples_taken * self.sample_battery_cost
+
+    def next_interval(self, sensor_data, sleep_stage, current_time=None, in_wake_window=False):
+        """
+        根据最新样本计算下一次采样前的等待时间
+        :param sensor_data: 最新的传感器数据
+        :param sleep_stage: 最新检测到的睡眠阶段
+        :param current_time: 当前时间
+        :param in_wake_window: 是否处于唤醒时间窗口
+        :return: 采样间隔（秒）
+        """
+        if current_time is None:
+            current_time = datetime.now()
+        if self.started_at is None:
+            self.started_at = current_time
+        self.samples_taken += 1
+
+        # 睡眠阶段变化或体动较大时，接下来几个样本保持高频采样
+        if sleep_stage != self.last_stage or sensor_data.get('movement', 0) > self.movement_threshold:
+            self.fast_remaining = self.fast_hold_samples
+        if sleep_stage == 'deep_sleep' and sleep_stage == self.last_stage:
+            self.stable_count += 1
+        else:
+            self.stable_count = 0
+        self.last_stage = sleep_stage
+
+        if in_wake_window:
+            # 唤醒窗口内优先保证采样频率，不受电池预算限制
+            interval, reason = self.min_interval, 'wake_window'
+        else:
+            if self.fast_remaining > 0:
+                self.fast_remaining -= 1
+                interval, reason = self.min_interval, 'changing'
+            elif self.stable_count >= self.stable_samples:
+                interval, reason = self.max_interval, 'stable_deep_sleep'
+            else:
+                interval, reason = self.base_interval, 'base'
+
+            budget_interval = self._budget_interval(current_time)
+            if budget_interval > interval:
+                interval, reason = budget_interval, 'battery_budget'
+
+        if reason != self.reason:
+            logger.debug(f"采样间隔调整为 {interval:.1f} 秒（{reason}）")
+        self.current_interval = interval
+        self.reason = reason
+        return interval
+
+    def _budget_interval(self, current_time):
+        """按剩余电池预算均匀分配剩余时间所需的最小采样间隔"""
+        remaining_samples = (self.max_battery_usage - self.battery_used) / self.sample_battery_cost
+        if remaining_samples < 1:
+            return self.max_interval
+
+        elapsed = (current_time - self.started_at).total_seconds()
+        remaining_time = max(0, self.night_duration - elapsed)
+        return min(remaining_time / remaining_samples, self.max_interval)
+
+    def get_status(self):
+        """获取调度器状态"""
+        return {
+            'interval': self.current_interval,
+            'effective_rate': self.effective_rate,
+            'reason': self.reason,
+            'samples_taken': self.samples_taken,
+            'battery_used': round(self.battery_used, 2),
+            'max_battery_usage': self.max_battery_usage
+        }
@@ -7,6 +7,16 @@ import random
 from datetime import datetime, timedelta
 import json
 
+from ..utils.time_utils import now_ms, local_datetime64_to_epoch_ms
+from .provenance import SIMULATED
+
+
+# 模拟器使用的睡眠阶段，顺序对应批量生成结果中的阶段编号
+SLEEP_PHASES = ("awake", "light_sleep", "deep_sleep", "rem_sleep")
+
+# 批量生成时默认的入睡时间，保证未指定时间的基准数据可复现
+DEFAULT_NIGHT_START = datetime(2023, 1, 1, 23, 0, 0)
+
 
 class SensorSimulator:
     """传感器数据模拟器"""
@@ -68,11 +78,13 @@ class SensorSimulator:
         heart_rate = max(40, min(120, heart_rate))
         movement = max(0, movement)
         
+        ts = now_ms()
         sensor_data = {
-            'timestamp': datetime.now().isoformat(),
+            'ts': ts,
             'heart_rate': round(heart_rate, 1),
             'movement': round(movement, 2),
-            'sleep_phase': self.sleep_phase
+            'sleep_phase': self.sleep_phase,
+            'provenance': SIMULATED
         }
         
         # 增加时间偏移
@@ -160,4 +172,175 @@ class SensorSimulator:
             'device_name': '模拟传感器',
             'use_simulation': True,
             'bluetooth_available': False
-        }
\ No newline at end of file
+        }
+    
+    def generate_night(self, n_samples=480, seed=None, start_time=None):
+        """
+        使用NumPy批量生成一整晚的模拟数据
+        :param n_samples: 样本数量
+        :param seed: 随机种子，相同种子生成完全相同的数据
+        :param start_time: 入睡时间，默认为DEFAULT_NIGHT_START
+        :return: 包含timestamp、heart_rate、movement、sleep_phase数组的字典
+        """
+        import numpy as np
+        
+        rng = np.random.default_rng(seed)
+        if start_time is None:
+            start_time = DEFAULT_NIGHT_START
+        
+        night = self._generate_arrays(rng, (n_samples,))
+        night['timestamp'] = self._timestamp_array(start_time, n_samples)
+        night['seed'] = seed
+        return night
+    
+    def generate_cohort(self, n_users, nights, n_samples=480, seed=0, start_time=None):
+        """
+        使用NumPy批量生成多个用户多晚的模拟数据
+        :param n_users: 用户数量
+        :param nights: 每个用户的夜晚数量
+        :param n_samples: 每晚的样本数量
+        :param seed: 随机种子，相同种子生成完全相同的数据
+        :param start_time: 第一晚的入睡时间，之后每晚顺延一天
+        :return: 字典，数组形状均为 (n_users, nights, n_samples)
+        """
+        import numpy as np
+        
+        rng = np.random.default_rng(seed)
+        if start_time is None:
+            start_time = DEFAULT_NIGHT_START
+        
+        cohort = self._generate_arrays(rng, (n_users, nights, n_samples))
+        
+        # 每晚的时间戳相同间隔，只在日期上顺延，广播到所有用户而不复制
+        first_night = self._timestamp_array(start_time, n_samples)
+        night_offsets = np.arange(nights, dtype='timedelta64[D]').astype('timedelta64[ms]')
+        timestamps = first_night[np.newaxis, :] + night_offsets[:, np.newaxis]
+        cohort['timestamp'] = np.broadcast_to(timestamps, (n_users, nights, n_samples))
+        cohort['user_id'] = np.array([f"user_{i:04d}" for i in range(n_users)])
+        cohort['seed'] = seed
+        return cohort
+    
+    @staticmethod
+    def iter_night_samples(night):
+        """
+        将generate_night的结果逐条转换为与get_sensor_data相同格式的样本
+        :param night: generate_night返回的字典
+        :return: 样本字典生成器
+        """
+        import numpy as np
+        
+        timestamps = np.datetime_as_string(night['timestamp'], unit='s')
+        epochs = local_datetime64_to_epoch_ms(night['timestamp'])
+        for timestamp, ts, heart_rate, movement, phase in zip(
+                timestamps.tolist(), epochs.tolist(), night['heart_rate'].tolist(),
+                night['movement'].tolist(), night['sleep_phase'].tolist()):
+            yield {
+                'timestamp': timestamp,
+                'ts': ts,
+                'heart_rate': heart_rate,
+                'movement': movement,
+                'sleep_phase': phase,
+                'provenance': SIMULATED
+            }
+    
+    def _timestamp_array(self, start_time, n_samples):
+        """生成等间隔的时间戳数组（datetime64[ms]，本地时间）"""
+        import numpy as np
+        
+        sampling_rate = self.config['sleep_detection']['sampling_rate']
+        offsets = np.arange(n_samples, dtype=np.int64) * int(sampling_rate * 1000)
+        return np.datetime64(start_time, 'ms') + offsets.astype('timedelta64[ms]')
+    
+    def _phase_schedule(self, offsets):
+        """
+        向量化计算各时间偏移对应的睡眠阶段编号，与_update_sleep_phase的规则一致
+        :param offsets: 时间偏移量数组（秒）
+        :return: SLEEP_PHASES中的阶段编号数组
+        """
+        import numpy as np
+        
+        durations = self.sleep_phase_durations
+        awake_end = durations['awake']
+        light_end = awake_end + durations['light_sleep']
+        deep_end = light_end + durations['deep_sleep']
+        rem_end = deep_end + durations['rem_sleep']
+        
+        first_rem_cycle = (offsets - deep_end) % (durations['light_sleep'] + durations['rem_sleep'])
+        full_cycle = (offsets - awake_end) % (
+            durations['light_sleep'] + durations['deep_sleep'] + durations['rem_sleep'])
+        
+        return np.select(
+            [
+                offsets < awake_end,
+                offsets < light_end,
+                offsets < deep_end,
+                (offsets < rem_end) & (first_rem_cycle < durations['light_sleep']),
+                offsets < rem_end,
+                full_cycle < durations['light_sleep'],
+                full_cycle < durations['light_sleep'] + durations['deep_sleep'],
+            ],
+            [0, 1, 2, 1, 3, 1, 2],
+            default=1
+        )
+    
+    def _generate_arrays(self, rng, shape):
+        """
+        按给定形状批量生成心率、体动和睡眠阶段数组，最后一维为时间
+        :param rng: numpy随机数生成器
+        :param shape: 输出数组形状
+        :return: 包含heart_rate、movement、sleep_phase数组的字典
+        """
+        import numpy as np
+        
+        sampling_rate = self.config['sleep_detection']['sampling_rate']
+        offsets = np.arange(shape[-1], dtype=np.int64) * sampling_rate
+        phase_idx = np.broadcast_to(self._phase_schedule(offsets), shape)
+        
+        hr_low = np.array([self.heart_rate_ranges[p][0] for p in SLEEP_PHASES], dtype=float)[phase_idx]
+        hr_high = np.array([self.heart_rate_ranges[p][1] for p in SLEEP_PHASES], dtype=float)[phase_idx]
+        move_low = np.array([self.movement_ranges[p][0] for p in SLEEP_PHASES], dtype=float)[phase_idx]
+        move_high = np.array([self.movement_ranges[p][1] for p in SLEEP_PHASES], dtype=float)[phase_idx]
+        
+        # 心率：阶段基础值 + 生理变化，限制相邻样本的变化幅度后再叠加传感器噪声
+        heart_rate = rng.uniform(hr_low, hr_high) + rng.uniform(-3, 3, shape)
+        heart_rate = self._limit_slew(heart_rate, initial=75, max_change=5)
+        heart_rate = np.clip(heart_rate + rng.uniform(-2, 2, shape), 40, 120)
+        
+        # 体动：阶段基础值，睡眠中5%概率出现翻身等较大动作
+        movement = rng.uniform(move_low, move_high)
+        burst = (phase_idx != 0) & (rng.random(shape) < 0.05)
+        movement = np.where(burst, rng.uniform(move_high, move_high * 2), movement)
+        movement = np.maximum(movement + rng.uniform(-1, 1, shape), 0)
+        
+        return {
+            'heart_rate': np.round(heart_rate, 1),
+            'movement': np.round(movement, 2),
+            'sleep_phase': np.array(SLEEP_PHASES)[phase_idx]
+        }
+    
+    @staticmethod
+    def _limit_slew(values, initial, max_change):
+        """
+        沿最后一维限制相邻样本的变化幅度，结果与_generate_heart_rate中的逐个限制完全一致
+        先整体限制一遍，之后只重新计算前一个值发生变化的位置，直到没有变化为止
+        """
+        import numpy as np
+        
+        n = values.shape[-1]
+        raw = np.ascontiguousarray(values, dtype=float).reshape(-1)
+        
+        previous = np.empty_like(raw)
+        previous[1:] = raw[:-1]
+        previous[::n] = initial
+        limited = np.clip(raw, previous - max_change, previous + max_change)
+        
+        changed = np.flatnonzero(limited != raw)
+        while changed.size:
+            # 变化只会影响同一行中的下一个样本
+            active = changed[changed % n != n - 1] + 1
+            previous = limited[active - 1]
+            updated = np.clip(raw[active], previous - max_change, previous + max_change)
+            changed = active[updated != limited[active]]
+            limited[active] = updated
+        
+        return limited.reshape(values.shape)
@@ -1,8 +1,11 @@
 """
 红米手环2睡眠分析模块
 
-该模块包含睡眠阶段检测功能
+该模块包含睡眠阶段检测、特征提取和重采样功能
 """
 from .sleep_stage_detector import SleepStageDetector
+from .feature_extractor import StreamingFeatureExtractor, FeatureVector, FEATURE_NAMES
+from .resampler import StreamingResampler, create_resampler, iter_buckets, resample_arrays, resample_samples
 
-__all__ = ['SleepStageDetector']
\ No newline at end of file
+__all__ = ['SleepStageDetector', 'StreamingFeatureExtractor', 'FeatureVector', 'FEATURE_NAMES',
+           'StreamingResampler', 'create_resampler', 'iter_buckets', 'resample_arrays', 'resample_samples']
\ No newline at end of file
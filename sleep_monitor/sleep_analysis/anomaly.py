@@ -0,0 +1,244 @@
+"""
+流式异常检测
+
+每个样本在睡眠阶段检测之后进入异常检测，每个设备只保存少量状态，每个样本O(1)：
+- 心率持续升高（hr_spike）：心率的EWMA均值和方差作为个人基线，标准化偏差的单侧CUSUM超过阈值时报警，
+  基线更新时偏差先截断，报警期间基线不更新（持续升高不会被基线吸收），CUSUM回落到0时结束（hr_spike_end）
+- 手环脱落（flatline）：心率缺失或为0，或心率连续不变且没有体动，连续若干个样本时报警，
+  恢复正常数据时结束（flatline_end）
+事件发布到事件总线（API推送），报警（hr_spike和flatline）按 (设备, 类型) 限流后写入日志并通知报警回调
+"""
+import logging
+import math
+import threading
+from collections import OrderedDict
+
+from ..utils import metrics
+from ..utils.time_utils import epoch_ms_to_iso, sample_epoch_ms
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEVICE_ID = 'default'
+
+# 默认参数，可以在配置项 sleep_detection.anomaly_detection 中修改
+DEFAULTS = {
+    'enabled': True,
+    'ewma_alpha': 0.02,  # 基线的平滑系数（约50个样本）
+    'warmup_samples': 30,  # 基线建立前不检测心率升高
+    'min_std': 4.0,  # 基线标准差的下限（次/分钟），避免平稳数据上的误报
+    'cusum_k': 1.5,  # 每个样本允许的偏差（标准差）
+    'cusum_h': 15.0,  # 报警阈值（标准差）
+    'flatline_samples': 10,  # 连续多少个无效样本视为手环脱落
+    'flatline_tolerance': 0.0,  # 心率变化不超过该值（次/分钟）视为不变
+    'max_gap': 1800,  # 样本间隔超过该值（秒）时重新建立基线
+    'alert_interval': 600,  # 同一设备同一类型报警的最小间隔（秒，按样本时间）
+    'max_devices': 10000  # 最多保存状态的设备数，超过时淘汰最久没有数据的设备
+}
+
+# 需要报警的事件类型（结束事件只推送，不报警）
+ALERT_TYPES = ('hr_spike', 'flatline')
+
+_EVENTS = metrics.counter('anomaly_events_total', '异常检测事件数', ('type',))
+_SUPPRESSED = metrics.counter('anomaly_alerts_suppressed_total', '因限流未发出的异常报警数', ('type',))
+
+
+def anomaly_settings(sleep_detection):
+    """
+    异常检测参数：配置项 sleep_detection.anomaly_detection 与默认参数合并
+    :raises ValueError: 参数无效
+    """
+    overrides = (sleep_detection or {}).get('anomaly_detection') or {}
+    if not isinstance(overrides, dict):
+        raise ValueError("配置项 anomaly_detection 必须是JSON对象")
+    settings = dict(DEFAULTS)
+    settings.update(overrides)
+    unknown = set(settings) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"未知的异常检测参数: {', '.join(sorted(unknown))}")
+    for name, value in settings.items():
+        if name == 'enabled':
+            continue
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+            raise ValueError(f"异常检测参数 {name} 必须是不小于0的数字")
+    if not 0 < settings['ewma_alpha'] <= 1:
+        raise ValueError("异常检测参数 ewma_alpha 必须在0到1之间")
+    return settings
+
+
+class DeviceState:
+    """一个设备的检测状态"""
+
+    __slots__ = ('count', 'mean', 'var', 'cusum', 'spike', 'peak', 'last_hr', 'last_epoch',
+                 'flat_count', 'flat_start', 'flat')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.cusum = 0.0
+        self.spike = None  # 心率升高开始的时间（epoch毫秒），没有升高时为None
+        self.peak = 0.0
+        self.last_hr = None
+        self.last_epoch = None
+        self.flat_count = 0
+        self.flat_start = None
+        self.flat = False
+
+    def update(self, settings, heart_rate, movement, epoch):
+        """
+        加入一个样本
+        :param settings: 异常检测参数
+        :param epoch: 样本时间（epoch毫秒）
+        :return: 事件列表（大多数样本为空元组）
+        """
+        events = ()
+        if self.last_epoch is not None and epoch - self.last_epoch > settings['max_gap'] * 1000:
+            self.reset()
+        self.last_epoch = epoch
+
+        # 手环脱落：心率无效，或心率不变且没有体动
+        valid = heart_rate is not None and heart_rate > 0
+        if (not valid or self.last_hr is not None and not movement
+                and abs(heart_rate - self.last_hr) <= settings['flatline_tolerance']):
+            self.flat_count += 1
+            if self.flat_count == 1:
+                self.flat_start = epoch
+            if not self.flat and self.flat_count >= settings['flatline_samples']:
+                self.flat = True
+                events = ({'type': 'flatline', 'ts': epoch, 'start': self.flat_start, 'samples': self.flat_count,
+                           'heart_rate': heart_rate},)
+        else:
+            if self.flat:
+                self.flat = False
+                events = ({'type': 'flatline_end', 'ts': epoch, 'start': self.flat_start},)
+            self.flat_count = 0
+        self.last_hr = heart_rate if valid else None
+        if self.flat_count:
+            # 无效数据不参与基线
+            return events
+
+        self.count += 1
+        deviation = heart_rate - self.mean
+        if self.count <= settings['warmup_samples']:
+            # 建立基线：开始时按样本数平均，之后逐渐过渡到固定的平滑系数
+            alpha = max(1.0 / self.count, settings['ewma_alpha'])
+            self.mean += alpha * deviation
+            self.var = (1 - alpha) * (self.var + alpha * deviation * deviation)
+            return events
+
+        std = max(math.sqrt(self.var), settings['min_std'])
+        self.cusum = min(max(0.0, self.cusum + deviation / std - settings['cusum_k']), 2 * settings['cusum_h'])
+        if self.spike is None:
+            if self.cusum > settings['cusum_h']:
+                self.spike = epoch
+                self.peak = heart_rate
+                events += ({'type': 'hr_spike', 'ts': epoch, 'heart_rate': heart_rate,
+                            'baseline': round(self.mean, 1), 'score': round(self.cusum, 1)},)
+            else:
+                # 偏差截断到 ±cusum_k 个标准差后更新基线，升高开始时基线和方差不会被异常值拉高
+                limit = settings['cusum_k'] * std
+                deviation = min(max(deviation, -limit), limit)
+                alpha = settings['ewma_alpha']
+                self.mean += alpha * deviation
+                self.var = (1 - alpha) * (self.var + alpha * deviation * deviation)
+        else:
+            self.peak = max(self.peak, heart_rate)
+            if self.cusum == 0.0:
+                events += ({'type': 'hr_spike_end', 'ts': epoch, 'start': self.spike, 'peak_heart_rate': self.peak,
+                            'baseline': round(self.mean, 1)},)
+                self.spike = None
+        return events
+
+
+class AnomalyMonitor:
+    """多个设备的流式异常检测"""
+
+    def __init__(self, config=None, bus=None, alert=None):
+        """
+        :param config: 配置参数（使用sleep_detection.anomaly_detection）
+        :param bus: 事件总线（EventBus），None时不推送
+        :param alert: 报警回调 alert(event)，限流后调用
+        """
+        self.bus = bus
+        self.alert = alert
+        self.settings = anomaly_settings((config or {}).get('sleep_detection'))
+        self._states = OrderedDict()  # 设备ID -> DeviceState，按最近数据的时间排序
+        self._last_alert = {}  # (设备ID, 类型) -> [上次报警时间, 之后被限流的报警数]
+        self._lock = threading.Lock()
+
+    def apply_config(self, config):
+        """应用新的配置（配置服务在配置变化时调用），各设备的状态保留"""
+        self.settings = anomaly_settings(config.get('sleep_detection'))
+
+    def process(self, sensor_data, device_id=None, epoch_ms=None):
+        """
+        检测一个样本
+        :param sensor_data: 传感器数据，包含heart_rate和movement
+        :param device_id: 设备ID，默认使用样本的device_id字段
+        :param epoch_ms: 样本时间（epoch毫秒），默认由样本的时间字段得到
+        :return: 事件列表
+        """
+        settings = self.settings
+        if not settings['enabled']:
+            return ()
+        device_id = device_id or sensor_data.get('device_id') or DEFAULT_DEVICE_ID
+        if epoch_ms is None:
+            epoch_ms = sample_epoch_ms(sensor_data)
+
+        with self._lock:
+            state = self._states.get(device_id)
+            if state is None:
+                state = self._states[device_id] = DeviceState()
+                if len(self._states) > settings['max_devices']:
+                    evicted, _ = self._states.popitem(last=False)
+                    for event_type in ALERT_TYPES:
+                        self._last_alert.pop((evicted, event_type), None)
+            else:
+                self._states.move_to_end(device_id)
+            events = state.update(settings, sensor_data.get('heart_rate'), sensor_data.get('movement'), epoch_ms)
+
+        for event in events:
+            event['device_id'] = device_id
+            event['timestamp'] = epoch_ms_to_iso(event['ts'])
+            self._emit(event)
+        return events
+
+    def _emit(self, event):
+        _EVENTS.labels(event['type']).inc()
+        if self.bus is not None:
+            self.bus.publish(event)
+        if event['type'] not in ALERT_TYPES:
+            logger.debug(f"设备 {event['device_id']} 异常结束: {event['type']}")
+            return
+
+        key = (event['device_id'], event['type'])
+        with self._lock:
+            last = self._last_alert.get(key)
+            if last is not None and event['ts'] - last[0] < self.settings['alert_interval'] * 1000:
+                last[1] += 1
+                _SUPPRESSED.labels(event['type']).inc()
+                return
+            event['suppressed'] = last[1] if last is not None else 0
+            self._last_alert[key] = [event['ts'], 0]
+
+        if event['type'] == 'hr_spike':
+            logger.warning(f"设备 {event['device_id']} 心率持续升高: {event['heart_rate']} 次/分钟"
+                           f"（基线 {event['baseline']}），时间 {event['timestamp']}")
+        else:
+            logger.warning(f"设备 {event['device_id']} 可能已脱落（连续 {event['samples']} 个样本没有有效心率），"
+                           f"时间 {event['timestamp']}")
+        if self.alert is not None:
+            try:
+                self.alert(event)
+            except Exception as e:
+                logger.error(f"异常报警回调失败: {e}")
+
+    def state(self, device_id):
+        """设备的检测状态（没有数据时返回None）"""
+        return self._states.get(device_id)
+
+    def __len__(self):
+        return len(self._states)
@@ -0,0 +1,128 @@
+"""
+个性化阈值校准
+
+全局的心率和体动阈值不适合静息心率明显偏高或偏低的用户。
+校准根据设备最近若干晚的历史数据计算个人基线（心率和体动的分位数），
+再把阈值放到个人分布的相应位置，生成该设备的阈值档案
+"""
+from datetime import datetime
+
+from .classifiers import make_thresholds
+
+PROFILE_VERSION = 1
+
+# 参与校准的夜晚数（最近的若干晚）
+DEFAULT_NIGHTS = 14
+
+# 数据不足时不生成档案
+MIN_NIGHTS = 3
+MIN_SAMPLES = 300
+
+# 阈值在个人夜间分布中的位置
+HR_QUANTILES = {
+    'deep_sleep_hr_threshold': 0.3,
+    'light_sleep_hr_threshold': 0.75
+}
+MOVEMENT_QUANTILE = 0.9
+
+# 阈值的合理范围，超出时截断
+THRESHOLD_LIMITS = {
+    'deep_sleep_hr_threshold': (40, 80),
+    'light_sleep_hr_threshold': (45, 95),
+    'movement_threshold': (0.5, 20)
+}
+
+# 深睡眠和浅睡眠心率阈值的最小间隔
+MIN_HR_GAP = 3
+
+BASELINE_QUANTILES = (0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95)
+
+
+def _clamp(name, value):
+    low, high = THRESHOLD_LIMITS[name]
+    return round(min(max(float(value), low), high), 1)
+
+
+def build_profile(nights):
+    """
+    由各晚的样本计算个人基线和阈值
+    :param nights: 各晚按列的样本数据列表（heart_rate、movement）
+    :return: 档案字典，数据不足时返回None
+    """
+    import numpy as np
+
+    heart_rates = [np.array([np.nan if value is None else value for value in night['heart_rate']], dtype=float)
+                   for night in nights]
+    movements = [np.array([np.nan if value is None else value for value in night['movement']], dtype=float)
+                 for night in nights]
+    heart_rates = [values[~np.isnan(values)] for values in heart_rates]
+    movements = [values[~np.isnan(values)] for values in movements]
+    used = [i for i, values in enumerate(heart_rates) if len(values)]
+
+    all_heart_rates = np.concatenate([heart_rates[i] for i in used]) if used else np.empty(0)
+    all_movements = np.concatenate(movements) if movements else np.empty(0)
+    if len(used) < MIN_NIGHTS or len(all_heart_rates) < MIN_SAMPLES or len(all_movements) == 0:
+        return None
+
+    hr_quantiles = np.quantile(all_heart_rates, BASELINE_QUANTILES)
+    movement_quantiles = np.quantile(all_movements, BASELINE_QUANTILES)
+    # 静息心率：各晚最低5%心率的中位数，不受个别夜晚的影响
+    resting = float(np.median([np.quantile(heart_rates[i], 0.05) for i in used]))
+
+    thresholds = {name: _clamp(name, np.quantile(all_heart_rates, q)) for name, q in HR_QUANTILES.items()}
+    thresholds['movement_threshold'] = _clamp('movement_threshold', np.quantile(all_movements, MOVEMENT_QUANTILE))
+    if thresholds['light_sleep_hr_threshold'] - thresholds['deep_sleep_hr_threshold'] < MIN_HR_GAP:
+        thresholds['light_sleep_hr_threshold'] = _clamp(
+            'light_sleep_hr_threshold', thresholds['deep_sleep_hr_threshold'] + MIN_HR_GAP)
+        thresholds['deep_sleep_hr_threshold'] = min(
+            thresholds['deep_sleep_hr_threshold'], thresholds['light_sleep_hr_threshold'] - MIN_HR_GAP)
+
+    return {
+        'version': PROFILE_VERSION,
+        'nights': len(used),
+        'samples': int(len(all_heart_rates)),
+        'computed_at': datetime.now().isoformat(),
+        'baseline': {
+            'resting_heart_rate': round(resting, 1),
+            'heart_rate': {f'p{round(q * 100)}': round(float(v), 1) for q, v in zip(BASELINE_QUANTILES, hr_quantiles)},
+            'movement': {f'p{round(q * 100)}': round(float(v), 2) for q, v in zip(BASELINE_QUANTILES, movement_quantiles)}
+        },
+        'thresholds': thresholds
+    }
+
+
+def calibrate_device(store, device_id, nights=DEFAULT_NIGHTS, save=True):
+    """
+    校准一个设备：读取最近的若干晚，计算档案并保存
+    :param store: 历史数据存储（HistoryStore）
+    :param nights: 参与校准的夜晚数
+    :param save: 是否保存档案
+    :return: 档案，数据不足时返回None（已有的档案保留）
+    """
+    columns = []
+    for night in store.recent_nights(device_id, nights):
+        end = night['end_ts'] + 1 if night['end_ts'] is not None else None
+        columns.append(store.load_columns(device_id, night['start_ts'], end, ('heart_rate', 'movement')))
+
+    profile = build_profile(columns)
+    if profile is None:
+        return None
+    profile['device_id'] = device_id
+    if save:
+        store.put_profile(device_id, profile)
+    return profile
+
+
+def profile_thresholds(profile, sleep_detection):
+    """
+    档案中的阈值与配置合并（档案中没有的阈值使用配置的值）
+    :param profile: 档案，None时直接使用配置
+    :param sleep_detection: 配置中的sleep_detection部分
+    :return: 合并后的sleep_detection
+    :raises ValueError: 合并后的阈值无效
+    """
+    if not profile:
+        return sleep_detection
+    merged = dict(sleep_detection, **profile.get('thresholds', {}))
+    make_thresholds(merged)
+    return merged
@@ -0,0 +1,166 @@
+"""
+图表数据
+
+为仪表盘生成一晚的图表数据：
+- 心率和体动曲线用LTTB（Largest-Triangle-Three-Buckets）算法降采样到指定的点数，
+  保留峰值和曲线形状，一晚约3万个点时只需传输和绘制几百个点
+- 睡眠阶段用游程编码表示睡眠图（连续相同的阶段合并为一段）
+- 生成的结果按 (夜晚, 点数) 缓存，重复查看时直接返回
+"""
+import threading
+from collections import OrderedDict
+
+from ..utils import metrics
+
+DEFAULT_POINTS = 500
+MIN_POINTS = 3
+MAX_POINTS = 5000
+
+# 降采样的曲线字段
+CHART_FIELDS = ('heart_rate', 'movement')
+
+_CACHE_REQUESTS = metrics.counter('chart_cache_requests_total', '图表数据缓存的请求次数', ('result',))
+
+
+def check_points(points):
+    """
+    校验请求的点数
+    :param points: 点数，None时使用DEFAULT_POINTS
+    :raises ValueError: 点数超出范围
+    """
+    if points is None:
+        return DEFAULT_POINTS
+    if not MIN_POINTS <= points <= MAX_POINTS:
+        raise ValueError(f"points 必须在 {MIN_POINTS} 到 {MAX_POINTS} 之间")
+    return points
+
+
+def lttb_indices(x, y, threshold):
+    """
+    LTTB降采样：每个桶选择与前一个选中点、下一个桶平均点构成的三角形面积最大的点
+    :param x: 横坐标（递增）
+    :param y: 纵坐标（不能包含NaN）
+    :param threshold: 目标点数（不小于3）
+    :return: 选中点的下标数组（包含第一个和最后一个点）
+    """
+    import numpy as np
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if threshold >= n or threshold < MIN_POINTS:
+        return np.arange(n)
+
+    # 第一个和最后一个点固定选中，中间的点平均分成threshold-2个桶
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    mean_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    # 最后一个桶的"下一个桶"是最后一个点
+    mean_x = np.append(mean_x[1:], x[n - 1])
+    mean_y = np.append(mean_y[1:], y[n - 1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - mean_x[i]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (mean_y[i] - ay))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def downsample_series(ts, values, points):
+    """
+    降采样一条曲线，缺失的数值（None/NaN）不参与
+    :param ts: 时间（epoch毫秒，递增）
+    :param values: 数值
+    :param points: 目标点数
+    :return: {'ts': [...], 'values': [...]}
+    """
+    import numpy as np
+
+    ts = np.asarray(ts, dtype=np.int64)
+    values = np.asarray([np.nan if value is None else value for value in values], dtype=float)
+    valid = ~np.isnan(values)
+    ts, values = ts[valid], values[valid]
+
+    selected = lttb_indices(ts, values, points)
+    return {'ts': ts[selected].tolist(), 'values': values[selected].tolist()}
+
+
+def encode_hypnogram(ts, stages, end_ts=None):
+    """
+    睡眠阶段的游程编码
+    :param ts: 时间（epoch毫秒，递增）
+    :param stages: 每个样本的睡眠阶段，None表示未知（不输出）
+    :param end_ts: 最后一段的结束时间，默认为最后一个样本的时间
+    :return: [{'stage', 'start', 'end'}] 列表，每段的结束时间为下一段的开始时间
+    """
+    import numpy as np
+
+    stages = np.asarray(stages, dtype=object)
+    ts = np.asarray(ts, dtype=np.int64)
+    known = np.not_equal(stages, None)
+    ts, stages = ts[known], stages[known]
+    if len(ts) == 0:
+        return []
+
+    starts = np.flatnonzero(np.concatenate(([True], stages[1:] != stages[:-1])))
+    ends = np.append(ts[starts[1:]], ts[-1] if end_ts is None else end_ts)
+    return [{'stage': stage, 'start': start, 'end': end}
+            for stage, start, end in zip(stages[starts].tolist(), ts[starts].tolist(), ends.tolist())]
+
+
+def build_chart(columns, points=DEFAULT_POINTS):
+    """
+    生成图表数据
+    :param columns: 按列的样本数据：ts，以及CHART_FIELDS中的字段和sleep_stage（可选）
+    :param points: 每条曲线的目标点数
+    :return: {'points', 'total_samples', 'series': {字段: {'ts', 'values'}}, 'hypnogram': [...]}
+    """
+    ts = columns['ts']
+    series = {field: downsample_series(ts, columns[field], points) for field in CHART_FIELDS if field in columns}
+    return {
+        'points': points,
+        'total_samples': len(ts),
+        'series': series,
+        'hypnogram': encode_hypnogram(ts, columns['sleep_stage']) if 'sleep_stage' in columns else []
+    }
+
+
+class ChartCache:
+    """图表数据的LRU缓存"""
+
+    def __init__(self, maxsize=64):
+        """
+        :param maxsize: 最多缓存的结果数
+        """
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """取得缓存的结果，不存在时返回None"""
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+        _CACHE_REQUESTS.labels('hit' if value is not None else 'miss').inc()
+        return value
+
+    def put(self, key, value):
+        """缓存结果，超过容量时淘汰最久未使用的结果"""
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._items.clear()
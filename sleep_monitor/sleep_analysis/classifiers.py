@@ -0,0 +1,373 @@
+"""
+睡眠阶段分类器
+
+检测器把窗口特征交给分类器得到睡眠阶段。内置两种后端：
+- rules: 按阈值规则逐条判断
+- compiled: 把阈值规则或训练好的决策树预先编译成量化分箱上的查找表，分类时只需一次数组索引
+
+阈值可以在运行时更新，新的规则或查找表构建完成后整体替换引用，正在进行的分类不受影响
+"""
+import json
+from bisect import bisect_left
+from collections import namedtuple
+
+
+STAGES = ('awake', 'light_sleep', 'deep_sleep', 'rem_sleep')
+
+# 可以在运行时更新的阈值及其默认值（None表示必须由配置提供）
+THRESHOLD_DEFAULTS = {
+    'deep_sleep_hr_threshold': None,
+    'light_sleep_hr_threshold': None,
+    'movement_threshold': None,
+    'rem_hrv_threshold': 3,  # 逐差均方根（RMSSD）超过该值认为心率变化较大
+    'rem_trend_threshold': 2  # 趋势窗口内心率变化超过该值认为心率趋势不稳定
+}
+
+# 查找表的维度，依次为心率、体动、心率趋势、心率变异性（RMSSD）和窗口是否就绪
+DIMENSIONS = ('heart_rate', 'movement', 'hr_trend', 'hr_rmssd', 'window_ready')
+
+# 查找表的最大分箱数（每个分箱一个字节，构建时每个分箱求值一次），分界值过多的决策树不能编译
+MAX_TABLE_CELLS = 1 << 20
+
+Thresholds = namedtuple('Thresholds', tuple(THRESHOLD_DEFAULTS))
+
+
+def make_thresholds(sleep_detection, base=None):
+    """
+    从配置生成阈值
+    :param sleep_detection: 配置中的sleep_detection部分（可以只包含需要修改的阈值）
+    :param base: 作为默认值的现有阈值
+    :return: Thresholds
+    """
+    values = dict(base._asdict()) if base is not None else dict(THRESHOLD_DEFAULTS)
+    for name in THRESHOLD_DEFAULTS:
+        if name in sleep_detection:
+            value = sleep_detection[name]
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"阈值 {name} 必须是数字: {value!r}")
+            values[name] = value
+
+    missing = [name for name, value in values.items() if value is None]
+    if missing:
+        raise ValueError(f"缺少阈值: {', '.join(missing)}")
+    if values['deep_sleep_hr_threshold'] > values['light_sleep_hr_threshold']:
+        raise ValueError("深睡眠心率阈值不能高于浅睡眠心率阈值")
+    return Thresholds(**values)
+
+
+def classify_by_rules(thresholds, heart_rate, movement, hr_trend, hr_rmssd, window_ready):
+    """
+    阈值规则
+    考虑到红米手环2的传感器精度，使用相对宽松的判断标准
+    """
+    movement_threshold = thresholds.movement_threshold
+
+    if movement > movement_threshold * 1.5:  # 体动较大，可能清醒或翻身
+        return 'awake'
+    if heart_rate < thresholds.deep_sleep_hr_threshold and movement < movement_threshold * 0.5:
+        # 心率低且体动很少，深睡眠
+        return 'deep_sleep'
+
+    # 优先检测REM睡眠特征，即使心率接近或略高于浅睡阈值
+    # REM睡眠通常特征：心率变化较大，体动中等，心率趋势不稳定；趋势窗口的数据不足时不判断
+    if window_ready:
+        rem_indicators = [
+            hr_rmssd > thresholds.rem_hrv_threshold,  # 相邻心率变化较大
+            abs(hr_trend) > thresholds.rem_trend_threshold,  # 心率趋势不稳定
+            movement_threshold * 0.3 < movement < movement_threshold  # 中等体动
+        ]
+        # 满足至少2个REM特征，且心率不会过高到被判定为清醒（允许稍微高于浅睡阈值）
+        if sum(rem_indicators) >= 2 and heart_rate < thresholds.light_sleep_hr_threshold + 5:
+            return 'rem_sleep'
+
+    if heart_rate < thresholds.light_sleep_hr_threshold and movement < movement_threshold:
+        # 心率较低且体动较少，浅睡眠
+        return 'light_sleep'
+    if heart_rate >= thresholds.light_sleep_hr_threshold:
+        # 心率较高，可能清醒或即将醒来
+        return 'awake'
+    # 其他情况归类为浅睡眠
+    return 'light_sleep'
+
+
+def rule_edges(thresholds):
+    """阈值规则在各个维度上用到的分界值"""
+    movement_threshold = thresholds.movement_threshold
+    return {
+        'heart_rate': [thresholds.deep_sleep_hr_threshold, thresholds.light_sleep_hr_threshold,
+                       thresholds.light_sleep_hr_threshold + 5],
+        'movement': [movement_threshold * 0.3, movement_threshold * 0.5, movement_threshold,
+                     movement_threshold * 1.5],
+        'hr_trend': [-thresholds.rem_trend_threshold, thresholds.rem_trend_threshold],
+        'hr_rmssd': [thresholds.rem_hrv_threshold]
+    }
+
+
+class StageClassifier:
+    """分类器接口"""
+
+    name = None
+
+    def classify(self, features):
+        """
+        根据窗口特征判断睡眠阶段
+        :param features: FeatureVector
+        :return: 睡眠阶段
+        """
+        raise NotImplementedError
+
+    def update_thresholds(self, sleep_detection):
+        """
+        更新阈值
+        :param sleep_detection: 包含新阈值的字典
+        """
+        raise NotImplementedError(f"{self.name} 分类器不支持更新阈值")
+
+    def get_info(self):
+        """获取分类器信息"""
+        return {'name': self.name}
+
+
+class RuleClassifier(StageClassifier):
+    """阈值规则分类器"""
+
+    name = 'rules'
+
+    def __init__(self, sleep_detection):
+        """
+        :param sleep_detection: 配置中的sleep_detection部分
+        """
+        self.thresholds = make_thresholds(sleep_detection)
+
+    def classify(self, features):
+        return classify_by_rules(self.thresholds, features.heart_rate, features.movement,
+                                 features.hr_trend, features.hr_rmssd, features.window_ready)
+
+    def update_thresholds(self, sleep_detection):
+        self.thresholds = make_thresholds(sleep_detection, self.thresholds)
+
+    def get_info(self):
+        return {'name': self.name, 'thresholds': self.thresholds._asdict()}
+
+
+class _LookupTable:
+    """量化分箱上的查找表（构建后不再修改）"""
+
+    def __init__(self, edges, decide):
+        """
+        :param edges: {维度: 排序后的分界值}，window_ready固定为两个分箱
+        :param decide: 给定各维度取值返回睡眠阶段的函数
+        :raises ValueError: 分箱数超过MAX_TABLE_CELLS
+        """
+        self.edges = [sorted(set(edges.get(name, []))) for name in DIMENSIONS[:-1]]
+
+        # 每个分界值单独占一个分箱，这样无论规则在分界值处取开区间还是闭区间，同一分箱内的结果都相同
+        representatives = [self._representatives(dimension_edges) for dimension_edges in self.edges]
+        representatives.append((False, True))
+
+        sizes = [len(values) for values in representatives]
+        self.strides = []
+        stride = 1
+        for size in reversed(sizes):
+            self.strides.insert(0, stride)
+            stride *= size
+        if stride > MAX_TABLE_CELLS:
+            raise ValueError(f"查找表过大（{stride}个分箱，上限{MAX_TABLE_CELLS}），请减少决策树的分界值")
+
+        codes = {stage: code for code, stage in enumerate(STAGES)}
+        self.table = bytearray(stride)
+        self._fill(representatives, decide, codes)
+
+    @staticmethod
+    def _representatives(edges):
+        """每个分箱的代表值：分界值本身以及相邻分界值之间的中点"""
+        if not edges:
+            return [0.0]
+        values = [edges[0] - 1]
+        for i, edge in enumerate(edges):
+            values.append(edge)
+            values.append((edge + edges[i + 1]) / 2 if i + 1 < len(edges) else edge + 1)
+        return values
+
+    def _fill(self, representatives, decide, codes):
+        """在每个分箱的代表值上求值，填充查找表"""
+        index = 0
+        heart_rates, movements, trends, variabilities, readiness = representatives
+        for heart_rate in heart_rates:
+            for movement in movements:
+                for hr_trend in trends:
+                    for hr_rmssd in variabilities:
+                        for window_ready in readiness:
+                            self.table[index] = codes[decide(heart_rate, movement, hr_trend, hr_rmssd, window_ready)]
+                            index += 1
+
+    @staticmethod
+    def _bin(edges, value):
+        """数值所在的分箱：小于第i个分界值为2i，等于第i个分界值为2i+1"""
+        i = bisect_left(edges, value)
+        return 2 * i + 1 if i < len(edges) and edges[i] == value else 2 * i
+
+    def lookup(self, heart_rate, movement, hr_trend, hr_rmssd, window_ready):
+        """查表得到睡眠阶段"""
+        edges, strides, bin_of = self.edges, self.strides, self._bin
+        index = (bin_of(edges[0], heart_rate) * strides[0]
+                 + bin_of(edges[1], movement) * strides[1]
+                 + bin_of(edges[2], hr_trend) * strides[2]
+                 + bin_of(edges[3], hr_rmssd) * strides[3]
+                 + (1 if window_ready else 0))
+        return STAGES[self.table[index]]
+
+    def lookup_many(self, heart_rate, movement, hr_trend, hr_rmssd, window_ready):
+        """
+        批量查表（离线处理使用）
+        :return: 睡眠阶段编码数组，STAGES[编码]为睡眠阶段
+        """
+        import numpy as np
+
+        index = np.asarray(window_ready, dtype=np.intp).copy()
+        for edges, stride, values in zip(self.edges, self.strides, (heart_rate, movement, hr_trend, hr_rmssd)):
+            values = np.asarray(values, dtype=float)
+            edges = np.asarray(edges, dtype=float)
+            i = np.searchsorted(edges, values, side='left')
+            on_edge = (i < len(edges)) & (edges[np.minimum(i, len(edges) - 1)] == values) if len(edges) else False
+            index += (2 * i + on_edge) * stride
+        return np.frombuffer(bytes(self.table), dtype=np.uint8)[index]
+
+
+class CompiledClassifier(StageClassifier):
+    """编译成查找表的分类器，可以由阈值规则或决策树生成"""
+
+    name = 'compiled'
+
+    def __init__(self, sleep_detection=None, tree=None):
+        """
+        :param sleep_detection: 配置中的sleep_detection部分，按阈值规则编译
+        :param tree: 决策树（见 tree_decision），提供时按决策树编译
+        """
+        self.thresholds = None
+        self.tree = None
+        if tree is not None:
+            self.load_tree(tree)
+        else:
+            self.update_thresholds(sleep_detection)
+
+    @classmethod
+    def from_decision_tree(cls, tree):
+        """
+        由训练好的决策树生成分类器
+        :param tree: 嵌套字典 {'feature': 维度, 'threshold': 分界值, 'left': 子树, 'right': 子树}，
+                     特征值小于等于分界值时进入left，叶子节点为 {'stage': 睡眠阶段}
+        """
+        return cls(tree=tree)
+
+    def classify(self, features):
+        # 只读取一次当前查找表的引用，阈值更新时替换引用不会影响正在进行的分类
+        return self._table.lookup(features.heart_rate, features.movement,
+                                  features.hr_trend, features.hr_rmssd, features.window_ready)
+
+    def classify_many(self, features):
+        """
+        批量分类
+        :param features: FeatureVector序列
+        :return: 睡眠阶段列表
+        """
+        table = self._table
+        columns = list(zip(*((f.heart_rate, f.movement, f.hr_trend, f.hr_rmssd, f.window_ready) for f in features)))
+        if not columns:
+            return []
+        return [STAGES[code] for code in table.lookup_many(*columns)]
+
+    def update_thresholds(self, sleep_detection):
+        if self.tree is not None:
+            raise ValueError("由决策树生成的分类器不使用阈值，请使用load_tree替换决策树")
+        thresholds = make_thresholds(sleep_detection, self.thresholds)
+        table = _LookupTable(
+            rule_edges(thresholds),
+            lambda *values: classify_by_rules(thresholds, *values)
+        )
+        self.thresholds, self.tree, self._table = thresholds, None, table
+
+    def load_tree(self, tree):
+        """
+        替换为新的决策树
+        :param tree: 决策树，格式见 from_decision_tree
+        """
+        edges = {}
+        _collect_tree_edges(tree, edges)
+        table = _LookupTable(edges, lambda *values: tree_decision(tree, dict(zip(DIMENSIONS, values))))
+        self.thresholds, self.tree, self._table = None, tree, table
+
+    def get_info(self):
+        info = {
+            'name': self.name,
+            'source': 'decision_tree' if self.tree is not None else 'rules',
+            'table_size': len(self._table.table)
+        }
+        if self.thresholds is not None:
+            info['thresholds'] = self.thresholds._asdict()
+        return info
+
+
+def tree_decision(tree, values):
+    """
+    在决策树上求值
+    :param tree: 决策树
+    :param values: {维度: 取值}
+    :return: 睡眠阶段
+    """
+    node = tree
+    while 'stage' not in node:
+        value = values[node['feature']]
+        node = node['left'] if value <= node['threshold'] else node['right']
+    return node['stage']
+
+
+def _collect_tree_edges(node, edges):
+    """收集决策树各维度的分界值并检查格式"""
+    if 'stage' in node:
+        if node['stage'] not in STAGES:
+            raise ValueError(f"未知的睡眠阶段: {node['stage']}")
+        return
+    feature = node.get('feature')
+    if feature not in DIMENSIONS:
+        raise ValueError(f"决策树使用了不支持的特征: {feature}")
+    if feature != 'window_ready':
+        edges.setdefault(feature, []).append(node['threshold'])
+    _collect_tree_edges(node['left'], edges)
+    _collect_tree_edges(node['right'], edges)
+
+
+# 分类器注册表，名称 -> 工厂函数(sleep_detection配置)
+CLASSIFIERS = {
+    RuleClassifier.name: RuleClassifier,
+    CompiledClassifier.name: CompiledClassifier
+}
+
+
+def register_classifier(name, factory):
+    """
+    注册分类器后端
+    :param name: 名称，配置项 sleep_detection.classifier 使用
+    :param factory: 接受sleep_detection配置并返回StageClassifier的工厂函数
+    """
+    CLASSIFIERS[name] = factory
+
+
+def create_classifier(sleep_detection):
+    """
+    根据配置创建分类器
+    配置项 classifier 选择后端（默认rules），decision_tree 可以指定决策树文件或字典，此时使用compiled后端
+    :param sleep_detection: 配置中的sleep_detection部分
+    :return: StageClassifier
+    """
+    tree = sleep_detection.get('decision_tree')
+    if tree is not None:
+        if isinstance(tree, str):
+            with open(tree, 'r', encoding='utf-8') as f:
+                tree = json.load(f)
+        return CompiledClassifier.from_decision_tree(tree)
+
+    name = sleep_detection.get('classifier', RuleClassifier.name)
+    if name not in CLASSIFIERS:
+        raise ValueError(f"未知的分类器: {name}")
+    return CLASSIFIERS[name](sleep_detection)
@@ -0,0 +1,162 @@
+"""
+按设备的检测器注册表
+
+多个设备的数据通过同一个服务检测时，每个设备使用自己的检测器（窗口数据互不影响）：
+- 检测器在设备第一次出现时创建，超过容量时淘汰最久未使用的设备
+- 设备有校准档案时使用个性化阈值；档案第一次使用时从历史数据库读取并缓存，
+  超过profile_ttl后重新读取，档案变化时阈值就地更新到检测器
+- 运行时的阈值修改和加载的决策树应用到全部设备的检测器（档案中的阈值仍然优先）
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from .calibration import profile_thresholds
+from .classifiers import make_thresholds
+from .sleep_stage_detector import SleepStageDetector
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEVICE_ID = 'default'
+DEFAULT_MAX_DETECTORS = 1024
+DEFAULT_PROFILE_TTL = 3600
+
+
+class DetectorRegistry:
+    """按设备的检测器注册表"""
+
+    def __init__(self, config, store=None, max_detectors=DEFAULT_MAX_DETECTORS, profile_ttl=DEFAULT_PROFILE_TTL,
+                 clock=time.monotonic):
+        """
+        :param config: 配置参数，sleep_detection.personalized_thresholds为false时不使用校准档案
+        :param store: 保存校准档案的历史数据存储（HistoryStore），None时不使用档案
+        :param max_detectors: 最多保留的检测器数
+        :param profile_ttl: 档案缓存的有效时间（秒）
+        :param clock: 时间函数（测试使用）
+        """
+        self.config = config
+        self.store = store
+        self.max_detectors = max_detectors
+        self.profile_ttl = profile_ttl
+        self._clock = clock
+        self._detectors = OrderedDict()  # 设备ID -> [检测器, 使用的档案]
+        self._profiles = {}  # 设备ID -> (档案, 读取时间)
+        self._overrides = {}  # 运行时修改的阈值（配置文件变化时清除）
+        self._classifier = None  # 运行时加载的分类器（如决策树），全部设备共用
+        self._lock = threading.RLock()
+
+    def profile(self, device_id):
+        """
+        设备的校准档案（缓存），没有档案或不使用个性化阈值时返回None
+        """
+        if self.store is None or not self.config['sleep_detection'].get('personalized_thresholds', True):
+            return None
+        now = self._clock()
+        with self._lock:
+            cached = self._profiles.get(device_id)
+            if cached is not None and now - cached[1] < self.profile_ttl:
+                return cached[0]
+            profile = self.store.get_profile(device_id)
+            self._profiles[device_id] = (profile, now)
+            return profile
+
+    def invalidate(self, device_id=None):
+        """丢弃缓存的档案（校准后调用），下一次使用时重新读取"""
+        with self._lock:
+            if device_id is None:
+                self._profiles.clear()
+            else:
+                self._profiles.pop(device_id, None)
+
+    def _device_config(self, device_id, profile):
+        sleep_detection = self.config['sleep_detection']
+        if self._overrides:
+            sleep_detection = dict(sleep_detection, **self._overrides)
+        try:
+            sleep_detection = profile_thresholds(profile, sleep_detection)
+        except ValueError as e:
+            logger.warning(f"设备 {device_id} 的校准档案无效，使用全局阈值: {e}")
+        return dict(self.config, sleep_detection=sleep_detection)
+
+    def _configure(self, detector, device_id, profile):
+        """把设备的配置应用到检测器，加载了共用的分类器时改为使用该分类器（不使用阈值）"""
+        if self._classifier is not None:
+            detector.set_classifier(self._classifier)
+        else:
+            detector.apply_config(self._device_config(device_id, profile))
+
+    def _create(self, device_id, profile):
+        detector = SleepStageDetector(self._device_config(device_id, profile))
+        if self._classifier is not None:
+            detector.set_classifier(self._classifier)
+        return detector
+
+    def get(self, device_id=DEFAULT_DEVICE_ID):
+        """
+        设备的检测器，第一次使用时创建
+        :param device_id: 设备ID
+        :return: SleepStageDetector
+        """
+        profile = self.profile(device_id)
+        with self._lock:
+            entry = self._detectors.get(device_id)
+            if entry is None:
+                entry = [self._create(device_id, profile), profile]
+                self._detectors[device_id] = entry
+                while len(self._detectors) > self.max_detectors:
+                    self._detectors.popitem(last=False)
+            else:
+                self._detectors.move_to_end(device_id)
+                if entry[1] != profile:
+                    # 档案已更新，阈值就地更新，窗口数据保留
+                    self._configure(entry[0], device_id, profile)
+                    entry[1] = profile
+            return entry[0]
+
+    def detect_stage(self, sensor_data, device_id=None):
+        """
+        使用设备的检测器检测睡眠阶段
+        :param sensor_data: 传感器数据
+        :param device_id: 设备ID，默认使用样本的device_id字段
+        """
+        device_id = device_id or sensor_data.get('device_id') or DEFAULT_DEVICE_ID
+        return self.get(device_id).detect_stage(sensor_data)
+
+    def update_thresholds(self, thresholds):
+        """
+        运行时修改全部设备的阈值（与全局检测器的update_thresholds对应），各设备档案中的阈值仍然优先
+        :param thresholds: 需要修改的阈值，如 {'deep_sleep_hr_threshold': 58}
+        :raises ValueError: 阈值无效，或已加载决策树
+        """
+        with self._lock:
+            if self._classifier is not None:
+                raise ValueError("已加载决策树，不使用阈值")
+            overrides = dict(self._overrides, **thresholds)
+            make_thresholds(dict(self.config['sleep_detection'], **overrides))
+            self._overrides = overrides
+            for device_id, entry in self._detectors.items():
+                self._configure(entry[0], device_id, entry[1])
+
+    def set_classifier(self, classifier):
+        """
+        全部设备改为使用同一个分类器（如加载的决策树，查找表构建后只读，可以共用）
+        :param classifier: StageClassifier实例
+        """
+        with self._lock:
+            self._classifier = classifier
+            for device_id, entry in self._detectors.items():
+                self._configure(entry[0], device_id, entry[1])
+
+    def apply_config(self, config):
+        """应用新的全局配置（配置服务在配置变化时调用），运行时修改的阈值清除，各设备的档案阈值仍然优先"""
+        with self._lock:
+            self.config = config
+            self._overrides = {}
+            self._profiles.clear()
+            for device_id, entry in self._detectors.items():
+                entry[1] = self.profile(device_id)
+                self._configure(entry[0], device_id, entry[1])
+
+    def __len__(self):
+        return len(self._detectors)
@@ -0,0 +1,295 @@
+"""
+红米手环2睡眠特征提取器
+
+在时间窗口上增量计算心率变异性（HRV）和体动特征，
+每个样本只做O(1)（分位数为O(log n)）的更新，供睡眠阶段检测器和离线模型使用
+"""
+import heapq
+import math
+from collections import deque, namedtuple
+
+from ..utils.time_utils import sample_epoch_ms
+
+
+# 特征向量中的数值特征，离线模型按此顺序使用
+FEATURE_NAMES = (
+    'heart_rate', 'movement',
+    'hr_mean', 'hr_std', 'hr_trend', 'hr_rmssd',
+    'hr_median', 'hr_p10', 'hr_p90',
+    'movement_mean', 'movement_energy'
+)
+
+FeatureVector = namedtuple('FeatureVector', ('epoch',) + FEATURE_NAMES + ('n_samples', 'window_ready'))
+FeatureVector.__doc__ = """单个样本时刻的窗口特征"""
+
+
+def feature_values(features):
+    """按FEATURE_NAMES的顺序取出数值特征"""
+    return [getattr(features, name) for name in FEATURE_NAMES]
+
+
+class RunningQuantile:
+    """
+    滑动窗口分位数（双堆 + 延迟删除）
+
+    较小的一部分放在大顶堆，其余放在小顶堆，大顶堆堆顶即为分位数，
+    添加和删除均为O(log n)。每个值带有唯一的键，删除时按键标记，堆顶遇到已删除的键时才真正弹出；
+    某个堆中已删除的元素多于有效元素时重建该堆，堆的大小保持在窗口大小的常数倍以内
+    """
+
+    def __init__(self, quantile=0.5):
+        """
+        :param quantile: 分位数（0~1），0.5为中位数
+        """
+        self.quantile = quantile
+        self._lower = []  # 大顶堆，元素为 (-值, 键)
+        self._upper = []  # 小顶堆，元素为 (值, 键)
+        self._in_lower = {}  # 有效元素的键 -> 是否在大顶堆中
+        self._lower_size = 0
+        self._deleted = set()  # 已删除但仍在堆中的键
+        self._lower_stale = 0  # 大顶堆中已删除的元素数
+        self._upper_stale = 0  # 小顶堆中已删除的元素数
+
+    def __len__(self):
+        return len(self._in_lower)
+
+    def add(self, value, key):
+        """
+        添加一个值
+        :param value: 数值
+        :param key: 唯一键，删除时使用
+        """
+        if self._lower_size and value <= -self._lower[0][0]:
+            heapq.heappush(self._lower, (-value, key))
+            self._in_lower[key] = True
+            self._lower_size += 1
+        else:
+            heapq.heappush(self._upper, (value, key))
+            self._in_lower[key] = False
+        self._rebalance()
+
+    def remove(self, key):
+        """按键删除一个值"""
+        if self._in_lower.pop(key):
+            self._lower_size -= 1
+            self._lower_stale += 1
+        else:
+            self._upper_stale += 1
+        self._deleted.add(key)
+        self._prune(self._lower)
+        self._prune(self._upper)
+        self._rebalance()
+        self._compact()
+
+    def value(self):
+        """当前分位数，窗口为空时返回None"""
+        if not self._in_lower:
+            return None
+        return -self._lower[0][0]
+
+    def _prune(self, heap):
+        """弹出堆顶已删除的元素"""
+        while heap and heap[0][1] in self._deleted:
+            self._deleted.discard(heapq.heappop(heap)[1])
+            if heap is self._lower:
+                self._lower_stale -= 1
+            else:
+                self._upper_stale -= 1
+
+    def _rebuild(self, heap):
+        """去掉堆中已删除的元素后重新建堆"""
+        live = []
+        for item in heap:
+            if item[1] in self._deleted:
+                self._deleted.discard(item[1])
+            else:
+                live.append(item)
+        heapq.heapify(live)
+        return live
+
+    def _compact(self):
+        """已删除的元素多于有效元素时重建该堆"""
+        if self._lower_stale > self._lower_size:
+            self._lower = self._rebuild(self._lower)
+            self._lower_stale = 0
+        upper_size = len(self._in_lower) - self._lower_size
+        if self._upper_stale > upper_size:
+            self._upper = self._rebuild(self._upper)
+            self._upper_stale = 0
+
+    def _rebalance(self):
+        """调整两个堆的大小，使大顶堆恰好包含按最近秩方法确定的前k个值"""
+        total = len(self._in_lower)
+        target = max(1, math.ceil(self.quantile * total)) if total else 0
+        while self._lower_size > target:
+            value, key = heapq.heappop(self._lower)
+            heapq.heappush(self._upper, (-value, key))
+            self._in_lower[key] = False
+            self._lower_size -= 1
+            self._prune(self._lower)
+        while self._lower_size < target:
+            value, key = heapq.heappop(self._upper)
+            heapq.heappush(self._lower, (-value, key))
+            self._in_lower[key] = True
+            self._lower_size += 1
+            self._prune(self._upper)
+
+
+class StreamingFeatureExtractor:
+    """时间窗口上的增量特征提取器"""
+
+    def __init__(self, config):
+        """
+        初始化特征提取器
+        :param config: 配置参数
+        """
+        self.config = config
+        sleep_detection = config['sleep_detection']
+
+        self.window = sleep_detection.get('trend_window', 300)  # 特征窗口（秒）
+        # 窗口内的数据至少覆盖窗口的这一比例才认为特征可靠（1分钟采样时5个点覆盖240秒）
+        self.min_window_coverage = sleep_detection.get('min_window_coverage', 0.8)
+        self.min_window_points = sleep_detection.get('min_trend_points', 3)
+        # 相邻样本间隔超过该值时不计算逐差（数据中断）
+        self.max_sample_gap = sleep_detection.get('max_sample_gap', 3 * sleep_detection['sampling_rate'])
+
+        # 窗口内的样本：[epoch, 心率, 体动, 与前一样本心率差的平方或None, 样本序号]
+        self._samples = deque()
+        self._sequence = 0
+        self._hr_sum = 0.0
+        self._hr_sq_sum = 0.0
+        self._movement_sum = 0.0
+        self._movement_sq_sum = 0.0
+        self._diff_sq_sum = 0.0
+        self._diff_count = 0
+        self._hr_median = RunningQuantile(0.5)
+        self._hr_p10 = RunningQuantile(0.1)
+        self._hr_p90 = RunningQuantile(0.9)
+
+        self.latest = None
+
+    @staticmethod
+    def sample_epoch(sensor_data):
+        """获取样本时间（epoch秒），没有时间戳时使用当前时间"""
+        return sample_epoch_ms(sensor_data) / 1000
+
+    def update(self, sensor_data):
+        """
+        加入一个样本并返回当前特征向量
+        时间早于窗口中最新样本的数据（乱序或重复）不进入窗口
+        :param sensor_data: 传感器数据
+        :return: FeatureVector
+        """
+        epoch = self.sample_epoch(sensor_data)
+        heart_rate = sensor_data['heart_rate']
+        movement = sensor_data['movement']
+
+        if not self._samples or epoch >= self._samples[-1][0]:
+            self._push(epoch, heart_rate, movement)
+            self._expire(epoch - self.window)
+
+        self.latest = self._build_vector(epoch, heart_rate, movement)
+        return self.latest
+
+    def _push(self, epoch, heart_rate, movement):
+        """加入样本并更新累计值"""
+        diff_sq = None
+        if self._samples:
+            previous = self._samples[-1]
+            if epoch - previous[0] <= self.max_sample_gap:
+                diff_sq = (heart_rate - previous[1]) ** 2
+                self._diff_sq_sum += diff_sq
+                self._diff_count += 1
+
+        self._sequence += 1
+        self._samples.append([epoch, heart_rate, movement, diff_sq, self._sequence])
+        self._hr_sum += heart_rate
+        self._hr_sq_sum += heart_rate * heart_rate
+        self._movement_sum += movement
+        self._movement_sq_sum += movement * movement
+        for quantile in (self._hr_median, self._hr_p10, self._hr_p90):
+            quantile.add(heart_rate, self._sequence)
+
+    def _expire(self, window_start):
+        """移除窗口之外的样本，均摊O(1)"""
+        samples = self._samples
+        while samples[0][0] <= window_start:
+            _, heart_rate, movement, diff_sq, sequence = samples.popleft()
+            self._hr_sum -= heart_rate
+            self._hr_sq_sum -= heart_rate * heart_rate
+            self._movement_sum -= movement
+            self._movement_sq_sum -= movement * movement
+            if diff_sq is not None:
+                self._diff_sq_sum -= diff_sq
+                self._diff_count -= 1
+            for quantile in (self._hr_median, self._hr_p10, self._hr_p90):
+                quantile.remove(sequence)
+
+            # 新的窗口第一个样本与已移除样本之间的逐差不再属于窗口
+            if samples and samples[0][3] is not None:
+                self._diff_sq_sum -= samples[0][3]
+                self._diff_count -= 1
+                samples[0][3] = None
+
+        if len(samples) == 1:
+            # 窗口只剩一个样本时重置累计值，避免浮点误差累积
+            _, heart_rate, movement, _, _ = samples[0]
+            self._hr_sum, self._hr_sq_sum = heart_rate, heart_rate * heart_rate
+            self._movement_sum, self._movement_sq_sum = movement, movement * movement
+            self._diff_sq_sum, self._diff_count = 0.0, 0
+
+    def window_ready(self):
+        """窗口内的数据是否足够覆盖窗口时长"""
+        if len(self._samples) < self.min_window_points:
+            return False
+        span = self._samples[-1][0] - self._samples[0][0]
+        return span >= self.window * self.min_window_coverage
+
+    def _build_vector(self, epoch, heart_rate, movement):
+        """根据累计值生成特征向量"""
+        n = len(self._samples)
+        hr_mean = self._hr_sum / n
+        variance = (self._hr_sq_sum - self._hr_sum * hr_mean) / (n - 1) if n > 1 else 0
+        hr_std = math.sqrt(variance) if variance > 1e-9 else 0
+        hr_rmssd = math.sqrt(self._diff_sq_sum / self._diff_count) if self._diff_count and self._diff_sq_sum > 1e-9 else 0
+
+        return FeatureVector(
+            epoch=epoch,
+            heart_rate=heart_rate,
+            movement=movement,
+            hr_mean=hr_mean,
+            hr_std=hr_std,
+            hr_trend=self._samples[-1][1] - self._samples[0][1],
+            hr_rmssd=hr_rmssd,
+            hr_median=self._hr_median.value(),
+            hr_p10=self._hr_p10.value(),
+            hr_p90=self._hr_p90.value(),
+            movement_mean=self._movement_sum / n,
+            movement_energy=self._movement_sq_sum,
+            n_samples=n,
+            window_ready=self.window_ready()
+        )
+
+
+def extract_features(samples, config):
+    """
+    逐条计算样本序列的特征向量（离线处理使用）
+    :param samples: 按时间排序的传感器数据
+    :param config: 配置参数
+    :return: FeatureVector生成器
+    """
+    extractor = StreamingFeatureExtractor(config)
+    for sample in samples:
+        yield extractor.update(sample)
+
+
+def feature_matrix(samples, config):
+    """
+    计算样本序列的特征矩阵，列顺序为FEATURE_NAMES
+    :param samples: 按时间排序的传感器数据
+    :param config: 配置参数
+    :return: numpy数组，形状为 (样本数, len(FEATURE_NAMES))
+    """
+    import numpy as np
+
+    return np.array([feature_values(features) for features in extract_features(samples, config)], dtype=float)
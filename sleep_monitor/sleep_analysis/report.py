@@ -0,0 +1,179 @@
+"""
+每晚睡眠报告
+
+夜晚结束后对该晚的样本做一次向量化计算，生成睡眠报告并保存到历史数据库，
+之后按 (设备, 夜晚) 直接读取，不再重新计算：
+- 入睡潜伏期、总睡眠时间、睡眠效率、入睡后清醒时间（WASO）、觉醒次数
+- 各睡眠阶段时长、睡眠周期数、睡眠期间的平均和最低心率
+"""
+from .classifiers import STAGES
+
+# 报告格式的版本，计算方法变化时加1，已保存的旧版本报告会重新生成（同时重新生成趋势汇总）
+# 2: 趋势汇总的分布由直方图改为KLL分位数草图
+REPORT_VERSION = 2
+
+AWAKE = STAGES.index('awake')
+REM = STAGES.index('rem_sleep')
+
+# 相邻样本的间隔超过典型间隔的这个倍数时视为数据缺口，该样本只按典型间隔计时
+MAX_GAP_FACTOR = 5
+
+
+def stage_codes(stages):
+    """
+    睡眠阶段转换为编码数组（STAGES中的下标），未知阶段为-1
+    """
+    import numpy as np
+
+    codes = {stage: code for code, stage in enumerate(STAGES)}
+    return np.fromiter((codes.get(stage, -1) for stage in stages), dtype=np.int8, count=len(stages))
+
+
+def epoch_durations(ts):
+    """
+    每个样本代表的时长（毫秒）：到下一个样本的间隔，最后一个样本和数据缺口使用典型（中位数）间隔
+    :param ts: 样本时间（epoch毫秒，递增）
+    """
+    import numpy as np
+
+    ts = np.asarray(ts, dtype=np.int64)
+    if len(ts) < 2:
+        return np.zeros(len(ts), dtype=np.int64)
+    gaps = np.diff(ts)
+    typical = int(np.median(gaps))
+    durations = np.append(gaps, typical)
+    durations[durations > typical * MAX_GAP_FACTOR] = typical
+    return durations
+
+
+def _minutes(value):
+    return round(float(value), 1)
+
+
+def build_report(columns):
+    """
+    计算一晚的睡眠报告
+    :param columns: 按列的样本数据：ts、sleep_stage，以及heart_rate（可选）
+    :return: 报告字典（时长单位为分钟，时间为epoch毫秒）
+    """
+    import numpy as np
+
+    ts = np.asarray(columns['ts'], dtype=np.int64)
+    codes = stage_codes(columns['sleep_stage'])
+    heart_rates = np.array([np.nan if value is None else value for value in columns.get('heart_rate', [None] * len(ts))],
+                           dtype=float)
+
+    known = codes >= 0
+    ts, codes, heart_rates = ts[known], codes[known], heart_rates[known]
+    report = {
+        'version': REPORT_VERSION,
+        'total_records': int(len(ts)),
+        'start': int(ts[0]) if len(ts) else None,
+        'end': None,
+        'time_in_bed_minutes': 0.0,
+        'sleep_onset': None,
+        'sleep_onset_latency_minutes': None,
+        'final_wake': None,
+        'total_sleep_minutes': 0.0,
+        'sleep_efficiency': 0.0,
+        'waso_minutes': 0.0,
+        'awakenings': 0,
+        'stage_minutes': {stage: 0.0 for stage in STAGES},
+        'sleep_cycles': 0,
+        'avg_sleep_heart_rate': None,
+        'min_sleep_heart_rate': None
+    }
+    if len(ts) == 0:
+        return report
+
+    minutes = epoch_durations(ts) / 60000.0
+    asleep = codes != AWAKE
+    time_in_bed = minutes.sum()
+    stage_minutes = np.bincount(codes, weights=minutes, minlength=len(STAGES))
+    report.update(
+        end=int(ts[-1] + minutes[-1] * 60000),
+        time_in_bed_minutes=_minutes(time_in_bed),
+        stage_minutes={stage: _minutes(value) for stage, value in zip(STAGES, stage_minutes)}
+    )
+
+    sleep_index = np.flatnonzero(asleep)
+    if len(sleep_index) == 0:
+        return report
+
+    # 睡眠期：第一个睡眠样本到最后一个睡眠样本
+    first, last = sleep_index[0], sleep_index[-1]
+    period_asleep = asleep[first:last + 1]
+    total_sleep = minutes[asleep].sum()
+
+    # 去掉清醒后合并相同阶段，每个从非REM进入REM的阶段段计为一个睡眠周期
+    sleep_codes = codes[asleep]
+    runs = sleep_codes[np.concatenate(([True], sleep_codes[1:] != sleep_codes[:-1]))]
+
+    sleep_heart_rates = heart_rates[asleep]
+    sleep_heart_rates = sleep_heart_rates[~np.isnan(sleep_heart_rates)]
+
+    report.update(
+        sleep_onset=int(ts[first]),
+        sleep_onset_latency_minutes=_minutes((ts[first] - ts[0]) / 60000.0),
+        final_wake=int(ts[last] + minutes[last] * 60000),
+        total_sleep_minutes=_minutes(total_sleep),
+        sleep_efficiency=round(float(total_sleep / time_in_bed * 100), 1) if time_in_bed else 0.0,
+        waso_minutes=_minutes(minutes[first:last + 1][~period_asleep].sum()),
+        awakenings=int(np.count_nonzero(period_asleep[:-1] & ~period_asleep[1:])),
+        sleep_cycles=int(np.count_nonzero(runs[1:] == REM)),
+        avg_sleep_heart_rate=round(float(sleep_heart_rates.mean()), 1) if len(sleep_heart_rates) else None,
+        min_sleep_heart_rate=float(sleep_heart_rates.min()) if len(sleep_heart_rates) else None
+    )
+    return report
+
+
+def generate_report(store, device_id, night):
+    """
+    生成一晚的报告并保存到历史数据库，同时更新趋势汇总
+    :param store: 历史数据存储（HistoryStore）
+    :param device_id: 设备ID
+    :param night: 夜晚日期（YYYYMMDD）
+    :return: 报告，该晚没有数据时返回None
+    """
+    info = store.get_night(device_id, night)
+    if info is None:
+        return None
+    end = info['end_ts'] + 1 if info['end_ts'] is not None else None
+    columns = store.load_columns(device_id, info['start_ts'], end, ('heart_rate', 'movement', 'sleep_stage'))
+    report = build_report(columns)
+    report.update(device_id=device_id, night=night)
+    store.put_report(device_id, night, report)
+    # 同时更新该晚所在的周和月的趋势汇总
+    from .trends import update_rollups
+    update_rollups(store, device_id, night, columns, report)
+    return report
+
+
+def generate_pending_reports(store, device_id=None):
+    """
+    为还没有报告（或报告版本过旧）的夜晚生成报告
+    :param device_id: 只处理该设备，默认处理全部设备
+    :return: 生成的报告数
+    """
+    count = 0
+    for device, night in store.nights_without_report(device_id, REPORT_VERSION):
+        if generate_report(store, device, night) is not None:
+            count += 1
+    return count
+
+
+def get_report(store, device_id, night=None):
+    """
+    读取一晚的报告，还没有生成（或版本过旧）时生成一次
+    :param night: 夜晚日期（YYYYMMDD），None时为最近一晚
+    :return: 报告，没有该晚的数据时返回None
+    """
+    if night is None:
+        info = store.get_night(device_id)
+        if info is None:
+            return None
+        night = info['night']
+    report = store.get_report(device_id, night)
+    if report is not None and report.get('version') == REPORT_VERSION:
+        return report
+    return generate_report(store, device_id, night)
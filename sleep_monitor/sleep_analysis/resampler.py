@@ -0,0 +1,326 @@
+"""
+传感器数据重采样
+
+不同传感器的样本到达时间不规则，这里把样本按固定时间网格分桶聚合：
+- StreamingResampler: 实时数据逐条加入，时间越过一个桶后输出该桶
+- resample_arrays / resample_samples: 存档数据整列向量化处理
+配置项 resampling.enabled 为true时，实时采集（AcquisitionWorker）和批量重新处理（reprocess）
+都先重采样再检测，两条路径的样本落在同一个网格上
+
+没有样本的桶明确标记为缺口（gap=True，数值为None/NaN），不会填充随机值
+桶按epoch对齐（桶开始时间是间隔的整数倍），两种方式得到的网格相同；
+向量化重采样也可以直接使用调用方给出的网格（TimeRange）
+"""
+import math
+import statistics
+
+from ..utils.time_utils import sample_epoch_ms, sample_epoch_ms_column, epoch_ms_to_iso, to_epoch_ms
+
+
+# 默认重采样的字段及聚合方式
+DEFAULT_AGGREGATION = {
+    'heart_rate': 'mean',
+    'movement': 'max'
+}
+
+# 逐桶聚合函数（实时重采样使用），输入为非空的数值列表
+AGGREGATIONS = {
+    'mean': lambda values: sum(values) / len(values),
+    'median': statistics.median,
+    'min': min,
+    'max': max,
+    'sum': sum,
+    'first': lambda values: values[0],
+    'last': lambda values: values[-1]
+}
+
+
+def resampling_settings(config):
+    """
+    读取重采样配置
+    :param config: 配置参数，可以包含resampling部分：interval（秒，默认为采样间隔）和aggregation（字段 -> 聚合方式）
+    :return: (间隔毫秒, 聚合方式字典)
+    """
+    settings = config.get('resampling', {})
+    if not isinstance(settings, dict):
+        raise ValueError("配置项 resampling 必须是JSON对象")
+    if not isinstance(settings.get('enabled', False), bool):
+        raise ValueError("resampling.enabled 必须是true或false")
+    interval = settings.get('interval', config['sleep_detection']['sampling_rate'])
+    aggregation = dict(settings.get('aggregation', DEFAULT_AGGREGATION))
+    for field, method in aggregation.items():
+        if method not in AGGREGATIONS:
+            raise ValueError(f"字段 {field} 的聚合方式 {method} 不受支持")
+    interval_ms = int(interval * 1000)
+    if interval_ms <= 0:
+        raise ValueError("重采样间隔必须大于0")
+    return interval_ms, aggregation
+
+
+def resampling_enabled(config):
+    """是否在检测前重采样（配置项 resampling.enabled，默认不重采样）"""
+    return bool(config.get('resampling', {}).get('enabled', False))
+
+
+def create_resampler(config):
+    """
+    按配置创建实时重采样器
+    :return: StreamingResampler，未启用重采样时返回None
+    """
+    return StreamingResampler(config) if resampling_enabled(config) else None
+
+
+class StreamingResampler:
+    """实时重采样器"""
+
+    def __init__(self, config):
+        """
+        初始化重采样器
+        :param config: 配置参数
+        """
+        self.interval_ms, self.aggregation = resampling_settings(config)
+
+        self.bucket_start = None  # 当前桶的开始时间（epoch毫秒）
+        self._values = {}  # 当前桶内各字段的有效数值
+        self._count = 0
+        self.late_samples = 0  # 所属桶已经输出的迟到样本数
+
+    def add(self, sensor_data):
+        """
+        加入一个样本
+        :param sensor_data: 传感器数据
+        :return: 因该样本而结束的桶列表（包括中间的缺口桶），按时间排序
+        """
+        ts = sample_epoch_ms(sensor_data)
+        bucket_start = ts - ts % self.interval_ms
+
+        completed = []
+        if self.bucket_start is None:
+            self._open(bucket_start)
+        elif bucket_start < self.bucket_start:
+            self.late_samples += 1
+            return completed
+        elif bucket_start > self.bucket_start:
+            completed = self._roll(bucket_start)
+
+        self._count += 1
+        for field in self.aggregation:
+            value = sensor_data.get(field)
+            if value is not None:
+                self._values[field].append(value)
+        return completed
+
+    def advance(self, current_ms):
+        """
+        时间推进到current_ms（没有新样本时调用），输出已经结束的桶，缺口桶会被明确输出
+        :param current_ms: 当前时间（epoch毫秒）
+        :return: 已结束的桶列表
+        """
+        if self.bucket_start is None:
+            return []
+        bucket_start = current_ms - current_ms % self.interval_ms
+        if bucket_start > self.bucket_start:
+            return self._roll(bucket_start)
+        return []
+
+    def flush(self):
+        """
+        输出当前未结束的桶（数据结束时调用）
+        :return: 桶列表
+        """
+        if self.bucket_start is None or not self._count:
+            return []
+        bucket = self._close()
+        self.bucket_start = None
+        return [bucket]
+
+    def _open(self, bucket_start):
+        """开始新的桶"""
+        self.bucket_start = bucket_start
+        self._values = {field: [] for field in self.aggregation}
+        self._count = 0
+
+    def _roll(self, bucket_start):
+        """结束当前桶，补上中间的缺口桶，并开始bucket_start所在的桶"""
+        completed = [self._close()]
+        for gap_start in range(self.bucket_start + self.interval_ms, bucket_start, self.interval_ms):
+            completed.append(self._bucket(gap_start, {}, 0))
+        self._open(bucket_start)
+        return completed
+
+    def _close(self):
+        """结束当前桶"""
+        return self._bucket(self.bucket_start, self._values, self._count)
+
+    def _bucket(self, bucket_start, values, count):
+        """生成桶记录"""
+        bucket = {
+            'ts': bucket_start,
+            'timestamp': epoch_ms_to_iso(bucket_start),
+            'count': count,
+            'gap': count == 0
+        }
+        for field, method in self.aggregation.items():
+            field_values = values.get(field)
+            bucket[field] = AGGREGATIONS[method](field_values) if field_values else None
+        return bucket
+
+
+def _grid(ts, interval_ms, start=None, end=None):
+    """确定网格的开始时间和桶数量"""
+    if start is None:
+        start = int(ts.min()) if ts.size else 0
+    start -= start % interval_ms
+    if end is None:
+        end = int(ts.max()) if ts.size else start - 1
+    count = (end - start) // interval_ms + 1 if end >= start else 0
+    return start, count
+
+
+def resample_arrays(ts, values, interval_ms, aggregation=None, start=None, end=None):
+    """
+    向量化重采样（存档数据使用）
+    :param ts: 样本时间（epoch毫秒）数组，不要求有序
+    :param values: {字段: 数值数组}，NaN表示缺失
+    :param interval_ms: 桶间隔（毫秒）
+    :param aggregation: {字段: 聚合方式}，默认使用DEFAULT_AGGREGATION中values包含的字段
+    :param start: 网格开始时间（epoch毫秒、ISO字符串、datetime），默认为第一个样本所在的桶；
+        也可以是TimeRange，此时直接使用其时间点作为桶开始时间，忽略interval_ms和end
+    :param end: 网格结束时间（包含），默认为最后一个样本的时间
+    :return: 字典，ts为桶开始时间，count为样本数，gap标记缺口，各字段为聚合结果（缺口为NaN）
+    """
+    import numpy as np
+
+    if aggregation is None:
+        aggregation = {field: method for field, method in DEFAULT_AGGREGATION.items() if field in values}
+
+    # 可以直接使用iter_time_range得到的网格：网格的时间点就是桶开始时间（不按epoch对齐），
+    # 结果与网格一一对应，可以直接zip
+    starts = None
+    if hasattr(start, 'as_epoch_ms'):
+        interval_ms = start.step_ms
+        starts = start.as_epoch_ms()
+        start = end = None
+    elif start is not None:
+        start = to_epoch_ms(start) if not isinstance(start, (int, np.integer)) else int(start)
+    if end is not None and not isinstance(end, (int, np.integer)):
+        end = to_epoch_ms(end)
+
+    ts = np.asarray(ts, dtype=np.int64)
+    # 乱序的样本先按时间排序一次（稳定排序），first/last按时间而不是输入顺序取值
+    order = None
+    if ts.size > 1 and np.any(ts[1:] < ts[:-1]):
+        order = np.argsort(ts, kind='stable')
+        ts = ts[order]
+    if starts is None:
+        grid_start, count = _grid(ts, interval_ms, start, end)
+        starts = grid_start + np.arange(count, dtype=np.int64) * interval_ms
+        index = (ts - grid_start) // interval_ms
+        inside = (index >= 0) & (index < count)
+    else:
+        # 样本属于开始时间不晚于它的最后一个桶，超出该桶间隔的样本在网格之外
+        count = starts.size
+        index = np.searchsorted(starts, ts, side='right') - 1
+        inside = index >= 0
+        inside[inside] = ts[inside] < starts[index[inside]] + interval_ms
+    index = index[inside]
+
+    result = {
+        'ts': starts,
+        'count': np.bincount(index, minlength=count)
+    }
+    result['gap'] = result['count'] == 0
+
+    for field, method in aggregation.items():
+        if method not in AGGREGATIONS:
+            raise ValueError(f"字段 {field} 的聚合方式 {method} 不受支持")
+        field_values = np.asarray(values[field], dtype=float)
+        if order is not None:
+            field_values = field_values[order]
+        field_values = field_values[inside]
+        valid = ~np.isnan(field_values)
+        result[field] = _aggregate(index[valid], field_values[valid], count, method)
+    return result
+
+
+def _aggregate(index, values, count, method):
+    """按桶聚合一个字段，没有有效数值的桶为NaN"""
+    import numpy as np
+
+    output = np.full(count, np.nan)
+    if not index.size:
+        return output
+
+    if method in ('mean', 'sum'):
+        sums = np.bincount(index, weights=values, minlength=count)
+        counts = np.bincount(index, minlength=count)
+        filled = counts > 0
+        output[filled] = sums[filled] / counts[filled] if method == 'mean' else sums[filled]
+        return output
+
+    # 其他聚合方式按桶排序后在每段上计算；样本已按时间排序，稳定排序保留桶内的时间顺序
+    if method in ('min', 'max', 'median'):
+        order = np.lexsort((values, index))
+    else:
+        order = np.argsort(index, kind='stable')
+    index, values = index[order], values[order]
+    starts = np.flatnonzero(np.r_[True, index[1:] != index[:-1]])
+    ends = np.r_[starts[1:], index.size]
+    buckets = index[starts]
+
+    if method == 'min' or method == 'first':
+        output[buckets] = values[starts]
+    elif method == 'max' or method == 'last':
+        output[buckets] = values[ends - 1]
+    else:  # median
+        lengths = ends - starts
+        lower = values[starts + (lengths - 1) // 2]
+        upper = values[starts + lengths // 2]
+        output[buckets] = (lower + upper) / 2
+    return output
+
+
+def resample_samples(samples, config, start=None, end=None):
+    """
+    重采样存档中的样本（字典序列），时间只解析一次后整列处理
+    :param samples: 传感器数据序列
+    :param config: 配置参数
+    :param start: 网格开始时间，见resample_arrays
+    :param end: 网格结束时间，见resample_arrays
+    :return: resample_arrays的结果
+    """
+    import numpy as np
+
+    interval_ms, aggregation = resampling_settings(config)
+    samples = list(samples)
+    ts = sample_epoch_ms_column(samples)
+    values = {
+        field: np.array([_number(sample.get(field)) for sample in samples], dtype=float)
+        for field in aggregation
+    }
+    return resample_arrays(ts, values, interval_ms, aggregation, start, end)
+
+
+def iter_buckets(result):
+    """
+    把resample_arrays的结果逐桶转换为字典，格式与StreamingResampler输出的桶相同（缺失值为None）
+    :param result: resample_arrays / resample_samples的结果
+    """
+    fields = [field for field in result if field not in ('ts', 'count', 'gap')]
+    columns = [result[field].tolist() for field in fields]
+    for i, (ts, count) in enumerate(zip(result['ts'].tolist(), result['count'].tolist())):
+        bucket = {
+            'ts': ts,
+            'timestamp': epoch_ms_to_iso(ts),
+            'count': count,
+            'gap': count == 0
+        }
+        for field, column in zip(fields, columns):
+            value = column[i]
+            bucket[field] = None if math.isnan(value) else value
+        yield bucket
+
+
+def _number(value):
+    """缺失值转换为NaN"""
+    return math.nan if value is None else value
@@ -4,8 +4,17 @@
 基于心率和体动数据检测睡眠阶段
 """
 import statistics
+import time
+from collections import deque
 from datetime import datetime, timedelta
 
+from .feature_extractor import StreamingFeatureExtractor
+from .classifiers import create_classifier, THRESHOLD_DEFAULTS
+from ..utils import metrics
+
+_DETECT_SECONDS = metrics.histogram('sleep_detect_stage_seconds', '睡眠阶段检测耗时（秒）')
+_STAGES = metrics.counter('sleep_stage_detections_total', '各睡眠阶段的检测次数', ('stage',))
+
 
 class SleepStageDetector:
     """睡眠阶段检测器"""
@@ -17,13 +26,61 @@ class SleepStageDetector:
         """
         self.config = config
         self.sleep_detection = config['sleep_detection']
-        self.recent_data = []  # 存储最近的传感器数据
-        self.max_data_points = 10  # 保留最近10个数据点用于分析
+        self.sampling_interval = self.sleep_detection['sampling_rate']
+        
+        # 分析窗口按时间定义（秒），与采样频率无关
+        self.history_window = self.sleep_detection.get('history_window', 600)  # 保留最近10分钟的数据
+        
+        # 按时间排序的数据缓冲区，每条记录带有epoch秒，过期数据从头部移除
+        self.recent_data = deque()  # 历史窗口内的传感器数据
+        
+        # 趋势窗口（默认5分钟）上的增量特征，供REM判断和离线模型使用
+        self.feature_extractor = StreamingFeatureExtractor(config)
+        self.last_features = None
+        
+        # 根据窗口特征判断睡眠阶段的分类器，由配置项classifier选择后端
+        self.classifier = create_classifier(self.sleep_detection)
+    
+    def set_sampling_interval(self, interval):
+        """
+        设置当前的采样间隔（分析窗口按时间定义，不随采样间隔变化）
+        :param interval: 采样间隔（秒）
+        """
+        self.sampling_interval = interval
+    
+    def update_thresholds(self, thresholds):
+        """
+        运行时更新睡眠阶段阈值，无需重新创建检测器（窗口数据保留）
+        :param thresholds: 需要修改的阈值，如 {'deep_sleep_hr_threshold': 58}
+        """
+        self.classifier.update_thresholds(thresholds)
+        self.sleep_detection = dict(self.sleep_detection, **thresholds)
+    
+    def apply_config(self, config):
+        """
+        应用新的配置（配置服务在配置变化时调用），阈值和分类器就地更新，窗口数据保留
+        :param config: 配置参数
+        """
+        sleep_detection = config['sleep_detection']
+        
+        if any(sleep_detection.get(key) != self.sleep_detection.get(key) for key in ('classifier', 'decision_tree')):
+            self.set_classifier(create_classifier(sleep_detection))
+        else:
+            changed = {name: sleep_detection[name] for name in THRESHOLD_DEFAULTS
+                       if name in sleep_detection and sleep_detection[name] != self.sleep_detection.get(name)}
+            if changed:
+                self.classifier.update_thresholds(changed)
         
-        # 睡眠阶段阈值
-        self.deep_sleep_hr_threshold = self.sleep_detection['deep_sleep_hr_threshold']
-        self.light_sleep_hr_threshold = self.sleep_detection['light_sleep_hr_threshold']
-        self.movement_threshold = self.sleep_detection['movement_threshold']
+        self.history_window = sleep_detection.get('history_window', 600)
+        self.config = config
+        self.sleep_detection = sleep_detection
+    
+    def set_classifier(self, classifier):
+        """
+        替换分类器
+        :param classifier: StageClassifier实例
+        """
+        self.classifier = classifier
     
     def detect_stage(self, sensor_data):
         """
@@ -31,94 +88,44 @@ class SleepStageDetector:
         :param sensor_data: 传感器数据，包含heart_rate和movement
         :return: 睡眠阶段 ('awake', 'light_sleep', 'deep_sleep', 'rem_sleep')
         """
-        # 添加当前数据到历史记录
-        self.recent_data.append({
-            'timestamp': sensor_data['timestamp'],
-            'heart_rate': sensor_data['heart_rate'],
-            'movement': sensor_data['movement']
-        })
+        started = time.perf_counter()
         
-        # 保持历史数据不超过最大数量
-        if len(self.recent_data) > self.max_data_points:
-            self.recent_data.pop(0)
-        
-        # 基于心率和体动检测睡眠阶段
-        heart_rate = sensor_data['heart_rate']
-        movement = sensor_data['movement']
-        
-        # 分析最近数据的心率趋势
-        hr_trend = self._analyze_heart_rate_trend()
-        movement_avg = self._calculate_average_movement()
-        
-        # 睡眠阶段判断逻辑
-        # 考虑到红米手环2的传感器精度，使用相对宽松的判断标准
-        if movement > self.movement_threshold * 1.5:  # 体动较大，可能清醒或翻身
-            return 'awake'
-        elif heart_rate < self.deep_sleep_hr_threshold and movement < self.movement_threshold * 0.5:
-            # 心率低且体动很少，深睡眠
-            return 'deep_sleep'
-        # 优先检测REM睡眠特征，即使心率接近或略高于浅睡阈值
-        elif self._is_rem_indication(heart_rate, movement, hr_trend):
-            return 'rem_sleep'
-        elif heart_rate < self.light_sleep_hr_threshold and movement < self.movement_threshold:
-            # 心率较低且体动较少，浅睡眠
-            return 'light_sleep'
-        elif heart_rate >= self.light_sleep_hr_threshold:
-            # 心率较高，可能清醒或即将醒来
-            return 'awake'
-        else:
-            # 其他情况归类为浅睡眠
-            return 'light_sleep'
+        # 添加当前数据到时间窗口并更新窗口特征
+        features = self._add_sample(sensor_data)
+        
+        # 基于心率、体动和窗口特征判断睡眠阶段
+        stage = self.classifier.classify(features)
+        
+        _DETECT_SECONDS.observe(time.perf_counter() - started)
+        _STAGES.labels(stage).inc()
+        return stage
     
-    def _analyze_heart_rate_trend(self):
-        """分析心率趋势"""
-        if len(self.recent_data) < 2:
-            return 0
+    def _add_sample(self, sensor_data):
+        """
+        将样本加入时间窗口并移除过期数据，均摊O(1)
+        :return: 当前的窗口特征
+        """
+        features = self.feature_extractor.update(sensor_data)
+        self.last_features = features
+        epoch = features.epoch
         
-        recent_hrs = [data['heart_rate'] for data in self.recent_data[-5:]]  # 最近5个数据点
-        if len(recent_hrs) < 2:
-            return 0
+        # 时间早于已有数据的样本（乱序或重复）不进入窗口，避免破坏时间顺序
+        if self.recent_data and epoch < self.recent_data[-1]['epoch']:
+            return features
         
-        # 计算心率变化趋势
-        first_hr = recent_hrs[0]
-        last_hr = recent_hrs[-1]
-        trend = last_hr - first_hr
+        self.recent_data.append({
+            'ts': round(epoch * 1000),  # 样本时间（epoch毫秒），传感器样本只有ts字段，没有timestamp
+            'heart_rate': sensor_data['heart_rate'],
+            'movement': sensor_data['movement'],
+            'epoch': epoch
+        })
         
-        return trend
-    
-    def _calculate_average_movement(self):
-        """计算平均体动"""
-        if not self.recent_data:
-            return 0
+        # 移除窗口之外的数据；数据中断超过窗口长度时窗口自然清空
+        history_start = epoch - self.history_window
+        while self.recent_data[0]['epoch'] <= history_start:
+            self.recent_data.popleft()
         
-        movements = [data['movement'] for data in self.recent_data[-5:]]  # 最近5个数据点
-        return statistics.mean(movements) if movements else 0
-    
-    def _is_rem_indication(self, heart_rate, movement, hr_trend):
-        """判断是否为REM睡眠指示"""
-        # REM睡眠通常特征：心率变化较大，体动中等，心率趋势不稳定
-        if len(self.recent_data) < 5:
-            return False
-        
-        # 获取最近的心率数据
-        recent_hrs = [data['heart_rate'] for data in self.recent_data[-5:]]
-        hr_variability = statistics.stdev(recent_hrs) if len(set(recent_hrs)) > 1 else 0
-        
-        # REM睡眠的特征判断
-        rem_indicators = [
-            hr_variability > 3,  # 心率变化较大
-            abs(hr_trend) > 2,   # 心率趋势不稳定
-            movement > self.movement_threshold * 0.3 and movement < self.movement_threshold  # 中等体动
-        ]
-        
-        # 如果满足至少2个REM特征，则认为是REM睡眠
-        # 但要确保心率和体动水平适合REM睡眠（不会过高到被判定为清醒）
-        if sum(rem_indicators) >= 2:
-            # 额外检查：REM睡眠的心率不应太高，避免被误判为清醒
-            if heart_rate < self.light_sleep_hr_threshold + 5:  # 允许稍微高一点，但仍低于清醒阈值
-                return True
-        
-        return False
+        return features
     
     def get_sleep_summary(self):
         """获取睡眠总结"""
@@ -0,0 +1,310 @@
+"""
+睡眠趋势汇总
+
+按 (设备, 周) 和 (设备, 月) 保存可合并的汇总数据，每晚的报告生成后更新该晚所在的周和月：
+- 心率、睡眠期间心率（静息心率）和体动：样本数、总和、平方和、最小值、最大值，以及KLL分位数草图
+- 睡眠指标：夜晚数、卧床时间、总睡眠时间、WASO、觉醒次数、睡眠周期数、各阶段时长的总和
+此外每个设备保存一行全部夜晚的汇总（周期为all）
+任意日期范围的趋势通过合并少量汇总行得到，不需要扫描样本
+"""
+import math
+from datetime import datetime, timedelta
+
+from .classifiers import STAGES
+from ..utils.quantile_sketch import KLLSketch
+
+PERIODS = ('week', 'month')
+
+# 设备全部夜晚的汇总（周期和周期键都为all）
+ALL_PERIOD = 'all'
+
+# 统计分布的字段，sleep_heart_rate为睡眠期间（非清醒）的心率
+STATS_FIELDS = ('heart_rate', 'sleep_heart_rate', 'movement')
+
+# 汇总中返回的分位数
+SUMMARY_QUANTILES = {'p5': 0.05, 'p50': 0.5, 'p95': 0.95}
+
+# 按夜晚累加的报告指标
+REPORT_SUMS = ('time_in_bed_minutes', 'total_sleep_minutes', 'waso_minutes', 'awakenings', 'sleep_cycles')
+
+NIGHT_FORMAT = '%Y%m%d'
+
+
+def _night_date(night):
+    try:
+        return datetime.strptime(night, NIGHT_FORMAT).date()
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"日期必须是YYYYMMDD格式: {night!r}") from e
+
+
+def period_key(night, period):
+    """
+    夜晚所在的周期
+    :param night: 夜晚日期（YYYYMMDD）
+    :param period: 'week'（ISO周，如 2024-W03）或 'month'（如 2024-01）
+    """
+    date = _night_date(night)
+    if period == 'week':
+        year, week, _ = date.isocalendar()
+        return f'{year}-W{week:02d}'
+    if period == 'month':
+        return date.strftime('%Y-%m')
+    raise ValueError(f"不支持的汇总周期: {period}，可用: {', '.join(PERIODS)}")
+
+
+def period_range(night, period):
+    """
+    夜晚所在周期的第一晚和最后一晚
+    :return: (YYYYMMDD, YYYYMMDD)
+    """
+    date = _night_date(night)
+    if period == 'week':
+        first = date - timedelta(days=date.weekday())
+        last = first + timedelta(days=6)
+    elif period == 'month':
+        first = date.replace(day=1)
+        last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    else:
+        raise ValueError(f"不支持的汇总周期: {period}，可用: {', '.join(PERIODS)}")
+    return first.strftime(NIGHT_FORMAT), last.strftime(NIGHT_FORMAT)
+
+
+class FieldStats:
+    """一个数值字段的可合并统计：矩、极值和KLL分位数草图"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.sketch = KLLSketch()
+
+    def add_values(self, values):
+        """加入一组数值（NaN忽略）"""
+        import numpy as np
+
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.count += int(len(values))
+        self.total += float(values.sum())
+        self.total_sq += float(np.square(values).sum())
+        self.sketch.update_many(values.tolist())
+
+    def merge(self, other):
+        """合并另一组统计"""
+        self.count += other.count
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.sketch.merge(other.sketch)
+        return self
+
+    def quantiles(self, qs):
+        """
+        估计分位数
+        :param qs: 0到1之间的分位点列表
+        """
+        return self.sketch.quantiles(qs)
+
+    def summary(self, quantiles=None):
+        """
+        均值、标准差、极值和分位数
+        :param quantiles: {名称: 分位点}，默认为SUMMARY_QUANTILES
+        """
+        if not self.count:
+            return {'count': 0}
+        quantiles = quantiles or SUMMARY_QUANTILES
+        mean = self.total / self.count
+        variance = max(self.total_sq / self.count - mean * mean, 0.0)
+        result = {
+            'count': self.count,
+            'mean': round(mean, 2),
+            'std': round(math.sqrt(variance), 2),
+            'min': self.sketch.minimum,
+            'max': self.sketch.maximum
+        }
+        result.update(zip(quantiles, self.quantiles(list(quantiles.values()))))
+        return result
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'sumsq': self.total_sq,
+            'sketch': self.sketch.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.count = data['count']
+        stats.total = data['sum']
+        stats.total_sq = data['sumsq']
+        stats.sketch = KLLSketch.from_dict(data['sketch'])
+        return stats
+
+
+class SleepAggregate:
+    """可合并的睡眠汇总（一晚、一周、一月或任意日期范围）"""
+
+    def __init__(self):
+        self.nights = 0
+        self.onset_nights = 0  # 有入睡时间的夜晚数
+        self.fields = {field: FieldStats() for field in STATS_FIELDS}
+        self.sums = {key: 0.0 for key in REPORT_SUMS}
+        self.sums['sleep_onset_latency_minutes'] = 0.0
+        self.stage_minutes = {stage: 0.0 for stage in STAGES}
+
+    @classmethod
+    def from_night(cls, columns, report):
+        """
+        一晚的汇总
+        :param columns: 该晚按列的样本数据（heart_rate、movement和sleep_stage）
+        :param report: 该晚的睡眠报告
+        """
+        import numpy as np
+
+        aggregate = cls()
+        aggregate.nights = 1
+        values = {field: np.array([math.nan if value is None else value for value in columns[field]], dtype=float)
+                  for field in ('heart_rate', 'movement') if field in columns}
+        if 'heart_rate' in values and 'sleep_stage' in columns:
+            asleep = np.array([stage not in (None, 'awake') for stage in columns['sleep_stage']], dtype=bool)
+            values['sleep_heart_rate'] = values['heart_rate'][asleep]
+        for field, field_values in values.items():
+            aggregate.fields[field].add_values(field_values)
+        for key in REPORT_SUMS:
+            aggregate.sums[key] = float(report.get(key) or 0)
+        if report.get('sleep_onset_latency_minutes') is not None:
+            aggregate.onset_nights = 1
+            aggregate.sums['sleep_onset_latency_minutes'] = float(report['sleep_onset_latency_minutes'])
+        for stage, minutes in report.get('stage_minutes', {}).items():
+            aggregate.stage_minutes[stage] = float(minutes)
+        return aggregate
+
+    def merge(self, other):
+        """合并另一个汇总"""
+        self.nights += other.nights
+        self.onset_nights += other.onset_nights
+        for field, stats in self.fields.items():
+            stats.merge(other.fields[field])
+        for key, value in other.sums.items():
+            self.sums[key] = self.sums.get(key, 0.0) + value
+        for stage, minutes in other.stage_minutes.items():
+            self.stage_minutes[stage] = self.stage_minutes.get(stage, 0.0) + minutes
+        return self
+
+    @classmethod
+    def merge_all(cls, aggregates):
+        """合并多个汇总"""
+        merged = cls()
+        for aggregate in aggregates:
+            merged.merge(aggregate)
+        return merged
+
+    def summary(self):
+        """每晚平均的睡眠指标，以及心率、睡眠期间心率和体动的分布"""
+        nights = self.nights or 1
+        time_in_bed = self.sums['time_in_bed_minutes']
+        result = {
+            'nights': self.nights,
+            'heart_rate': self.fields['heart_rate'].summary(),
+            'sleep_heart_rate': self.fields['sleep_heart_rate'].summary(),
+            'movement': self.fields['movement'].summary(),
+            'sleep_efficiency': round(self.sums['total_sleep_minutes'] / time_in_bed * 100, 1) if time_in_bed else 0.0,
+            'avg_sleep_onset_latency_minutes': (round(self.sums['sleep_onset_latency_minutes'] / self.onset_nights, 1)
+                                                if self.onset_nights else None),
+            'avg_stage_minutes': {stage: round(minutes / nights, 1) for stage, minutes in self.stage_minutes.items()}
+        }
+        for key in REPORT_SUMS:
+            result[f'avg_{key}'] = round(self.sums[key] / nights, 1)
+        return result
+
+    def to_dict(self):
+        return {
+            'nights': self.nights,
+            'onset_nights': self.onset_nights,
+            'fields': {field: stats.to_dict() for field, stats in self.fields.items()},
+            'sums': self.sums,
+            'stage_minutes': self.stage_minutes
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        aggregate = cls()
+        aggregate.nights = data['nights']
+        aggregate.onset_nights = data['onset_nights']
+        aggregate.fields.update((field, FieldStats.from_dict(stats)) for field, stats in data['fields'].items())
+        aggregate.sums.update(data['sums'])
+        aggregate.stage_minutes.update(data['stage_minutes'])
+        return aggregate
+
+
+def update_rollups(store, device_id, night, columns, report):
+    """
+    保存一晚的汇总，并更新该晚所在的周和月，以及设备全部夜晚的汇总
+    （周和月由其中各晚的汇总合并得到，全部夜晚由各月合并得到，同一晚重新导入时不会重复计算）
+    :param store: 历史数据存储（HistoryStore）
+    :param columns: 该晚按列的样本数据
+    :param report: 该晚的睡眠报告
+    """
+    store.put_night_stats(device_id, night, SleepAggregate.from_night(columns, report).to_dict())
+    for period in PERIODS:
+        first, last = period_range(night, period)
+        merged = SleepAggregate.merge_all(
+            SleepAggregate.from_dict(stats) for _, stats in store.get_night_stats(device_id, first, last))
+        store.put_rollup(device_id, period, period_key(night, period), merged.to_dict())
+    merged = SleepAggregate.merge_all(
+        SleepAggregate.from_dict(stats) for _, stats in store.query_rollups(device_id, 'month'))
+    store.put_rollup(device_id, ALL_PERIOD, ALL_PERIOD, merged.to_dict())
+
+
+def device_aggregate(store, device_id):
+    """设备全部夜晚的汇总（直接读取一行），没有数据时为空汇总"""
+    stats = store.get_rollup(device_id, ALL_PERIOD, ALL_PERIOD)
+    return SleepAggregate.from_dict(stats) if stats is not None else SleepAggregate()
+
+
+def query_trends(store, device_id, period='week', start=None, end=None):
+    """
+    按周或按月的趋势
+    :param period: 'week' 或 'month'
+    :param start: 开始日期（YYYYMMDD，包含该日期所在的周期）
+    :param end: 结束日期（YYYYMMDD，包含该日期所在的周期）
+    :return: [{'period', 'nights', ...}] 列表，按时间排序
+    :raises ValueError: 参数无效
+    """
+    if period not in PERIODS:
+        raise ValueError(f"不支持的汇总周期: {period}，可用: {', '.join(PERIODS)}")
+    start_key = period_key(start, period) if start else None
+    end_key = period_key(end, period) if end else None
+    return [dict(period=key, **SleepAggregate.from_dict(stats).summary())
+            for key, stats in store.query_rollups(device_id, period, start_key, end_key)]
+
+
+def aggregate_range(store, device_id, start, end):
+    """
+    任意日期范围的汇总：完整包含在范围内的月份直接使用月汇总，其余部分合并各晚的汇总
+    :param start: 开始日期（YYYYMMDD，包含）
+    :param end: 结束日期（YYYYMMDD，包含）
+    :return: SleepAggregate
+    :raises ValueError: 日期无效
+    """
+    first_date, last_date = _night_date(start), _night_date(end)
+    if first_date > last_date:
+        raise ValueError("开始日期不能晚于结束日期")
+
+    merged = SleepAggregate()
+    month_start = first_date.replace(day=1)
+    while month_start <= last_date:
+        month_first, month_last = period_range(month_start.strftime(NIGHT_FORMAT), 'month')
+        low, high = max(month_first, start), min(month_last, end)
+        if low == month_first and high == month_last:
+            stats = store.get_rollup(device_id, 'month', period_key(month_first, 'month'))
+            if stats is not None:
+                merged.merge(SleepAggregate.from_dict(stats))
+        else:
+            for _, stats in store.get_night_stats(device_id, low, high):
+                merged.merge(SleepAggregate.from_dict(stats))
+        month_start = (month_start + timedelta(days=32)).replace(day=1)
+    return merged
@@ -0,0 +1,121 @@
+"""
+传感器数据采集线程测试模块
+"""
+import threading
+import time
+import unittest
+
+from sleep_monitor.sensors.acquisition_worker import AcquisitionWorker
+from sleep_monitor.sensors.replay_sensor import ReplaySensor
+from sleep_monitor.sensors.sensor_simulator import SensorSimulator
+from sleep_monitor.sleep_analysis.resampler import create_resampler
+from sleep_monitor.sleep_analysis.sleep_stage_detector import SleepStageDetector
+from sleep_monitor.alarm.smart_alarm import SmartAlarm
+
+
+class TestAcquisitionWorker(unittest.TestCase):
+    """传感器数据采集线程测试类"""
+
+    def setUp(self):
+        """测试初始化"""
+        self.config = {
+            'sleep_detection': {
+                'sampling_rate': 60,
+                'deep_sleep_hr_threshold': 60,
+                'light_sleep_hr_threshold': 70,
+                'movement_threshold': 5
+            },
+            'alarm_settings': {
+                'wake_time': '07:00',
+                'alarm_window': 30,
+                'alarm_duration': 5
+            }
+        }
+        self.sensor = SensorSimulator(self.config)
+        self.detector = SleepStageDetector(self.config)
+        self.alarm = SmartAlarm(self.config)
+
+    def test_acquire_once(self):
+        """测试采集一次数据并发布快照"""
+        worker = AcquisitionWorker(self.sensor, self.detector, self.alarm)
+
+        self.assertIsNone(worker.latest)
+        snapshot = worker.acquire_once()
+
+        self.assertIs(worker.latest, snapshot)
+        self.assertEqual(snapshot['sequence'], 1)
+        self.assertIn('heart_rate', snapshot['sensor_data'])
+        self.assertIn(snapshot['sleep_stage'], ['awake', 'light_sleep', 'deep_sleep', 'rem_sleep'])
+        self.assertEqual(snapshot['device_info']['device_model'], 'Sensor Simulator')
+
+    def test_resampled_buckets(self):
+        """测试设置重采样器时按桶检测和发布，缺口桶不发布"""
+        self.assertIsNone(create_resampler(self.config))
+        config = dict(self.config, resampling={'enabled': True, 'interval': 120})
+        # 每分钟一个样本，第5到8分钟没有数据
+        start = 1700000040000 - 1700000040000 % 120000
+        samples = [{'ts': start + minute * 60000, 'heart_rate': 60 + minute, 'movement': 1.0}
+                   for minute in (0, 1, 2, 3, 4, 9)]
+        worker = AcquisitionWorker(ReplaySensor(config, samples, speed=0), self.detector, self.alarm,
+                                   resampler=create_resampler(config))
+
+        published = [worker.acquire_once() for _ in samples]
+        self.assertEqual([snapshot is not None for snapshot in published], [False, False, True, False, True, True])
+        buckets = [snapshot['sensor_data'] for snapshot in worker.drain()]
+        self.assertEqual([bucket['ts'] for bucket in buckets], [start, start + 120000, start + 240000])
+        self.assertEqual([bucket['heart_rate'] for bucket in buckets], [60.5, 62.5, 64])
+        self.assertEqual(worker.sequence, 3)
+
+    def test_drain_returns_every_snapshot(self):
+        """测试两次取出之间发布的快照全部按顺序取出，队列满时丢弃最旧的快照"""
+        worker = AcquisitionWorker(self.sensor, self.detector, self.alarm, queue_size=3)
+        for _ in range(2):
+            worker.acquire_once()
+        self.assertEqual([snapshot['sequence'] for snapshot in worker.drain()], [1, 2])
+        self.assertEqual(worker.drain(), [])
+
+        for _ in range(5):
+            worker.acquire_once()
+        self.assertEqual([snapshot['sequence'] for snapshot in worker.drain()], [5, 6, 7])
+        self.assertEqual(worker.dropped_snapshots, 2)
+
+    def test_skip_non_real(self):
+        """测试跳过非真实样本"""
+        worker = AcquisitionWorker(self.sensor, self.detector, self.alarm, skip_non_real=True)
+
+        # 模拟器生成的样本都标记为simulated
+        self.assertIsNone(worker.acquire_once())
+        self.assertEqual(worker.skipped_samples, 1)
+        self.assertEqual(len(self.detector.recent_data), 0)
+
+    def test_background_thread(self):
+        """测试后台线程持续采集"""
+        worker = AcquisitionWorker(self.sensor, self.detector, self.alarm, interval=0.01)
+        worker.start()
+        try:
+            deadline = time.monotonic() + 2
+            while (worker.latest is None or worker.latest['sequence'] < 3) and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            worker.stop(timeout=1)
+
+        self.assertGreaterEqual(worker.latest['sequence'], 3)
+        self.assertFalse(worker.is_running())
+
+    def test_alarm_requested_once(self):
+        """测试唤醒请求只通过回调发出一次"""
+        requests = []
+        # 始终满足唤醒条件
+        self.alarm.should_wake_up = lambda stage, current_time: True
+        worker = AcquisitionWorker(self.sensor, self.detector, self.alarm,
+                                   on_alarm=lambda: requests.append(threading.current_thread()))
+
+        worker.acquire_once()
+        worker.acquire_once()
+
+        self.assertEqual(len(requests), 1)
+        self.assertTrue(worker.alarm_requested)
+
+
+if __name__ == '__main__':
+    unittest.main()
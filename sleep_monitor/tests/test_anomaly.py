@@ -0,0 +1,143 @@
+"""
+流式异常检测测试模块
+"""
+import json
+import unittest
+
+from sleep_monitor.api import sleep_api
+from sleep_monitor.sleep_analysis.anomaly import AnomalyMonitor, anomaly_settings
+from sleep_monitor.utils.event_bus import EventBus
+
+START_TS = 1700000000000
+MINUTE = 60000
+
+
+def night(heart_rates, movement=1.0):
+    """每分钟一个样本，心率依次为heart_rates"""
+    return [{'ts': START_TS + i * MINUTE, 'heart_rate': hr, 'movement': movement}
+            for i, hr in enumerate(heart_rates)]
+
+
+def baseline(n):
+    """在58到62之间波动的平稳心率"""
+    return [60 + (i % 5) - 2 for i in range(n)]
+
+
+class TestAnomalyMonitor(unittest.TestCase):
+    """流式异常检测测试类"""
+
+    def run_samples(self, monitor, samples, device_id='band-1'):
+        return [event for sample in samples for event in monitor.process(sample, device_id)]
+
+    def test_sustained_hr_spike(self):
+        """测试持续升高的心率报警一次并在恢复后结束，平稳心率和短暂升高不报警"""
+        monitor = AnomalyMonitor()
+        self.assertEqual(self.run_samples(monitor, night(baseline(200))), [])
+        self.assertEqual(self.run_samples(monitor, night([85, 85] + baseline(50))), [])
+
+        monitor = AnomalyMonitor()
+        events = self.run_samples(monitor, night(baseline(100) + [85] * 20 + baseline(40)))
+        self.assertEqual([event['type'] for event in events], ['hr_spike', 'hr_spike_end'])
+        spike, end = events
+        self.assertLessEqual(spike['ts'], START_TS + 110 * MINUTE)
+        self.assertAlmostEqual(spike['baseline'], 60, delta=1)
+        self.assertEqual(spike['device_id'], 'band-1')
+        self.assertEqual(end['peak_heart_rate'], 85)
+        self.assertEqual(end['start'], spike['ts'])
+
+    def test_flatline(self):
+        """测试心率缺失或不变且没有体动时报警为手环脱落，有效数据恢复时结束"""
+        monitor = AnomalyMonitor()
+        samples = night(baseline(40) + [0] * 12 + baseline(5))
+        events = self.run_samples(monitor, samples)
+        self.assertEqual([event['type'] for event in events], ['flatline', 'flatline_end'])
+        self.assertEqual(events[0]['start'], START_TS + 40 * MINUTE)
+        self.assertEqual(events[0]['samples'], 10)
+
+        monitor = AnomalyMonitor()
+        samples = night(baseline(40)) + [{'ts': START_TS + (40 + i) * MINUTE, 'heart_rate': 61, 'movement': 0}
+                                         for i in range(12)]
+        self.assertEqual([event['type'] for event in self.run_samples(monitor, samples)], ['flatline'])
+        # 手环脱落期间的数据不影响心率基线
+        self.assertAlmostEqual(monitor.state('band-1').mean, 60, delta=1)
+
+    def test_alerts_rate_limited(self):
+        """测试同一设备同一类型的报警按间隔限流，事件仍然全部推送"""
+        alerts = []
+        bus = EventBus()
+        monitor = AnomalyMonitor({'sleep_detection': {'anomaly_detection': {'alert_interval': 3600}}}, bus,
+                                 alert=alerts.append)
+        with bus.subscribe() as subscription:
+            # 每次脱落15分钟后恢复5分钟，共3次
+            pattern = baseline(5) + ([0] * 15 + baseline(5)) * 3
+            self.run_samples(monitor, night(pattern))
+            self.run_samples(monitor, night(pattern), device_id='band-2')
+            events = [subscription.get(0) for _ in range(len(subscription))]
+        self.assertEqual(sum(event['type'] == 'flatline' for event in events), 6)
+        self.assertEqual([(alert['device_id'], alert['suppressed']) for alert in alerts],
+                         [('band-1', 0), ('band-2', 0)])
+
+    def test_devices_independent_and_bounded(self):
+        """测试各设备状态独立，超过容量时淘汰最久没有数据的设备"""
+        monitor = AnomalyMonitor({'sleep_detection': {'anomaly_detection': {'max_devices': 2}}})
+        for device_id, n in (('a', 3), ('b', 4), ('a', 1), ('c', 2)):
+            for sample in night(baseline(n)):
+                monitor.process(sample, device_id)
+        self.assertEqual(len(monitor), 2)
+        self.assertIsNone(monitor.state('b'))
+        self.assertEqual(monitor.state('a').count, 4)
+        self.assertEqual(monitor.state('c').count, 2)
+
+    def test_settings_validation(self):
+        """测试异常检测参数的校验和关闭"""
+        with self.assertRaises(ValueError):
+            anomaly_settings({'anomaly_detection': {'cusum_h': -1}})
+        with self.assertRaises(ValueError):
+            anomaly_settings({'anomaly_detection': {'unknown': 1}})
+        monitor = AnomalyMonitor({'sleep_detection': {'anomaly_detection': {'enabled': False}}})
+        self.assertEqual(self.run_samples(monitor, night([0] * 20)), [])
+        self.assertEqual(len(monitor), 0)
+
+
+class TestEventBus(unittest.TestCase):
+    """事件总线测试类"""
+
+    def test_bounded_queue_and_filter(self):
+        """测试队列满时丢弃最旧的事件，过滤函数和取消订阅"""
+        bus = EventBus()
+        subscription = bus.subscribe(maxsize=2)
+        filtered = bus.subscribe(predicate=lambda event: event['device_id'] == 'b')
+        for i in range(3):
+            bus.publish({'device_id': 'a', 'n': i})
+        bus.publish({'device_id': 'b', 'n': 3})
+        self.assertEqual(subscription.dropped, 2)
+        self.assertEqual([subscription.get(0)['n'] for _ in range(2)], [2, 3])
+        self.assertIsNone(subscription.get(0))
+        self.assertEqual(filtered.get(0)['n'], 3)
+        subscription.close()
+        filtered.close()
+        self.assertEqual(len(bus), 0)
+        self.assertEqual(bus.publish({'device_id': 'a'}), 0)
+
+    def test_sse_endpoint(self):
+        """测试 /api/events 按设备推送异常事件"""
+        monitor = AnomalyMonitor(bus=sleep_api.event_bus)
+        client = sleep_api.app.test_client()
+        response = client.get('/api/events?device_id=band-1')
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        stream = iter(response.response)
+        self.assertTrue(next(stream).startswith(b': connected'))
+
+        for device_id in ('band-2', 'band-1'):
+            for sample in night([0] * 10):
+                monitor.process(sample, device_id)
+        chunk = next(stream).decode('utf-8')
+        lines = chunk.strip().split('\n')
+        self.assertEqual(lines[0], 'event: flatline')
+        self.assertEqual(json.loads(lines[1][len('data: '):])['device_id'], 'band-1')
+        response.close()
+        self.assertEqual(len(sleep_api.event_bus), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+"""
+性能基准测试工具的测试模块
+"""
+import json
+import os
+import tempfile
+import unittest
+
+from sleep_monitor.benchmark import run_benchmarks, compare_results, main, RESULTS_VERSION
+
+
+def _document(results):
+    return {'version': RESULTS_VERSION, 'meta': {'scale': 'quick'},
+            'results': {name: {'median': value, 'min': value} for name, value in results.items()}}
+
+
+class TestBenchmark(unittest.TestCase):
+    """性能基准测试工具测试类"""
+
+    def test_compare_results(self):
+        """测试回归判断"""
+        baseline = _document({'a': 1.0, 'b': 1.0, 'c': 1.0, 'gone': 1.0})
+        current = _document({'a': 1.1, 'b': 1.5, 'c': 0.5, 'added': 1.0})
+
+        status = {row['name']: row['status'] for row in compare_results(baseline, current, threshold=0.2)}
+        self.assertEqual(status, {'a': 'ok', 'b': 'regression', 'c': 'improved',
+                                  'gone': 'missing', 'added': 'new'})
+
+        with self.assertRaises(ValueError):
+            compare_results(dict(baseline, version=0), current)
+
+    def test_run_selected(self):
+        """测试运行部分基准测试并输出结果文档"""
+        document = run_benchmarks(['parse_sensor_data'], scale='quick')
+
+        self.assertEqual(list(document['results']), ['parse_sensor_data.per_payload'])
+        result = document['results']['parse_sensor_data.per_payload']
+        self.assertGreater(result['min'], 0)
+        self.assertLessEqual(result['min'], result['median'])
+        self.assertEqual(result['items'], 1000)
+
+    def test_compare_exit_code(self):
+        """测试对比模式发现回归时返回1"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            baseline_path = os.path.join(temp_dir, 'baseline.json')
+            with open(baseline_path, 'w', encoding='utf-8') as f:
+                json.dump(_document({'parse_sensor_data.per_payload': 1e-12}), f)
+
+            output_path = os.path.join(temp_dir, 'current.json')
+            code = main(['--quick', '-k', 'parse_sensor_data', '-o', output_path, '--compare', baseline_path])
+
+            self.assertEqual(code, 1)
+            with open(output_path, 'r', encoding='utf-8') as f:
+                self.assertIn('parse_sensor_data.per_payload', json.load(f)['results'])
+
+
+if __name__ == '__main__':
+    unittest.main()
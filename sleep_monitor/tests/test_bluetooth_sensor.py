@@ -30,7 +30,8 @@ class TestBluetoothSensor(unittest.TestCase):
         """测试获取传感器数据"""
         data = self.sensor.get_sensor_data()
         
-        self.assertIn('timestamp', data)
+        self.assertIn('ts', data)
+        self.assertNotIn('timestamp', data)
         self.assertIn('heart_rate', data)
         self.assertIn('movement', data)
         self.assertIn('battery_level', data)
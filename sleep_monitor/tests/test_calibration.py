@@ -0,0 +1,163 @@
+"""
+个性化阈值校准测试模块
+"""
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from sleep_monitor.api import sleep_api
+from sleep_monitor.calibrate import calibrate_all
+from sleep_monitor.sensors.sensor_simulator import SensorSimulator
+from sleep_monitor.sleep_analysis.calibration import THRESHOLD_LIMITS, build_profile, calibrate_device
+from sleep_monitor.sleep_analysis.detector_registry import DetectorRegistry
+from sleep_monitor.sleep_analysis.sleep_stage_detector import SleepStageDetector
+from sleep_monitor.utils.config_service import DEFAULT_CONFIG
+from sleep_monitor.utils.history_store import HistoryStore
+
+CONFIG = {
+    'sleep_detection': {
+        'sampling_rate': 60,
+        'deep_sleep_hr_threshold': 60,
+        'light_sleep_hr_threshold': 70,
+        'movement_threshold': 5
+    }
+}
+
+
+def import_nights(store, device_id, heart_rate, nights=5, samples=120):
+    """导入若干晚，心率在heart_rate到heart_rate+14之间循环"""
+    for day in range(nights):
+        night = (datetime(2024, 1, 1) + timedelta(days=day)).strftime('%Y%m%d')
+        start = datetime.strptime(night, '%Y%m%d') + timedelta(hours=23)
+        store.import_samples([{
+            'timestamp': (start + timedelta(minutes=i)).isoformat(),
+            'heart_rate': heart_rate + i % 15,
+            'movement': (i % 10) * 0.2,
+            'sleep_stage': 'light_sleep'
+        } for i in range(samples)], device_id, night=night)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCalibration(unittest.TestCase):
+    """个性化阈值校准测试类"""
+
+    def setUp(self):
+        """测试初始化"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store = HistoryStore(os.path.join(self.temp_dir.name, 'history.sqlite3'))
+
+    def tearDown(self):
+        """清理临时文件"""
+        self.store.close()
+        self.temp_dir.cleanup()
+
+    def test_profile_follows_personal_baseline(self):
+        """测试静息心率低的用户得到更低的心率阈值，阈值在合理范围内"""
+        import_nights(self.store, 'low', 45)
+        import_nights(self.store, 'high', 62)
+        low = calibrate_device(self.store, 'low')
+        high = calibrate_device(self.store, 'high')
+
+        self.assertEqual(low['nights'], 5)
+        self.assertEqual(low['samples'], 600)
+        self.assertLess(low['baseline']['resting_heart_rate'], high['baseline']['resting_heart_rate'])
+        for name in ('deep_sleep_hr_threshold', 'light_sleep_hr_threshold'):
+            self.assertLess(low['thresholds'][name], high['thresholds'][name])
+        for name, (lower, upper) in THRESHOLD_LIMITS.items():
+            self.assertTrue(lower <= low['thresholds'][name] <= upper)
+        self.assertLess(low['thresholds']['deep_sleep_hr_threshold'], low['thresholds']['light_sleep_hr_threshold'])
+        self.assertEqual(self.store.get_profile('low'), low)
+
+    def test_insufficient_data(self):
+        """测试夜晚数或样本数不足时不生成档案"""
+        import_nights(self.store, 'band-1', 55, nights=2)
+        self.assertIsNone(calibrate_device(self.store, 'band-1'))
+        self.assertIsNone(self.store.get_profile('band-1'))
+        self.assertIsNone(build_profile([{'heart_rate': [60] * 10, 'movement': [1.0] * 10}] * 5))
+
+    def test_calibrate_all_dry_run(self):
+        """测试批量校准全部设备，dry-run时不保存"""
+        import_nights(self.store, 'band-1', 50)
+        import_nights(self.store, 'band-2', 55, nights=1)
+        results = calibrate_all(self.store, save=False)
+        self.assertEqual(set(results), {'band-1', 'band-2'})
+        self.assertIsNotNone(results['band-1'])
+        self.assertIsNone(results['band-2'])
+        self.assertIsNone(self.store.get_profile('band-1'))
+
+    def test_registry_loads_profile(self):
+        """测试注册表按设备加载档案阈值，档案缓存在有效时间后重新读取"""
+        clock = FakeClock()
+        registry = DetectorRegistry(CONFIG, self.store, profile_ttl=60, clock=clock)
+        plain = registry.get('band-1')
+        self.assertEqual(plain.sleep_detection['deep_sleep_hr_threshold'], 60)
+        self.assertIs(registry.get('band-1'), plain)
+
+        import_nights(self.store, 'band-1', 45)
+        profile = calibrate_device(self.store, 'band-1')
+        # 缓存有效期内仍使用全局阈值
+        self.assertEqual(registry.get('band-1').sleep_detection['deep_sleep_hr_threshold'], 60)
+        clock.now = 61
+        detector = registry.get('band-1')
+        self.assertIs(detector, plain)
+        self.assertEqual(detector.sleep_detection['deep_sleep_hr_threshold'],
+                         profile['thresholds']['deep_sleep_hr_threshold'])
+
+        # 其他设备不受影响，关闭个性化阈值后使用全局阈值
+        self.assertEqual(registry.get('band-2').sleep_detection['deep_sleep_hr_threshold'], 60)
+        registry.apply_config({'sleep_detection': dict(CONFIG['sleep_detection'], personalized_thresholds=False)})
+        self.assertEqual(registry.get('band-1').sleep_detection['deep_sleep_hr_threshold'], 60)
+
+    def test_runtime_thresholds_reach_device_detectors(self):
+        """测试运行时修改的阈值同时应用到按设备的检测器，设备档案中的阈值仍然优先"""
+        self.store.put_profile('band-1', {'thresholds': {'deep_sleep_hr_threshold': 50}})
+        saved = (sleep_api.sensor, sleep_api.detector, sleep_api.detectors, sleep_api.config)
+        sleep_api.config = DEFAULT_CONFIG
+        sleep_api.sensor = SensorSimulator(DEFAULT_CONFIG)
+        sleep_api.detector = SleepStageDetector(DEFAULT_CONFIG)
+        sleep_api.detectors = DetectorRegistry(DEFAULT_CONFIG, self.store)
+        try:
+            profiled = sleep_api.detectors.get('band-1')
+            client = sleep_api.app.test_client()
+            response = client.post('/api/classifier/thresholds',
+                                   json={'deep_sleep_hr_threshold': 55, 'rem_hrv_threshold': 5})
+            self.assertEqual(response.status_code, 200)
+            response = client.post('/api/sleep_analysis',
+                                   json={'ts': 1700000000000, 'heart_rate': 53, 'movement': 0.5, 'device_id': 'band-2'})
+            self.assertEqual(response.status_code, 200)
+
+            thresholds = sleep_api.detectors.get('band-2').classifier.thresholds
+            self.assertEqual((thresholds.deep_sleep_hr_threshold, thresholds.rem_hrv_threshold), (55, 5))
+            thresholds = profiled.classifier.thresholds
+            self.assertEqual((thresholds.deep_sleep_hr_threshold, thresholds.rem_hrv_threshold), (50, 5))
+
+            tree = {'feature': 'heart_rate', 'threshold': 60, 'left': {'stage': 'deep_sleep'}, 'right': {'stage': 'awake'}}
+            self.assertEqual(client.post('/api/classifier/tree', json=tree).status_code, 200)
+            self.assertIs(profiled.classifier, sleep_api.detector.classifier)
+            self.assertIs(sleep_api.detectors.get('band-3').classifier, sleep_api.detector.classifier)
+        finally:
+            sleep_api.sensor, sleep_api.detector, sleep_api.detectors, sleep_api.config = saved
+
+    def test_registry_evicts_least_recent(self):
+        """测试超过容量时淘汰最久未使用的设备"""
+        registry = DetectorRegistry(CONFIG, max_detectors=2)
+        first = registry.get('a')
+        registry.get('b')
+        registry.get('a')
+        registry.get('c')
+        self.assertEqual(len(registry), 2)
+        self.assertIs(registry.get('a'), first)
+        self.assertEqual(registry.detect_stage({'heart_rate': 55, 'movement': 0.5, 'device_id': 'a'}),
+                         first.detect_stage({'heart_rate': 55, 'movement': 0.5}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+"""
+图表数据测试模块
+"""
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from sleep_monitor.sleep_analysis.chart import lttb_indices, encode_hypnogram, build_chart
+from sleep_monitor.utils import history_store
+from sleep_monitor.utils.history_store import HistoryStore
+
+
+class TestChart(unittest.TestCase):
+    """图表数据测试类"""
+
+    def test_lttb_keeps_shape(self):
+        """测试LTTB保留首尾点和峰值，点数符合要求"""
+        x = np.arange(30000)
+        y = np.sin(x / 2000.0) * 10 + 60
+        y[12345] = 150  # 心率尖峰
+
+        selected = lttb_indices(x, y, 500)
+
+        self.assertEqual(len(selected), 500)
+        self.assertEqual(selected[0], 0)
+        self.assertEqual(selected[-1], 29999)
+        self.assertTrue(np.all(np.diff(selected) > 0))
+        self.assertIn(12345, selected)
+        np.testing.assert_array_equal(lttb_indices(x[:10], y[:10], 500), np.arange(10))
+
+    def test_hypnogram(self):
+        """测试睡眠阶段游程编码，未知阶段不输出"""
+        ts = [0, 60, 120, 180, 240, 300]
+        stages = ['awake', 'awake', 'light_sleep', None, 'light_sleep', 'deep_sleep']
+
+        self.assertEqual(encode_hypnogram(ts, stages), [
+            {'stage': 'awake', 'start': 0, 'end': 120},
+            {'stage': 'light_sleep', 'start': 120, 'end': 300},
+            {'stage': 'deep_sleep', 'start': 300, 'end': 300}
+        ])
+        self.assertEqual(encode_hypnogram([], []), [])
+
+    def test_build_chart_skips_gaps(self):
+        """测试曲线降采样时跳过缺失的数值"""
+        chart = build_chart({
+            'ts': [0, 1, 2, 3],
+            'heart_rate': [60, None, 62, 61],
+            'sleep_stage': ['awake'] * 4
+        }, points=10)
+
+        self.assertEqual(chart['total_samples'], 4)
+        self.assertEqual(chart['series']['heart_rate'], {'ts': [0, 2, 3], 'values': [60.0, 62.0, 61.0]})
+        self.assertEqual(len(chart['hypnogram']), 1)
+
+    def test_chart_endpoint_cached(self):
+        """测试图表接口按 (夜晚, 点数) 缓存结果"""
+        from sleep_monitor.api import sleep_api
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = HistoryStore(os.path.join(temp_dir, 'history.sqlite3'))
+            samples = [{'ts': 1700000000000 + i * 1000, 'heart_rate': 60 + i % 7, 'movement': i % 3,
+                        'sleep_stage': 'light_sleep' if i < 1500 else 'deep_sleep'} for i in range(3000)]
+            store.import_samples(samples, 'band-1', night='20231114')
+
+            saved = history_store._default_store, sleep_api._chart_cache
+            history_store._default_store, sleep_api._chart_cache = store, None
+            calls = []
+            load_columns = store.load_columns
+            store.load_columns = lambda *args: calls.append(args) or load_columns(*args)
+            try:
+                client = sleep_api.app.test_client()
+                first = client.get('/api/chart?device_id=band-1&points=100').get_json()
+                second = client.get('/api/chart?device_id=band-1&night=20231114&points=100').get_json()
+                missing = client.get('/api/chart?device_id=band-2')
+                invalid = client.get('/api/chart?device_id=band-1&points=1')
+            finally:
+                history_store._default_store, sleep_api._chart_cache = saved
+                store.close()
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(first['night'], '20231114')
+        self.assertEqual(len(first['series']['heart_rate']['ts']), 100)
+        self.assertEqual([segment['stage'] for segment in first['hypnogram']], ['light_sleep', 'deep_sleep'])
+        self.assertEqual(missing.status_code, 404)
+        self.assertEqual(invalid.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
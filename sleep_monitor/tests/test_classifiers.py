@@ -0,0 +1,114 @@
+"""
+睡眠阶段分类器测试模块
+"""
+import itertools
+import unittest
+
+from sleep_monitor.sleep_analysis.classifiers import (
+    RuleClassifier, CompiledClassifier, create_classifier
+)
+from sleep_monitor.sleep_analysis.feature_extractor import FeatureVector, FEATURE_NAMES
+from sleep_monitor.sleep_analysis.sleep_stage_detector import SleepStageDetector
+
+
+def make_features(heart_rate, movement, hr_trend=0, hr_rmssd=0, window_ready=True):
+    """构造只包含分类所需字段的特征向量"""
+    values = dict.fromkeys(FEATURE_NAMES, 0)
+    values.update(heart_rate=heart_rate, movement=movement, hr_trend=hr_trend, hr_rmssd=hr_rmssd)
+    return FeatureVector(epoch=0, n_samples=5, window_ready=window_ready, **values)
+
+
+class TestClassifiers(unittest.TestCase):
+    """分类器测试类"""
+
+    def setUp(self):
+        """测试初始化"""
+        self.sleep_detection = {
+            'sampling_rate': 60,
+            'deep_sleep_hr_threshold': 60,
+            'light_sleep_hr_threshold': 70,
+            'movement_threshold': 5
+        }
+
+    def _grid(self):
+        """覆盖所有分界值及其两侧的特征组合"""
+        return [
+            make_features(*values) for values in itertools.product(
+                (55, 59.9, 60, 65, 70, 72, 75, 80),
+                (0, 1.5, 2, 2.5, 4, 5, 6, 7.5, 9),
+                (-3, -2, 0, 2, 3),
+                (0, 3, 4),
+                (False, True)
+            )
+        ]
+
+    def test_compiled_matches_rules(self):
+        """测试编译后的查找表与阈值规则结果一致（包括分界值上的取值）"""
+        rules = RuleClassifier(self.sleep_detection)
+        compiled = CompiledClassifier(self.sleep_detection)
+        grid = self._grid()
+
+        self.assertEqual([compiled.classify(f) for f in grid], [rules.classify(f) for f in grid])
+        self.assertEqual(compiled.classify_many(grid), [rules.classify(f) for f in grid])
+
+    def test_hot_swap_thresholds(self):
+        """测试运行时更新阈值"""
+        compiled = CompiledClassifier(self.sleep_detection)
+        features = make_features(62, 1)
+        self.assertEqual(compiled.classify(features), 'light_sleep')
+
+        compiled.update_thresholds({'deep_sleep_hr_threshold': 65})
+        self.assertEqual(compiled.classify(features), 'deep_sleep')
+        self.assertEqual(compiled.thresholds.light_sleep_hr_threshold, 70)
+
+        with self.assertRaises(ValueError):
+            compiled.update_thresholds({'deep_sleep_hr_threshold': 80})
+        self.assertEqual(compiled.classify(features), 'deep_sleep')
+
+    def test_decision_tree(self):
+        """测试由决策树编译的分类器"""
+        tree = {
+            'feature': 'movement', 'threshold': 6,
+            'left': {
+                'feature': 'heart_rate', 'threshold': 58,
+                'left': {'stage': 'deep_sleep'},
+                'right': {'stage': 'light_sleep'}
+            },
+            'right': {'stage': 'awake'}
+        }
+        classifier = CompiledClassifier.from_decision_tree(tree)
+
+        self.assertEqual(classifier.classify(make_features(58, 6)), 'deep_sleep')
+        self.assertEqual(classifier.classify(make_features(58.5, 1)), 'light_sleep')
+        self.assertEqual(classifier.classify(make_features(50, 6.1)), 'awake')
+
+        with self.assertRaises(ValueError):
+            CompiledClassifier.from_decision_tree({'feature': 'hr_p90', 'threshold': 1,
+                                                   'left': {'stage': 'awake'}, 'right': {'stage': 'awake'}})
+
+    def test_decision_tree_too_large(self):
+        """测试分界值过多、查找表超过上限的决策树在构建前被拒绝"""
+        tree = {'stage': 'awake'}
+        for feature in ('heart_rate', 'movement', 'hr_trend'):
+            for i in range(60):
+                tree = {'feature': feature, 'threshold': i, 'left': {'stage': 'deep_sleep'}, 'right': tree}
+        with self.assertRaises(ValueError):
+            CompiledClassifier.from_decision_tree(tree)
+
+    def test_detector_uses_configured_classifier(self):
+        """测试检测器按配置选择分类器并支持更新阈值"""
+        config = {'sleep_detection': dict(self.sleep_detection, classifier='compiled')}
+        detector = SleepStageDetector(config)
+        self.assertIsInstance(detector.classifier, CompiledClassifier)
+
+        sample = {'timestamp': '2023-01-01T02:00:00', 'heart_rate': 62, 'movement': 1}
+        self.assertEqual(detector.detect_stage(sample), 'light_sleep')
+        detector.update_thresholds({'deep_sleep_hr_threshold': 65})
+        self.assertEqual(detector.detect_stage(dict(sample, timestamp='2023-01-01T02:01:00')), 'deep_sleep')
+
+        with self.assertRaises(ValueError):
+            create_classifier(dict(self.sleep_detection, classifier='unknown'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+"""
+配置服务测试模块
+"""
+import json
+import os
+import pickle
+import tempfile
+import time
+import unittest
+from datetime import datetime
+
+from sleep_monitor.utils.config_service import ConfigService, load_config_file
+from sleep_monitor.sleep_analysis.sleep_stage_detector import SleepStageDetector
+from sleep_monitor.alarm.smart_alarm import SmartAlarm
+from sleep_monitor.sensors.sensor_simulator import SensorSimulator
+
+
+class TestConfigService(unittest.TestCase):
+    """配置服务测试类"""
+
+    def setUp(self):
+        """测试初始化"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'config.json')
+        self._write({'sleep_detection': {'deep_sleep_hr_threshold': 58}})
+
+    def tearDown(self):
+        """清理临时文件"""
+        self.temp_dir.cleanup()
+
+    def _write(self, config):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(config, f)
+
+    def test_snapshot(self):
+        """测试与默认配置合并，快照不可修改但可以序列化"""
+        service = ConfigService([self.path])
+        config = service.get()
+
+        self.assertEqual(config['sleep_detection']['deep_sleep_hr_threshold'], 58)
+        self.assertEqual(config['sleep_detection']['light_sleep_hr_threshold'], 70)
+        self.assertEqual(config['alarm_settings']['wake_time'], '07:00')
+        with self.assertRaises(TypeError):
+            config['sleep_detection']['movement_threshold'] = 1
+
+        self.assertEqual(pickle.loads(pickle.dumps(config)), config)
+        self.assertEqual(json.loads(json.dumps(config)), config)
+
+        missing = ConfigService([os.path.join(self.temp_dir.name, 'missing.json')])
+        self.assertEqual(missing.get()['sleep_detection']['deep_sleep_hr_threshold'], 60)
+        self.assertIsNone(missing.path)
+
+    def test_reload_and_validation(self):
+        """测试文件变化后重新加载，无效配置保留当前快照"""
+        service = ConfigService([self.path])
+        self.assertFalse(service.reload())
+
+        self._write({'sleep_detection': {'deep_sleep_hr_threshold': 55}, 'alarm_settings': {'wake_time': '06:30'}})
+        self.assertTrue(service.reload())
+        self.assertEqual(service.get()['alarm_settings']['wake_time'], '06:30')
+        version = service.version
+
+        self._write({'sleep_detection': {'deep_sleep_hr_threshold': 90}})
+        self.assertFalse(service.reload())
+        self.assertEqual(service.version, version)
+        self.assertEqual(service.get()['sleep_detection']['deep_sleep_hr_threshold'], 55)
+
+        with self.assertRaises(ValueError):
+            service.update({'alarm_settings': {'wake_time': '25:00'}})
+        with self.assertRaises(ValueError):
+            load_config_file(self.path)
+
+    def test_live_components(self):
+        """测试配置变化直接更新到检测器和闹钟，窗口数据保留"""
+        service = ConfigService([self.path])
+        detector = SleepStageDetector(service.get())
+        alarm = SmartAlarm(service.get())
+        service.attach(detector)
+        service.attach(alarm)
+
+        simulator = SensorSimulator(service.get())
+        for _ in range(5):
+            detector.detect_stage(simulator.get_sensor_data())
+
+        service.update({'sleep_detection': {'movement_threshold': 3},
+                        'alarm_settings': {'wake_time': '06:15', 'alarm_window': 20}})
+
+        self.assertEqual(len(detector.recent_data), 5)
+        self.assertEqual(detector.classifier.get_info()['thresholds']['movement_threshold'], 3)
+        self.assertEqual(alarm.wake_time.strftime('%H:%M'), '06:15')
+        self.assertEqual(alarm.alarm_window, 20)
+        self.assertGreater(alarm.wake_time, datetime.now())
+
+    def test_watch_thread(self):
+        """测试后台线程发现配置文件的变化"""
+        service = ConfigService([self.path])
+        changes = []
+        service.subscribe(changes.append)
+        service.start_watching(interval=0.01)
+        try:
+            self._write({'sleep_detection': {'deep_sleep_hr_threshold': 50, 'light_sleep_hr_threshold': 65}})
+            deadline = time.monotonic() + 2
+            while not changes and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            service.stop_watching()
+
+        self.assertEqual(changes[-1]['sleep_detection']['light_sleep_hr_threshold'], 65)
+
+
+if __name__ == '__main__':
+    unittest.main()
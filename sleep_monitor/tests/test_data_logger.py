@@ -0,0 +1,74 @@
+"""
+数据记录器测试模块
+"""
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+from sleep_monitor.utils.data_logger import DataLogger
+
+
+class TestDataLogger(unittest.TestCase):
+    """数据记录器测试类"""
+
+    def setUp(self):
+        """测试初始化"""
+        self.data_dir = tempfile.mkdtemp()
+        self.logger = DataLogger(self.data_dir)
+        self.date_str = datetime.now().strftime("%Y%m%d")
+
+    def tearDown(self):
+        """清理临时目录"""
+        shutil.rmtree(self.data_dir)
+
+    def test_append_sleep_data(self):
+        """测试追加写入JSON Lines数据"""
+        first = [{'heart_rate': 60, 'movement': 1.0, 'sleep_stage': 'deep_sleep'}]
+        second = [{'heart_rate': 70, 'movement': 3.0, 'sleep_stage': 'light_sleep'}] * 2
+
+        self.logger.append_sleep_data(first)
+        self.logger.append_sleep_data(second)
+        self.logger.append_sleep_data([])
+
+        data = self.logger.load_sleep_data(f"sleep_data_{self.date_str}.jsonl")
+        self.assertEqual(len(data), 3)
+        self.assertEqual(data[0]['sleep_stage'], 'deep_sleep')
+
+    def test_load_skips_torn_line(self):
+        """测试追加写入中断留下的不完整行被跳过，其余数据正常加载"""
+        filename = f"sleep_data_{self.date_str}.jsonl"
+        self.logger.append_sleep_data([{'heart_rate': 60 + i, 'movement': 1.0, 'sleep_stage': 'light_sleep'}
+                                       for i in range(5)])
+        with open(f"{self.data_dir}/{filename}", 'a', encoding='utf-8') as f:
+            f.write('{"heart_rate": 66, "move')
+
+        with self.assertLogs('sleep_monitor.utils.data_logger', level='WARNING'):
+            data = self.logger.load_sleep_data(filename)
+        self.assertEqual([record['heart_rate'] for record in data], [60, 61, 62, 63, 64])
+
+    def test_ts_only_samples_get_timestamp(self):
+        """测试只有ts字段的传感器样本写入文件时补上ISO时间，原样本不修改"""
+        sample = {'ts': 1700000000000, 'heart_rate': 60, 'movement': 1.0}
+        self.logger.append_sleep_data([sample])
+        self.logger.log_sleep_data(sample)
+        self.assertNotIn('timestamp', sample)
+
+        for filename in (f"sleep_data_{self.date_str}.jsonl", f"sleep_data_{self.date_str}.json"):
+            record = self.logger.load_sleep_data(filename)[0]
+            self.assertEqual(record['ts'], 1700000000000)
+            self.assertEqual(record['timestamp'][:2], '20')
+
+    def test_daily_summary_merges_formats(self):
+        """测试每日总结合并JSON和JSON Lines数据"""
+        self.logger.log_sleep_data({'heart_rate': 60, 'movement': 1.0, 'sleep_stage': 'deep_sleep'})
+        self.logger.append_sleep_data([{'heart_rate': 80, 'movement': 3.0, 'sleep_stage': 'awake'}])
+
+        summary = self.logger.get_daily_summary()
+        self.assertEqual(summary['total_records'], 2)
+        self.assertEqual(summary['avg_heart_rate'], 70)
+        self.assertEqual(summary['sleep_stage_distribution'], {'deep_sleep': 1, 'awake': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+"""
+特征提取器测试模块
+"""
+import math
+import random
+import statistics
+import unittest
+
+from sleep_monitor.sleep_analysis.feature_extractor import (
+    RunningQuantile, StreamingFeatureExtractor, feature_matrix, FEATURE_NAMES
+)
+
+
+class TestRunningQuantile(unittest.TestCase):
+    """滑动窗口分位数测试类"""
+
+    def test_matches_sorted_window(self):
+        """测试滑动窗口分位数与排序结果一致（含重复值）"""
+        rng = random.Random(7)
+        for quantile in (0.1, 0.5, 0.9):
+            running = RunningQuantile(quantile)
+            window = []
+            for key in range(2000):
+                value = rng.choice([55, 60, 60, 62, 70, 70, 70]) if key % 2 else rng.uniform(50, 80)
+                window.append((key, value))
+                running.add(value, key)
+                if len(window) > 30:
+                    running.remove(window.pop(0)[0])
+
+                values = sorted(v for _, v in window)
+                rank = max(1, math.ceil(quantile * len(values)))
+                self.assertEqual(running.value(), values[rank - 1])
+
+    def test_heap_size_bounded(self):
+        """测试长时间运行后堆中的元素数与窗口大小成正比，而不是随样本数增长"""
+        rng = random.Random(3)
+        running = RunningQuantile(0.9)
+        window = 300
+        for key in range(20000):
+            running.add(rng.uniform(50, 80), key)
+            if key >= window:
+                running.remove(key - window)
+        self.assertEqual(len(running), window)
+        self.assertLessEqual(len(running._lower) + len(running._upper), 3 * window)
+        self.assertLessEqual(len(running._deleted), 2 * window)
+
+    def test_empty(self):
+        """测试空窗口"""
+        running = RunningQuantile()
+        self.assertIsNone(running.value())
+        running.add(1, 'a')
+        running.remove('a')
+        self.assertIsNone(running.value())
+
+
+class TestStreamingFeatureExtractor(unittest.TestCase):
+    """增量特征提取器测试类"""
+
+    def setUp(self):
+        """测试初始化"""
+        self.config = {
+            'sleep_detection': {
+                'sampling_rate': 60,
+                'deep_sleep_hr_threshold': 60,
+                'light_sleep_hr_threshold': 70,
+                'movement_threshold': 5
+            }
+        }
+
+    def test_features_match_direct_computation(self):
+        """测试增量特征与直接计算窗口结果一致"""
+        rng = random.Random(3)
+        extractor = StreamingFeatureExtractor(self.config)
+        samples = [
+            {'timestamp': 1672531200 + i * 60, 'heart_rate': rng.randint(55, 80), 'movement': rng.uniform(0, 8)}
+            for i in range(50)
+        ]
+
+        for i, sample in enumerate(samples):
+            features = extractor.update(sample)
+
+            # 5分钟窗口内（不含左端点）的样本
+            window = [s for s in samples[:i + 1] if s['timestamp'] > sample['timestamp'] - 300]
+            heart_rates = [s['heart_rate'] for s in window]
+            movements = [s['movement'] for s in window]
+            diffs = [b - a for a, b in zip(heart_rates, heart_rates[1:])]
+
+            self.assertEqual(features.n_samples, len(window))
+            self.assertAlmostEqual(features.hr_mean, statistics.mean(heart_rates))
+            if len(window) > 1:
+                self.assertAlmostEqual(features.hr_std, statistics.stdev(heart_rates), places=6)
+                self.assertAlmostEqual(features.hr_rmssd, math.sqrt(sum(d * d for d in diffs) / len(diffs)), places=6)
+            self.assertEqual(features.hr_trend, heart_rates[-1] - heart_rates[0])
+            self.assertEqual(features.hr_median, sorted(heart_rates)[math.ceil(len(window) / 2) - 1])
+            self.assertAlmostEqual(features.movement_energy, sum(m * m for m in movements))
+
+    def test_gap_excludes_successive_difference(self):
+        """测试数据中断时不计算跨越中断的逐差"""
+        extractor = StreamingFeatureExtractor(self.config)
+        extractor.update({'timestamp': 0, 'heart_rate': 60, 'movement': 1})
+        extractor.update({'timestamp': 60, 'heart_rate': 62, 'movement': 1})
+        # 间隔超过3个采样周期
+        features = extractor.update({'timestamp': 290, 'heart_rate': 80, 'movement': 1})
+
+        self.assertEqual(features.n_samples, 3)
+        self.assertAlmostEqual(features.hr_rmssd, 2.0)
+
+    def test_feature_matrix(self):
+        """测试离线特征矩阵"""
+        samples = [{'timestamp': i * 60, 'heart_rate': 60 + i % 3, 'movement': 1} for i in range(10)]
+        matrix = feature_matrix(samples, self.config)
+
+        self.assertEqual(matrix.shape, (10, len(FEATURE_NAMES)))
+        self.assertEqual(list(matrix[:, FEATURE_NAMES.index('heart_rate')]), [s['heart_rate'] for s in samples])
+
+
+if __name__ == '__main__':
+    unittest.main()
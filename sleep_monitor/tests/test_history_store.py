@@ -0,0 +1,129 @@
+"""
+历史数据存储测试模块
+"""
+import json
+import os
+import tempfile
+import unittest
+
+from sleep_monitor.utils import history_store
+from sleep_monitor.utils.history_store import HistoryStore
+
+START_TS = 1699999800000  # 对齐到10分钟
+
+
+def make_samples(count, device_id='band-1', step_ms=60000):
+    stages = ('awake', 'light_sleep', 'deep_sleep', 'rem_sleep')
+    return [{
+        'ts': START_TS + i * step_ms,
+        'device_id': device_id,
+        'heart_rate': 50 + i % 20,
+        'movement': float(i % 5),
+        'sleep_stage': stages[i // 10 % 4],
+        'provenance': 'real'
+    } for i in range(count)]
+
+
+class TestHistoryStore(unittest.TestCase):
+    """历史数据存储测试类"""
+
+    def setUp(self):
+        """测试初始化"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store = HistoryStore(os.path.join(self.temp_dir.name, 'history.sqlite3'))
+
+    def tearDown(self):
+        """清理临时文件"""
+        self.store.close()
+        self.temp_dir.cleanup()
+
+    def test_cursor_pagination(self):
+        """测试游标分页按顺序返回范围内的全部样本，字段投影只返回需要的字段"""
+        self.store.add_samples(make_samples(95))
+        self.store.add_samples(make_samples(10, device_id='band-2'))
+
+        pages = []
+        cursor = None
+        while True:
+            items, cursor = self.store.query_samples('band-1', start=START_TS + 60000 * 5,
+                                                     fields=['heart_rate'], limit=20, cursor=cursor)
+            pages.append(items)
+            if cursor is None:
+                break
+
+        rows = [item for page in pages for item in page]
+        self.assertEqual(len(pages), 5)
+        self.assertEqual(len(rows), 90)
+        self.assertEqual(rows[0], {'ts': START_TS + 60000 * 5, 'heart_rate': 55})
+        self.assertEqual([row['ts'] for row in rows], sorted({row['ts'] for row in rows}))
+
+        devices = self.store.devices()
+        self.assertEqual([device['device_id'] for device in devices], ['band-1', 'band-2'])
+        self.assertEqual(devices[0]['last_ts'], START_TS + 60000 * 94)
+
+        with self.assertRaises(ValueError):
+            self.store.query_samples('band-1', fields=['blood_pressure'])
+        with self.assertRaises(ValueError):
+            self.store.query_samples('band-1', cursor='not-a-cursor')
+
+    def test_bucket_downsampling(self):
+        """测试按时间桶降采样，桶内数值取平均，游标跨页不重复"""
+        self.store.add_samples(make_samples(60))
+
+        items, cursor = self.store.query_samples('band-1', bucket=600, limit=4)
+        rest, last = self.store.query_samples('band-1', bucket=600, limit=4, cursor=cursor)
+
+        self.assertIsNone(last)
+        self.assertEqual(len(items) + len(rest), 6)
+        self.assertEqual(items[0]['count'], 10)
+        self.assertAlmostEqual(items[0]['heart_rate'], 54.5)
+        self.assertEqual(items[1]['sleep_stage'], 'light_sleep')
+        self.assertEqual(rest[0]['ts'] - items[-1]['ts'], 600000)
+
+    def test_import_and_summaries(self):
+        """测试导入数据文件并生成每晚总结，按日期范围分页查询"""
+        for day in range(3):
+            path = os.path.join(self.temp_dir.name, f'stages_2024010{day + 1}.jsonl')
+            with open(path, 'w', encoding='utf-8') as f:
+                for sample in make_samples(40, device_id='band-1'):
+                    sample['ts'] += day * 86400000
+                    del sample['device_id']
+                    f.write(json.dumps(sample) + '\n')
+            self.store.import_file(path, 'band-1', night=f'2024010{day + 1}')
+
+        summary = self.store.get_summary('band-1', '20240102')
+        self.assertEqual(summary['total_records'], 40)
+        self.assertEqual(summary['sleep_stage_distribution'], {
+            'awake': 10, 'light_sleep': 10, 'deep_sleep': 10, 'rem_sleep': 10})
+
+        items, cursor = self.store.query_summaries('band-1', start='20240102', limit=1)
+        self.assertEqual(items[0]['night'], '20240102')
+        items, cursor = self.store.query_summaries('band-1', start='20240102', limit=1, cursor=cursor)
+        self.assertEqual(items[0]['night'], '20240103')
+        self.assertIsNone(cursor)
+
+    def test_api(self):
+        """测试历史查询接口"""
+        from sleep_monitor.api.sleep_api import app
+
+        self.store.add_samples(make_samples(30))
+        saved = history_store._default_store
+        history_store._default_store = self.store
+        try:
+            client = app.test_client()
+            first = client.get(f'/api/history/samples?device_id=band-1&start={START_TS}&limit=25'
+                               '&fields=heart_rate,movement').get_json()
+            second = client.get(f'/api/history/samples?device_id=band-1&cursor={first["next_cursor"]}').get_json()
+            invalid = client.get('/api/history/samples?device_id=band-1&fields=pressure')
+        finally:
+            history_store._default_store = saved
+
+        self.assertEqual(len(first['items']), 25)
+        self.assertEqual(set(first['items'][0]), {'ts', 'timestamp', 'heart_rate', 'movement'})
+        self.assertEqual(len(second['items']), 5)
+        self.assertIsNone(second['next_cursor'])
+        self.assertEqual(invalid.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+"""
+运行指标测试模块
+"""
+import shutil
+import tempfile
+import unittest
+
+from sleep_monitor.utils.metrics import MetricsRegistry
+from sleep_monitor.utils import metrics
+from sleep_monitor.sleep_analysis.sleep_stage_detector import SleepStageDetector
+from sleep_monitor.sensors.sensor_simulator import SensorSimulator
+from sleep_monitor.utils.data_logger import DataLogger
+
+
+class TestMetrics(unittest.TestCase):
+    """运行指标测试类"""
+
+    def setUp(self):
+        """测试初始化"""
+        self.registry = MetricsRegistry()
+
+    def test_histogram_buckets(self):
+        """测试直方图的累计桶、总和与总数"""
+        latency = self.registry.histogram('latency_seconds', '耗时', ('endpoint',), buckets=(0.1, 1))
+        child = latency.labels('/api/status')
+        for value in (0.05, 0.1, 0.5, 3):
+            child.observe(value)
+
+        text = self.registry.render()
+        self.assertIn('# TYPE latency_seconds histogram', text)
+        self.assertIn('latency_seconds_bucket{endpoint="/api/status",le="0.1"} 2', text)
+        self.assertIn('latency_seconds_bucket{endpoint="/api/status",le="1"} 3', text)
+        self.assertIn('latency_seconds_bucket{endpoint="/api/status",le="+Inf"} 4', text)
+        self.assertIn('latency_seconds_sum{endpoint="/api/status"} 3.65', text)
+        self.assertIn('latency_seconds_count{endpoint="/api/status"} 4', text)
+
+    def test_counter_and_gauge(self):
+        """测试计数器、仪表和回调仪表"""
+        errors = self.registry.counter('errors_total', '错误次数', ('kind',))
+        errors.labels('parse').inc()
+        errors.labels('parse').inc(2)
+        depth = self.registry.gauge('queue_depth', '队列长度')
+        depth.set(7)
+        pending = self.registry.gauge('pending', '等待数')
+        pending.set_function(lambda: 3)
+
+        text = self.registry.render()
+        self.assertIn('errors_total{kind="parse"} 3', text)
+        self.assertIn('queue_depth 7', text)
+        self.assertIn('pending 3', text)
+
+        with self.assertRaises(ValueError):
+            errors.labels('a', 'b')
+        with self.assertRaises(ValueError):
+            errors.inc(-1)
+        with self.assertRaises(ValueError):
+            self.registry.gauge('errors_total', '错误次数', ('kind',))
+
+    def test_label_escaping(self):
+        """测试标签值转义"""
+        self.registry.counter('c', 'c', ('v',)).labels('a"b\\c').inc()
+        self.assertIn('c{v="a\\"b\\\\c"} 1', self.registry.render())
+
+    def test_detector_instrumented(self):
+        """测试检测耗时被记录到全局注册表"""
+        detect_seconds = metrics.REGISTRY.get('sleep_detect_stage_seconds')
+        before = detect_seconds.count
+
+        config = {'sleep_detection': {'sampling_rate': 60, 'deep_sleep_hr_threshold': 60,
+                                      'light_sleep_hr_threshold': 70, 'movement_threshold': 5}}
+        detector = SleepStageDetector(config)
+        simulator = SensorSimulator(config)
+        for _ in range(3):
+            detector.detect_stage(simulator.get_sensor_data())
+
+        self.assertEqual(detect_seconds.count, before + 3)
+
+    def test_data_logger_flush_bytes(self):
+        """测试每批写入的字节数按字节桶记录"""
+        flush_bytes = metrics.REGISTRY.get('data_logger_flush_bytes').labels('jsonl')
+        before = (flush_bytes.count, flush_bytes.sum)
+
+        data_dir = tempfile.mkdtemp()
+        try:
+            DataLogger(data_dir).append_sleep_data([{'heart_rate': 60, 'movement': 1.0}] * 100, 'night.jsonl')
+        finally:
+            shutil.rmtree(data_dir)
+
+        self.assertEqual(flush_bytes.count, before[0] + 1)
+        self.assertGreater(flush_bytes.sum - before[1], 1024)
+        self.assertIn('data_logger_flush_bytes_bucket{format="jsonl",le="4096"}', metrics.REGISTRY.render())
+
+    def test_metrics_endpoint(self):
+        """测试/metrics接口"""
+        from sleep_monitor.api.sleep_api import app
+
+        client = app.test_client()
+        client.get('/metrics')
+        response = client.get('/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        self.assertIn('http_requests_total{endpoint="/metrics",method="GET",status="200"}',
+                      response.get_data(as_text=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
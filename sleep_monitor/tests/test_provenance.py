@@ -0,0 +1,70 @@
+"""
+样本来源标记测试模块
+"""
+import unittest
+
+from sleep_monitor.sensors.provenance import (
+    ProvenanceTracker, ProvenanceCounter, is_real, REAL, INTERPOLATED, SIMULATED
+)
+from sleep_monitor.sensors.hardware_sensor import HardwareSensor
+
+
+class TestProvenance(unittest.TestCase):
+    """样本来源标记测试类"""
+
+    def setUp(self):
+        """测试初始化"""
+        self.config = {
+            'sleep_detection': {'sampling_rate': 60},
+            'device_settings': {'max_hold_seconds': 120}
+        }
+
+    def test_fill_missing_fields(self):
+        """测试缺失字段沿用真实值或使用模拟值"""
+        tracker = ProvenanceTracker(self.config)
+        simulate = lambda field: -1
+
+        sample = tracker.fill({'ts': 0, 'heart_rate': 62, 'movement': 1.5}, simulate)
+        self.assertEqual(sample['provenance'], REAL)
+
+        sample = tracker.fill({'ts': 60000, 'heart_rate': None, 'movement': 2.0}, simulate)
+        self.assertEqual(sample['provenance'], INTERPOLATED)
+        self.assertEqual(sample['heart_rate'], 62)
+
+        # 距离最近一次真实心率超过沿用时间后使用模拟值
+        sample = tracker.fill({'ts': 170000, 'heart_rate': None, 'movement': None}, simulate)
+        self.assertEqual(sample['provenance'], SIMULATED)
+        self.assertEqual(sample['heart_rate'], -1)
+        self.assertEqual(sample['movement'], 2.0)
+
+        counts = tracker.counter.as_dict()
+        self.assertEqual((counts[REAL], counts[INTERPOLATED], counts[SIMULATED]), (1, 1, 1))
+        self.assertAlmostEqual(counts['real_ratio'], 1 / 3, places=3)
+
+    def test_unmarked_samples_are_real(self):
+        """测试未标记来源的旧数据视为真实数据"""
+        self.assertTrue(is_real({'heart_rate': 60}))
+        self.assertFalse(is_real({'heart_rate': 60, 'provenance': SIMULATED}))
+
+        counter = ProvenanceCounter()
+        counter.record({'heart_rate': 60})
+        self.assertEqual(counter.as_dict()[REAL], 1)
+
+    def test_hardware_sensor_marks_partial_data(self):
+        """测试硬件传感器部分字段缺失时不再静默使用随机值"""
+        sensor = HardwareSensor(self.config)
+        responses = {
+            sensor.endpoints['heart_rate']: {'heart_rate': 64},
+            sensor.endpoints['movement']: None
+        }
+        sensor._make_api_request = lambda endpoint, method='GET', data=None: responses[endpoint]
+
+        sample = sensor.get_sensor_data()
+        self.assertEqual(sample['heart_rate'], 64)
+        self.assertEqual(sample['provenance'], SIMULATED)
+        self.assertIsNone(sample['battery_level'])
+        self.assertEqual(sensor.get_device_info()['provenance'][SIMULATED], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
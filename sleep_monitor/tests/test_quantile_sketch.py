@@ -0,0 +1,58 @@
+"""
+分位数草图测试模块
+"""
+import json
+import unittest
+
+import numpy as np
+
+from sleep_monitor.utils.quantile_sketch import KLLSketch
+
+
+class TestKLLSketch(unittest.TestCase):
+    """KLL分位数草图测试类"""
+
+    def setUp(self):
+        """测试初始化"""
+        self.values = np.random.default_rng(42).gamma(4.0, 15.0, 50000)
+
+    def _assert_rank_error(self, sketch, tolerance=0.02):
+        for q in (0.05, 0.25, 0.5, 0.75, 0.95):
+            estimate = sketch.quantile(q)
+            self.assertLessEqual(abs(np.mean(self.values <= estimate) - q), tolerance)
+
+    def test_bounded_size(self):
+        """测试草图大小有上限，分位数的秩误差在草图精度内"""
+        sketch = KLLSketch(seed=1)
+        sketch.update_many(self.values)
+
+        self.assertEqual(sketch.count, 50000)
+        self.assertLess(sum(len(items) for items in sketch.levels), 3 * sketch.k + 64)
+        self.assertEqual(sketch.minimum, self.values.min())
+        self.assertEqual(sketch.quantile(1), self.values.max())
+        self._assert_rank_error(sketch)
+
+    def test_merge_serialized(self):
+        """测试序列化后合并多个草图，结果与整体的分布一致"""
+        merged = KLLSketch(seed=2)
+        for i, part in enumerate(np.array_split(self.values, 40)):
+            sketch = KLLSketch(seed=i)
+            sketch.update_many(part)
+            merged.merge(KLLSketch.from_dict(json.loads(json.dumps(sketch.to_dict()))))
+
+        self.assertEqual(merged.count, 50000)
+        self._assert_rank_error(merged)
+        self.assertAlmostEqual(merged.rank(np.median(self.values)), 0.5, delta=0.02)
+
+    def test_empty_and_gaps(self):
+        """测试空草图和缺失值"""
+        sketch = KLLSketch()
+        self.assertIsNone(sketch.quantile(0.5))
+        sketch.update_many([None, float('nan'), 60, 62])
+        sketch.merge(KLLSketch())
+        self.assertEqual(sketch.count, 2)
+        self.assertEqual(sketch.quantiles([0, 0.5, 1]), [60.0, 60.0, 62.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
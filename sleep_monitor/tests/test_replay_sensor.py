@@ -0,0 +1,128 @@
+"""
+回放传感器测试模块
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from sleep_monitor.sensors.replay_sensor import ReplaySensor
+from sleep_monitor.utils.data_logger import DataLogger
+
+
+class TestReplaySensor(unittest.TestCase):
+    """回放传感器测试类"""
+
+    def setUp(self):
+        """测试初始化"""
+        self.config = {
+            'sleep_detection': {
+                'sampling_rate': 60,
+                'deep_sleep_hr_threshold': 60,
+                'light_sleep_hr_threshold': 70,
+                'movement_threshold': 5
+            }
+        }
+        self.data_dir = tempfile.mkdtemp()
+        self.samples = [
+            {
+                'timestamp': f'2023-01-01T02:{i:02d}:00',
+                'heart_rate': 60 + i,
+                'movement': round(i * 0.5, 2),
+                'sleep_stage': 'light_sleep'
+            }
+            for i in range(10)
+        ]
+        self.logger = DataLogger(self.data_dir)
+
+    def tearDown(self):
+        """清理临时目录"""
+        shutil.rmtree(self.data_dir)
+
+    def test_replay_json(self):
+        """测试回放JSON格式数据"""
+        self.logger.export_to_json(self.samples, 'night.json')
+        sensor = ReplaySensor(self.config, os.path.join(self.data_dir, 'night.json'))
+
+        replayed = list(sensor)
+        self.assertEqual(len(replayed), 10)
+        self.assertEqual(replayed[3]['heart_rate'], 63)
+        self.assertEqual(replayed[3]['timestamp'], '2023-01-01T02:03:00')
+        self.assertIsNone(sensor.get_sensor_data())
+        self.assertFalse(sensor.get_device_info()['connected'])
+
+    def test_replay_csv(self):
+        """测试回放CSV格式数据"""
+        self.logger.log_sleep_data_csv(self.samples, 'night.csv')
+        sensor = ReplaySensor(self.config, os.path.join(self.data_dir, 'night.csv'))
+
+        data = sensor.get_sensor_data()
+        self.assertEqual(data['heart_rate'], 60)
+        self.assertIsInstance(data['movement'], float)
+
+    def test_replay_json_lines(self):
+        """测试回放JSON Lines格式数据"""
+        path = os.path.join(self.data_dir, 'night.jsonl')
+        with open(path, 'w', encoding='utf-8') as f:
+            for sample in self.samples:
+                f.write(json.dumps(sample) + '\n')
+
+        sensor = ReplaySensor(self.config, path)
+        self.assertEqual(len(list(sensor)), 10)
+
+    def test_seek(self):
+        """测试按序号和时间定位"""
+        sensor = ReplaySensor(self.config, self.samples)
+
+        self.assertTrue(sensor.seek(4))
+        self.assertEqual(sensor.get_sensor_data()['heart_rate'], 64)
+
+        self.assertTrue(sensor.seek('2023-01-01T02:07:30'))
+        self.assertEqual(sensor.get_sensor_data()['heart_rate'], 68)
+
+        self.assertFalse(sensor.seek('2023-01-01T03:00:00'))
+
+    def test_seek_skips_records_without_time(self):
+        """测试按时间定位时跳过没有时间字段的记录"""
+        samples = [{'heart_rate': 50, 'movement': 0.0}] + self.samples
+        sensor = ReplaySensor(self.config, samples)
+
+        self.assertTrue(sensor.seek('2023-01-01T02:02:00'))
+        self.assertEqual(sensor.get_sensor_data()['heart_rate'], 62)
+
+    def test_one_shot_iterable(self):
+        """测试生成器只能顺序回放一遍，循环回放或读取后定位时报错"""
+        with self.assertRaises(ValueError):
+            ReplaySensor(self.config, iter(self.samples), loop=True)
+
+        sensor = ReplaySensor(self.config, (sample for sample in self.samples))
+        self.assertTrue(sensor.seek(2))
+        self.assertEqual(sensor.get_sensor_data()['heart_rate'], 62)
+        with self.assertRaises(ValueError):
+            sensor.seek(0)
+        with self.assertRaises(ValueError):
+            sensor.rewind()
+
+        # 列表可以重复回放
+        sensor = ReplaySensor(self.config, self.samples, loop=True)
+        self.assertEqual(len([sensor.get_sensor_data() for _ in range(15)]), 15)
+        self.assertTrue(sensor.seek(1))
+
+    def test_speed_multiplier(self):
+        """测试倍速回放"""
+        # 10分钟的数据以6000倍速回放，约0.1秒完成
+        sensor = ReplaySensor(self.config, self.samples, speed=6000)
+
+        start = time.monotonic()
+        replayed = list(sensor)
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(len(replayed), 10)
+        self.assertGreaterEqual(elapsed, 0.08)
+        self.assertLess(elapsed, 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
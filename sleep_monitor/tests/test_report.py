@@ -0,0 +1,92 @@
+"""
+每晚睡眠报告测试模块
+"""
+import os
+import tempfile
+import unittest
+
+from sleep_monitor.sleep_analysis.report import build_report, get_report, generate_pending_reports, REPORT_VERSION
+from sleep_monitor.utils import history_store
+from sleep_monitor.utils.history_store import HistoryStore
+
+START_TS = 1700000000000
+MINUTE = 60000
+
+
+def make_night():
+    """清醒10分钟后入睡，两个睡眠周期，中间清醒5分钟，最后清醒10分钟"""
+    stages = (['awake'] * 10 + ['light_sleep'] * 30 + ['deep_sleep'] * 30 + ['rem_sleep'] * 20 +
+              ['awake'] * 5 + ['light_sleep'] * 30 + ['rem_sleep'] * 15 + ['awake'] * 10)
+    return {
+        'ts': [START_TS + i * MINUTE for i in range(len(stages))],
+        'heart_rate': [70 if stage == 'awake' else 55 + i % 3 for i, stage in enumerate(stages)],
+        'sleep_stage': stages
+    }
+
+
+class TestSleepReport(unittest.TestCase):
+    """每晚睡眠报告测试类"""
+
+    def test_metrics(self):
+        """测试入睡潜伏期、总睡眠时间、效率、WASO、觉醒次数和周期数"""
+        report = build_report(make_night())
+
+        self.assertEqual(report['time_in_bed_minutes'], 150.0)
+        self.assertEqual(report['sleep_onset_latency_minutes'], 10.0)
+        self.assertEqual(report['total_sleep_minutes'], 125.0)
+        self.assertEqual(report['sleep_efficiency'], 83.3)
+        self.assertEqual(report['waso_minutes'], 5.0)
+        self.assertEqual(report['awakenings'], 1)
+        self.assertEqual(report['sleep_cycles'], 2)
+        self.assertEqual(report['final_wake'], START_TS + 140 * MINUTE)
+        self.assertEqual(report['stage_minutes'], {
+            'awake': 25.0, 'light_sleep': 60.0, 'deep_sleep': 30.0, 'rem_sleep': 35.0})
+        self.assertEqual(report['min_sleep_heart_rate'], 55.0)
+
+    def test_gaps_and_empty(self):
+        """测试数据缺口不计入睡眠时间，没有样本或没有睡眠时返回空报告"""
+        night = make_night()
+        for column in night.values():
+            del column[50:80]  # 深睡中间缺少30分钟
+        report = build_report(night)
+        self.assertEqual(report['total_sleep_minutes'], 95.0)
+
+        self.assertEqual(build_report({'ts': [], 'sleep_stage': []})['total_records'], 0)
+        awake = build_report({'ts': [0, MINUTE], 'sleep_stage': ['awake', 'awake']})
+        self.assertIsNone(awake['sleep_onset'])
+        self.assertEqual(awake['time_in_bed_minutes'], 2.0)
+
+    def test_stored_reports(self):
+        """测试报告生成后保存，重新导入该晚后重新生成"""
+        from sleep_monitor.api.sleep_api import app
+
+        night = make_night()
+        samples = [dict(zip(night, values)) for values in zip(*night.values())]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = HistoryStore(os.path.join(temp_dir, 'history.sqlite3'))
+            store.import_samples(samples, 'band-1', night='20231114')
+            store.import_samples(samples[:100], 'band-2', night='20231114')
+
+            self.assertEqual(generate_pending_reports(store), 2)
+            self.assertEqual(generate_pending_reports(store), 0)
+            self.assertEqual(store.get_report('band-1', '20231114')['version'], REPORT_VERSION)
+
+            store.import_samples(samples[:40], 'band-1', night='20231114')
+            self.assertIsNone(store.get_report('band-1', '20231114'))
+            self.assertEqual(get_report(store, 'band-1')['total_records'], 40)
+
+            saved = history_store._default_store
+            history_store._default_store = store
+            try:
+                response = app.test_client().get('/api/report?device_id=band-2&night=20231114')
+                missing = app.test_client().get('/api/report?device_id=band-3')
+            finally:
+                history_store._default_store = saved
+                store.close()
+
+        self.assertEqual(response.get_json()['total_records'], 100)
+        self.assertEqual(missing.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
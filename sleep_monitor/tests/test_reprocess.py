@@ -0,0 +1,130 @@
+"""
+批量重处理工具测试模块
+"""
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from sleep_monitor.reprocess import find_nights, process_night, reprocess, MANIFEST_NAME
+from sleep_monitor.sensors.sensor_simulator import SensorSimulator
+from sleep_monitor.utils.data_logger import DataLogger
+from sleep_monitor.utils.history_store import HistoryStore
+
+
+class TestReprocess(unittest.TestCase):
+    """批量重处理工具测试类"""
+
+    def setUp(self):
+        """测试初始化"""
+        self.config = {
+            'sleep_detection': {
+                'sampling_rate': 60,
+                'deep_sleep_hr_threshold': 60,
+                'light_sleep_hr_threshold': 70,
+                'movement_threshold': 5
+            },
+            'alarm_settings': {
+                'wake_time': '07:00',
+                'alarm_window': 30,
+                'alarm_duration': 5
+            }
+        }
+        self.data_dir = tempfile.mkdtemp()
+        self.output_dir = os.path.join(self.data_dir, 'out')
+
+        simulator = SensorSimulator(self.config)
+        logger = DataLogger(self.data_dir)
+        for day, seed in (('20230101', 1), ('20230102', 2), ('20230103', 3)):
+            night = simulator.generate_night(60, seed=seed)
+            logger.export_to_json(list(SensorSimulator.iter_night_samples(night)), f'sleep_data_{day}.json')
+
+    def tearDown(self):
+        """清理临时目录"""
+        shutil.rmtree(self.data_dir)
+
+    def test_find_nights_date_range(self):
+        """测试按日期范围查找数据"""
+        nights = find_nights(self.data_dir, '20230102', '20230103')
+        self.assertEqual(list(nights), ['20230102', '20230103'])
+
+    def test_reprocess_and_resume(self):
+        """测试并行处理和断点续跑"""
+        manifest = reprocess(self.data_dir, self.output_dir, self.config, workers=2)
+
+        self.assertEqual(len(manifest['nights']), 3)
+        entry = manifest['nights']['20230101']
+        self.assertEqual(entry['status'], 'done')
+        self.assertEqual(entry['records'], 60)
+
+        with open(os.path.join(self.output_dir, entry['result']), 'r', encoding='utf-8') as f:
+            result = json.load(f)
+        self.assertEqual(result['summary']['total_records'], 60)
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, MANIFEST_NAME)))
+
+        # 再次运行时已处理的夜晚应被跳过
+        processed_at = entry['processed_at']
+        manifest = reprocess(self.data_dir, self.output_dir, self.config, workers=2)
+        self.assertEqual(manifest['nights']['20230101']['processed_at'], processed_at)
+
+        # 配置变化后需要重新处理
+        self.config['sleep_detection']['movement_threshold'] = 4
+        manifest = reprocess(self.data_dir, self.output_dir, self.config, workers=2)
+        self.assertNotEqual(manifest['nights']['20230101']['processed_at'], processed_at)
+
+    def test_replay_speed_ignored(self):
+        """测试批量处理不受实时回放倍速配置影响，不等待样本时间"""
+        self.config['device_settings'] = {'replay_speed': 1}
+        os.makedirs(self.output_dir)
+        with mock.patch('sleep_monitor.sensors.replay_sensor.time.sleep', side_effect=AssertionError('等待了样本时间')):
+            entry = process_night('20230101', os.path.join(self.data_dir, 'sleep_data_20230101.json'),
+                                  self.output_dir, self.config)
+        self.assertEqual(entry['records'], 60)
+
+    def test_resampling_before_detection(self):
+        """测试配置了重采样时整晚先重采样再检测，重采样配置变化后重新处理"""
+        self.config['resampling'] = {'enabled': True, 'interval': 300}
+        manifest = reprocess(self.data_dir, self.output_dir, self.config, workers=1)
+        entry = manifest['nights']['20230101']
+        self.assertEqual(entry['records'], 12)
+
+        with open(os.path.join(self.output_dir, entry['stages']), 'r', encoding='utf-8') as f:
+            stages = [json.loads(line) for line in f]
+        self.assertEqual(stages[1]['timestamp'][11:19], '23:05:00')
+
+        self.config['resampling'] = {'enabled': True, 'interval': 600}
+        manifest = reprocess(self.data_dir, self.output_dir, self.config, workers=1)
+        self.assertEqual(manifest['nights']['20230101']['records'], 6)
+
+    def test_history_backfill_and_import_errors(self):
+        """测试已处理的夜晚可以补充导入历史数据库，导入失败的夜晚标记为失败而不中断其他夜晚"""
+        reprocess(self.data_dir, self.output_dir, self.config, workers=2)
+        history = HistoryStore(os.path.join(self.data_dir, 'history.sqlite3'))
+        try:
+            original = history.import_file
+
+            def failing_import(path, device_id, night):
+                if night == '20230102':
+                    raise ValueError('损坏的数据')
+                return original(path, device_id, night)
+
+            with mock.patch.object(history, 'import_file', side_effect=failing_import):
+                manifest = reprocess(self.data_dir, self.output_dir, self.config, workers=2, history=history)
+            self.assertEqual(manifest['nights']['20230101']['status'], 'done')
+            self.assertEqual(manifest['nights']['20230102']['status'], 'failed')
+            self.assertIn('损坏的数据', manifest['nights']['20230102']['error'])
+            self.assertIsNotNone(history.get_night('default', '20230103'))
+            self.assertIsNone(history.get_night('default', '20230102'))
+
+            # 再次运行时失败的夜晚重新处理并导入
+            manifest = reprocess(self.data_dir, self.output_dir, self.config, workers=2, history=history)
+            self.assertEqual(manifest['nights']['20230102']['status'], 'done')
+            self.assertEqual(history.get_night('default', '20230102')['summary']['total_records'], 60)
+        finally:
+            history.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
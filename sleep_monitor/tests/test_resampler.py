@@ -0,0 +1,119 @@
+"""
+重采样测试模块
+"""
+import math
+import random
+import unittest
+from datetime import datetime
+
+from sleep_monitor.sleep_analysis.resampler import StreamingResampler, resample_samples
+from sleep_monitor.utils.time_utils import iter_time_range, to_epoch_ms
+
+
+class TestResampler(unittest.TestCase):
+    """重采样器测试类"""
+
+    def setUp(self):
+        """测试初始化"""
+        self.config = {
+            'sleep_detection': {'sampling_rate': 60},
+            'resampling': {
+                'interval': 60,
+                'aggregation': {'heart_rate': 'mean', 'movement': 'max', 'battery_level': 'median'}
+            }
+        }
+        self.start = to_epoch_ms(datetime(2023, 1, 1, 23, 0, 0))
+
+    def _sample(self, seconds, heart_rate, movement=1.0):
+        return {'ts': self.start + int(seconds * 1000), 'heart_rate': heart_rate,
+                'movement': movement, 'battery_level': 80}
+
+    def test_buckets_and_gaps(self):
+        """测试分桶聚合，缺口桶被明确标记"""
+        resampler = StreamingResampler(self.config)
+        completed = []
+        for sample in (self._sample(5, 60, 1), self._sample(40, 70, 3), self._sample(200, 65, 2)):
+            completed += resampler.add(sample)
+
+        self.assertEqual([bucket['count'] for bucket in completed], [2, 0, 0])
+        self.assertEqual(completed[0]['heart_rate'], 65)
+        self.assertEqual(completed[0]['movement'], 3)
+        self.assertTrue(completed[1]['gap'])
+        self.assertIsNone(completed[1]['heart_rate'])
+        self.assertEqual(completed[2]['ts'] - completed[1]['ts'], 60000)
+
+        self.assertEqual(resampler.add(self._sample(10, 90)), [])
+        self.assertEqual(resampler.late_samples, 1)
+
+        last = resampler.flush()
+        self.assertEqual(len(last), 1)
+        self.assertEqual(last[0]['heart_rate'], 65)
+
+    def test_missing_values(self):
+        """测试缺失的字段不参与聚合"""
+        resampler = StreamingResampler(self.config)
+        resampler.add(self._sample(1, None))
+        bucket = resampler.flush()[0]
+
+        self.assertEqual(bucket['count'], 1)
+        self.assertFalse(bucket['gap'])
+        self.assertIsNone(bucket['heart_rate'])
+
+    def test_vectorized_matches_streaming(self):
+        """测试向量化重采样与实时重采样结果一致"""
+        rng = random.Random(5)
+        samples = []
+        seconds = 0
+        for _ in range(500):
+            seconds += rng.choice([1, 7, 13, 45, 300])
+            samples.append(self._sample(seconds, rng.choice([None, rng.randint(50, 80)]), rng.uniform(0, 5)))
+
+        resampler = StreamingResampler(self.config)
+        streamed = []
+        for sample in samples:
+            streamed += resampler.add(sample)
+        streamed += resampler.flush()
+
+        result = resample_samples(samples, self.config)
+        self.assertEqual(result['ts'].tolist(), [bucket['ts'] for bucket in streamed])
+        self.assertEqual(result['count'].tolist(), [bucket['count'] for bucket in streamed])
+        for field in ('heart_rate', 'movement', 'battery_level'):
+            for value, bucket in zip(result[field].tolist(), streamed):
+                if bucket[field] is None:
+                    self.assertTrue(math.isnan(value))
+                else:
+                    self.assertAlmostEqual(value, bucket[field])
+
+    def test_first_last_use_time_order(self):
+        """测试乱序输入时first/last按样本时间取值，与输入顺序无关"""
+        config = dict(self.config, resampling={'interval': 60, 'aggregation': {'heart_rate': 'first',
+                                                                                'movement': 'last'}})
+        samples = [self._sample(50, 70, 3), self._sample(70, 80, 4), self._sample(10, 60, 1), self._sample(30, 65, 2)]
+        result = resample_samples(samples, config)
+
+        self.assertEqual(result['count'].tolist(), [3, 1])
+        self.assertEqual(result['heart_rate'].tolist(), [60, 80])
+        self.assertEqual(result['movement'].tolist(), [3, 4])
+
+    def test_time_range_grid(self):
+        """测试使用惰性时间范围作为网格"""
+        grid = iter_time_range(datetime(2023, 1, 1, 22, 58), datetime(2023, 1, 1, 23, 5))
+        result = resample_samples([self._sample(30, 60)], self.config, start=grid)
+
+        self.assertEqual(len(result['ts']), len(grid))
+        self.assertEqual(result['gap'].tolist(), [True, True, False] + [True] * 5)
+
+    def test_unaligned_time_range_grid(self):
+        """测试不在整分钟的网格不会被对齐，结果与网格一一对应"""
+        grid = iter_time_range(datetime(2023, 1, 1, 23, 0, 30), datetime(2023, 1, 1, 23, 5, 30))
+        samples = [self._sample(10, 50), self._sample(30, 60), self._sample(80, 70), self._sample(89, 80),
+                   self._sample(400, 90)]
+        result = resample_samples(samples, self.config, start=grid)
+
+        self.assertEqual(result['ts'].tolist(), [to_epoch_ms(moment) for moment in grid])
+        self.assertEqual(result['count'].tolist(), [3, 0, 0, 0, 0, 0])
+        self.assertEqual(result['heart_rate'][0], 70)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+"""
+最新样本缓存测试模块
+"""
+import threading
+import time
+import unittest
+
+from sleep_monitor.sensors.sample_cache import SampleCache
+
+
+class SlowSensor:
+    """读取较慢的传感器，记录读取次数"""
+
+    def __init__(self, delay=0.05, error=None):
+        self.delay = delay
+        self.error = error
+        self.reads = 0
+
+    def get_sensor_data(self):
+        self.reads += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return {'heart_rate': 60 + self.reads, 'movement': 1.0}
+
+
+class TestSampleCache(unittest.TestCase):
+    """最新样本缓存测试类"""
+
+    def _run_concurrently(self, cache, count=8):
+        results = []
+        errors = []
+        barrier = threading.Barrier(count)
+
+        def worker():
+            barrier.wait()
+            try:
+                results.append(cache.get())
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def test_single_flight(self):
+        """测试并发请求只读取一次传感器"""
+        sensor = SlowSensor()
+        cache = SampleCache(sensor, ttl=0)
+
+        results, errors = self._run_concurrently(cache)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sensor.reads, 1)
+        self.assertEqual(len({id(entry) for entry in results}), 1)
+        self.assertEqual(cache.stats['miss'], 1)
+        self.assertEqual(cache.stats['coalesced'], 7)
+
+    def test_error_shared(self):
+        """测试读取失败时等待的请求收到同一个异常，之后重新读取"""
+        sensor = SlowSensor(error=OSError('设备断开'))
+        cache = SampleCache(sensor, ttl=10)
+
+        results, errors = self._run_concurrently(cache, count=4)
+
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), 4)
+        self.assertEqual(sensor.reads, 1)
+
+        sensor.error = None
+        self.assertEqual(cache.get().sample['heart_rate'], 62)
+
+    def test_ttl(self):
+        """测试有效时间内直接返回缓存，过期后重新读取"""
+        now = [100.0]
+        sensor = SlowSensor(delay=0)
+        cache = SampleCache(sensor, ttl=1.0, clock=lambda: now[0])
+
+        first = cache.get()
+        now[0] += 0.5
+        self.assertIs(cache.get(), first)
+        self.assertEqual(cache.stats['hit'], 1)
+
+        now[0] += 1.0
+        second = cache.get()
+        self.assertEqual(second.sequence, first.sequence + 1)
+        self.assertEqual(sensor.reads, 2)
+
+        self.assertIs(cache.get(max_age=5), second)
+        cache.invalidate()
+        self.assertEqual(cache.get().sequence, 3)
+
+    def test_api_shares_reads(self):
+        """测试心率、体动和睡眠数据接口共享同一次读取"""
+        from sleep_monitor.api import sleep_api
+        from sleep_monitor.sensors.sensor_simulator import SensorSimulator
+        from sleep_monitor.sleep_analysis.sleep_stage_detector import SleepStageDetector
+        from sleep_monitor.utils.config_service import DEFAULT_CONFIG
+
+        config = DEFAULT_CONFIG
+        saved = (sleep_api.sensor, sleep_api.detector, sleep_api.sample_cache)
+        sensor = SensorSimulator(config)
+        reads = []
+        original = sensor.get_sensor_data
+
+        def counting_read():
+            reads.append(1)
+            return original()
+
+        sensor.get_sensor_data = counting_read
+        sleep_api.sensor = sensor
+        sleep_api.detector = SleepStageDetector(config)
+        try:
+            client = sleep_api.app.test_client()
+            sleep_api._latest_sample()
+            sleep_api.sample_cache.ttl = 60
+            heart_rate = client.get('/api/heart_rate').get_json()
+            movement = client.get('/api/movement').get_json()
+            client.get('/api/sleep_data')
+            client.get('/api/sleep_data')
+        finally:
+            sleep_api.sensor, sleep_api.detector, sleep_api.sample_cache = saved
+
+        self.assertEqual(len(reads), 1)
+        self.assertEqual(heart_rate['timestamp'], movement['timestamp'])
+
+    def test_api_without_sample(self):
+        """测试传感器没有数据（回放已结束）时接口返回503"""
+        from sleep_monitor.api import sleep_api
+        from sleep_monitor.sensors.replay_sensor import ReplaySensor
+        from sleep_monitor.sleep_analysis.sleep_stage_detector import SleepStageDetector
+        from sleep_monitor.utils.config_service import DEFAULT_CONFIG
+
+        saved = (sleep_api.sensor, sleep_api.detector, sleep_api.sample_cache)
+        sleep_api.sensor = ReplaySensor(DEFAULT_CONFIG, [{'ts': 1700000000000, 'heart_rate': 60, 'movement': 1.0}],
+                                        speed=0)
+        sleep_api.detector = SleepStageDetector(DEFAULT_CONFIG)
+        sleep_api.sample_cache = None
+        try:
+            client = sleep_api.app.test_client()
+            self.assertEqual(client.get('/api/heart_rate').status_code, 200)
+            sleep_api.sample_cache.ttl = 0
+            for path in ('/api/heart_rate', '/api/movement', '/api/sleep_data', '/api/sensor_data'):
+                response = client.get(path)
+                self.assertEqual(response.status_code, 503)
+                self.assertFalse(response.get_json()['success'])
+        finally:
+            sleep_api.sensor, sleep_api.detector, sleep_api.sample_cache = saved
+
+
+if __name__ == '__main__':
+    unittest.main()
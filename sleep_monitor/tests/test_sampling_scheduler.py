@@ -0,0 +1,71 @@
+"""
+自适应采样调度器测试模块
+"""
+import unittest
+from datetime import datetime, timedelta
+
+from sleep_monitor.sensors.sampling_scheduler import SamplingScheduler
+
+
+class TestSamplingScheduler(unittest.TestCase):
+    """自适应采样调度器测试类"""
+
+    def setUp(self):
+        """测试初始化"""
+        self.config = {
+            'sleep_detection': {
+                'sampling_rate': 60,
+                'deep_sleep_hr_threshold': 60,
+                'light_sleep_hr_threshold': 70,
+                'movement_threshold': 5
+            },
+            'device_settings': {
+                'max_battery_usage': 20,
+                'sample_battery_cost': 0.01
+            }
+        }
+        self.scheduler = SamplingScheduler(self.config)
+        self.start = datetime(2023, 1, 1, 23, 0, 0)
+
+    def _feed(self, stage, count, movement=1.0, in_wake_window=False):
+        """连续输入相同状态的样本，返回最后的采样间隔"""
+        interval = None
+        for _ in range(count):
+            interval = self.scheduler.next_interval(
+                {'movement': movement}, stage, self.start, in_wake_window)
+            self.start += timedelta(seconds=interval)
+        return interval
+
+    def test_stable_deep_sleep_slows_down(self):
+        """测试稳定深睡眠时降低采样频率"""
+        self.assertEqual(self._feed('deep_sleep', 1), self.scheduler.min_interval)
+        self.assertEqual(self._feed('deep_sleep', 10), self.scheduler.max_interval)
+        self.assertEqual(self.scheduler.reason, 'stable_deep_sleep')
+
+    def test_stage_change_and_movement_speed_up(self):
+        """测试睡眠阶段变化和体动较大时提高采样频率"""
+        self._feed('deep_sleep', 10)
+        self.assertEqual(self._feed('light_sleep', 1), self.scheduler.min_interval)
+        self._feed('light_sleep', 10)
+        self.assertEqual(self._feed('light_sleep', 1), self.scheduler.base_interval)
+        self.assertEqual(self._feed('light_sleep', 1, movement=10), self.scheduler.min_interval)
+
+    def test_wake_window_uses_fastest_rate(self):
+        """测试唤醒窗口内使用最高采样频率"""
+        self._feed('deep_sleep', 10)
+        self.assertEqual(self._feed('deep_sleep', 1, in_wake_window=True), self.scheduler.min_interval)
+        self.assertAlmostEqual(self.scheduler.effective_rate, 1.0 / self.scheduler.min_interval)
+
+    def test_battery_budget(self):
+        """测试电池预算不足时延长采样间隔"""
+        self.config['device_settings']['max_battery_usage'] = 1  # 整晚只允许约100次采样
+        scheduler = SamplingScheduler(self.config)
+
+        interval = scheduler.next_interval({'movement': 1.0}, 'light_sleep', self.start)
+        self.assertEqual(scheduler.reason, 'battery_budget')
+        self.assertGreater(interval, scheduler.base_interval)
+        self.assertLessEqual(interval, scheduler.max_interval)
+
+
+if __name__ == '__main__':
+    unittest.main()
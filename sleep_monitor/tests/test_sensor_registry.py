@@ -0,0 +1,80 @@
+"""
+传感器后端注册表测试模块
+"""
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+from sleep_monitor.sensors import registry
+from sleep_monitor.sensors.registry import create_sensor, register_sensor, resolve_sensor
+from sleep_monitor.sensors.sensor_simulator import SensorSimulator
+
+# 项目根目录（sleep_monitor包所在目录）
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 导入入口模块的时间预算（秒），正常情况下远小于该值
+IMPORT_BUDGET = 1.0
+
+# 使用模拟器时不应加载的模块
+HEAVY_MODULES = ('bluetooth', 'requests', 'flask', 'kivy', 'numpy',
+                 'sleep_monitor.sensors.bluetooth_sensor', 'sleep_monitor.sensors.hardware_sensor')
+
+IMPORT_PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import sleep_monitor.main
+import sleep_monitor.reprocess
+import sleep_monitor.sensors
+import sleep_monitor.sensors.acquisition_worker
+from sleep_monitor.sensors.registry import create_sensor
+sensor = create_sensor({'sleep_detection': {'sampling_rate': 60}, 'device_settings': {'sensor_type': 'simulator'}})
+elapsed = time.perf_counter() - started
+print(json.dumps({'elapsed': elapsed, 'loaded': [name for name in %r if name in sys.modules]}))
+''' % (HEAVY_MODULES,)
+
+
+class TestSensorRegistry(unittest.TestCase):
+    """传感器后端注册表测试类"""
+
+    def setUp(self):
+        """测试初始化"""
+        self.config = {'sleep_detection': {'sampling_rate': 60}, 'device_settings': {}}
+
+    def tearDown(self):
+        """移除测试注册的后端"""
+        registry.SENSORS.pop('fake', None)
+        registry._resolved.pop('fake', None)
+
+    def test_names_and_fallback(self):
+        """测试名称、别名和未知名称的回退"""
+        self.assertIs(resolve_sensor('simulation'), SensorSimulator)
+        self.assertIsInstance(create_sensor(self.config, 'simulator'), SensorSimulator)
+        self.assertIsInstance(create_sensor(self.config, 'no_such_sensor'), SensorSimulator)
+
+        self.config['device_settings']['sensor_type'] = 'simulation'
+        self.assertIsInstance(create_sensor(self.config), SensorSimulator)
+
+    def test_register_sensor(self):
+        """测试注册自定义后端和无法导入的后端"""
+        register_sensor('fake', lambda config: ('fake', config))
+        self.assertEqual(create_sensor(self.config, 'fake'), ('fake', self.config))
+
+        register_sensor('fake', '.no_such_module:Sensor')
+        with self.assertRaises(ImportError):
+            resolve_sensor('fake')
+        self.assertIsInstance(create_sensor(self.config, 'fake'), SensorSimulator)
+
+    def test_import_budget(self):
+        """测试入口模块在新进程中的导入时间，并且不加载蓝牙、HTTP和界面依赖"""
+        output = subprocess.run([sys.executable, '-c', IMPORT_PROBE], cwd=PROJECT_ROOT,
+                                capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+
+        self.assertEqual(result['loaded'], [])
+        self.assertLess(result['elapsed'], IMPORT_BUDGET)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+"""
+传感器模拟器测试模块
+"""
+import unittest
+
+import numpy as np
+
+from sleep_monitor.sensors.sensor_simulator import SensorSimulator, SLEEP_PHASES
+
+
+class TestSensorSimulator(unittest.TestCase):
+    """传感器模拟器测试类"""
+
+    def setUp(self):
+        """测试初始化"""
+        self.config = {
+            'sleep_detection': {
+                'sampling_rate': 60,
+                'deep_sleep_hr_threshold': 60,
+                'light_sleep_hr_threshold': 70,
+                'movement_threshold': 5
+            }
+        }
+        self.simulator = SensorSimulator(self.config)
+
+    def test_generate_night_reproducible(self):
+        """测试相同种子生成相同数据"""
+        first = self.simulator.generate_night(480, seed=42)
+        second = self.simulator.generate_night(480, seed=42)
+        other = self.simulator.generate_night(480, seed=43)
+
+        for key in ('timestamp', 'heart_rate', 'movement', 'sleep_phase'):
+            np.testing.assert_array_equal(first[key], second[key])
+        self.assertFalse(np.array_equal(first['heart_rate'], other['heart_rate']))
+
+    def test_generate_night_ranges(self):
+        """测试批量生成数据的范围和心率变化限制"""
+        night = self.simulator.generate_night(2000, seed=1)
+
+        self.assertEqual(night['heart_rate'].shape, (2000,))
+        self.assertTrue(np.all((night['heart_rate'] >= 40) & (night['heart_rate'] <= 120)))
+        self.assertTrue(np.all(night['movement'] >= 0))
+        # 相邻心率变化不超过5，加上两次±2的传感器噪声和取整误差
+        self.assertLessEqual(np.abs(np.diff(night['heart_rate'])).max(), 9.1)
+        self.assertEqual(np.diff(night['timestamp']).astype(int).max(), 60000)
+
+    def test_phase_schedule_matches_scalar(self):
+        """测试向量化的阶段计算与逐个计算一致"""
+        offsets = np.arange(1000) * 60
+        phases = self.simulator._phase_schedule(offsets)
+
+        for offset, phase in zip(offsets, phases):
+            self.simulator.current_time_offset = offset
+            self.simulator._update_sleep_phase()
+            self.assertEqual(self.simulator.sleep_phase, SLEEP_PHASES[phase])
+
+    def test_generate_cohort(self):
+        """测试批量生成多用户多晚数据"""
+        cohort = self.simulator.generate_cohort(3, 2, n_samples=100, seed=7)
+
+        self.assertEqual(cohort['heart_rate'].shape, (3, 2, 100))
+        self.assertEqual(cohort['timestamp'].shape, (3, 2, 100))
+        self.assertEqual(len(cohort['user_id']), 3)
+        np.testing.assert_array_equal(
+            cohort['heart_rate'],
+            self.simulator.generate_cohort(3, 2, n_samples=100, seed=7)['heart_rate'])
+
+    def test_iter_night_samples(self):
+        """测试批量数据转换为样本字典"""
+        night = self.simulator.generate_night(5, seed=3)
+        samples = list(SensorSimulator.iter_night_samples(night))
+
+        self.assertEqual(len(samples), 5)
+        self.assertEqual(samples[0]['timestamp'], '2023-01-01T23:00:00')
+        self.assertIn(samples[0]['sleep_phase'], SLEEP_PHASES)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -102,6 +102,47 @@ class TestSleepStageDetector(unittest.TestCase):
         self.assertIn('min_heart_rate', summary)
         self.assertIn('avg_movement', summary)
         self.assertGreaterEqual(summary['data_points'], 3)
+    
+    def test_time_based_windows(self):
+        """测试分析窗口按时间而不是数据点数定义"""
+        # 每秒一个样本，10分钟的历史窗口应保留600个样本，5分钟的趋势窗口保留300个
+        for i in range(900):
+            self.detector.detect_stage({
+                'timestamp': 1672531200 + i,
+                'heart_rate': 62,
+                'movement': 1
+            })
+        
+        self.assertEqual(len(self.detector.recent_data), 600)
+        self.assertEqual(self.detector.last_features.n_samples, 300)
+        self.assertTrue(self.detector.last_features.window_ready)
+    
+    def test_gap_expires_window(self):
+        """测试数据中断超过窗口长度后窗口被清空"""
+        for i in range(5):
+            self.detector.detect_stage({
+                'timestamp': f'2023-01-01T03:{i:02d}:00',
+                'heart_rate': 65,
+                'movement': 2
+            })
+        self.assertTrue(self.detector.last_features.window_ready)
+        
+        self.detector.detect_stage({
+            'timestamp': '2023-01-01T04:00:00',
+            'heart_rate': 65,
+            'movement': 2
+        })
+        self.assertEqual(len(self.detector.recent_data), 1)
+        self.assertFalse(self.detector.last_features.window_ready)
+        self.assertEqual(self.detector.last_features.hr_trend, 0)
+
+    def test_window_keeps_sample_time(self):
+        """测试只有ts字段的传感器样本在窗口中保留样本时间"""
+        self.detector.detect_stage({'ts': 1700000000000, 'heart_rate': 65, 'movement': 2})
+        self.detector.detect_stage({'timestamp': '2023-01-01T00:00:00Z', 'heart_rate': 65, 'movement': 2})
+        self.assertEqual([data['ts'] for data in self.detector.recent_data], [1700000000000])
+        self.detector.detect_stage({'ts': 1700000060000, 'heart_rate': 65, 'movement': 2})
+        self.assertEqual(self.detector.recent_data[-1]['ts'], 1700000060000)
 
 
 if __name__ == '__main__':
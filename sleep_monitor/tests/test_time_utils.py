@@ -0,0 +1,104 @@
+"""
+时间工具测试模块
+"""
+import unittest
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from sleep_monitor.utils.time_utils import (
+    iso_to_epoch_ms, to_epoch_ms, sample_epoch_ms, epoch_ms_to_iso, epoch_ms_to_datetime,
+    parse_timestamps, sample_epoch_ms_column, local_datetime64_to_epoch_ms, epoch_ms_to_local_datetime64,
+    get_time_range, iter_time_range, iter_sleep_cycle_times, time_range_array
+)
+
+
+class TestEpochTime(unittest.TestCase):
+    """epoch毫秒时间表示测试类"""
+
+    def test_iso_round_trip(self):
+        """测试ISO字符串与epoch毫秒互相转换"""
+        moment = datetime(2023, 1, 1, 23, 30, 15, 250000)
+        ms = iso_to_epoch_ms(moment.isoformat())
+
+        self.assertEqual(ms, int(moment.timestamp() * 1000))
+        self.assertEqual(epoch_ms_to_datetime(ms), moment)
+        self.assertEqual(epoch_ms_to_iso(ms), moment.isoformat())
+
+    def test_timezone_suffix(self):
+        """测试带时区的时间字符串"""
+        self.assertEqual(iso_to_epoch_ms('2023-01-01T00:00:00Z'), 1672531200000)
+        self.assertEqual(iso_to_epoch_ms('2023-01-01T08:00:00+08:00'), 1672531200000)
+        self.assertEqual(to_epoch_ms(datetime(2023, 1, 1, tzinfo=timezone.utc)), 1672531200000)
+
+    def test_sample_epoch_ms(self):
+        """测试样本时间优先使用ts字段"""
+        self.assertEqual(sample_epoch_ms({'ts': 5, 'timestamp': '2023-01-01T00:00:00Z'}), 5)
+        self.assertEqual(sample_epoch_ms({'timestamp': '2023-01-01T00:00:00Z'}), 1672531200000)
+        self.assertEqual(sample_epoch_ms({'timestamp': 1672531200}), 1672531200000)
+
+    def test_vectorized_conversion(self):
+        """测试整列转换与逐个转换结果一致"""
+        start = datetime(2023, 3, 1, 22, 0, 0)
+        moments = [start + timedelta(minutes=17 * i, milliseconds=3 * i) for i in range(500)]
+        expected = [iso_to_epoch_ms(m.isoformat()) for m in moments]
+
+        self.assertEqual(parse_timestamps([m.isoformat() for m in moments]).tolist(), expected)
+
+        wall = np.array([m.isoformat() for m in moments], dtype='datetime64[ms]')
+        self.assertEqual(parse_timestamps(wall).tolist(), expected)
+        self.assertEqual(local_datetime64_to_epoch_ms(wall).tolist(), expected)
+        self.assertTrue((epoch_ms_to_local_datetime64(np.array(expected)) == wall).all())
+
+    def test_vectorized_time_zones(self):
+        """测试整列解析带时区后缀、空格分隔和numpy不支持的格式，与逐个转换结果一致"""
+        column = ['2023-01-01T00:00:00Z', '2023-01-01T08:00:00+08:00', '2023-07-01T02:30:00.250-05:30',
+                  '2023-01-01 23:00:00', '2023-01-01T23:00:00.123456']
+        self.assertEqual(parse_timestamps(column).tolist(), [iso_to_epoch_ms(text) for text in column])
+        self.assertEqual(parse_timestamps(['20230101T000000']).tolist(), [iso_to_epoch_ms('20230101T000000')])
+        self.assertEqual(parse_timestamps([1672531200, 1672531200.5]).tolist(), [1672531200000, 1672531200500])
+
+        samples = [{'ts': 5}, {'timestamp': '2023-01-01T00:00:00Z'}, {'ts': 7, 'timestamp': 'x'}]
+        self.assertEqual(sample_epoch_ms_column(samples).tolist(), [5, 1672531200000, 7])
+        samples.append({'timestamp': 1672531200})
+        self.assertEqual(sample_epoch_ms_column(samples).tolist(), [sample_epoch_ms(s) for s in samples])
+
+
+class TestTimeRange(unittest.TestCase):
+    """惰性时间范围测试类"""
+
+    def setUp(self):
+        """测试初始化"""
+        self.start = datetime(2023, 1, 1, 22, 0, 0)
+        self.end = datetime(2023, 1, 2, 6, 0, 0)
+
+    def test_matches_list_version(self):
+        """测试惰性版本与列表版本结果一致"""
+        times = iter_time_range(self.start, self.end, 7)
+        expected = get_time_range(self.start, self.end, 7)
+
+        self.assertEqual(len(times), len(expected))
+        self.assertEqual(list(times), expected)
+        self.assertEqual(times[-1], expected[-1])
+        self.assertEqual(list(times[3:10:2]), expected[3:10:2])
+        self.assertEqual(list(times[::-1]), expected[::-1])
+        self.assertEqual(len(iter_time_range(self.end, self.start)), 0)
+
+    def test_sleep_cycles(self):
+        """测试睡眠周期时间点"""
+        cycles = iter_sleep_cycle_times(self.start.isoformat())
+        self.assertEqual(list(cycles), [self.start + timedelta(minutes=m) for m in range(0, 480, 90)])
+
+    def test_datetime64_arange(self):
+        """测试datetime64数组版本"""
+        times = time_range_array(self.start, self.end, 1)
+
+        self.assertEqual(times.dtype, np.dtype('datetime64[ms]'))
+        self.assertEqual(len(times), 8 * 60 + 1)
+        self.assertEqual(times[0], np.datetime64('2023-01-01T22:00:00'))
+        self.assertEqual(times[-1], np.datetime64('2023-01-02T06:00:00'))
+        self.assertEqual(iter_time_range(self.start, self.end).as_epoch_ms()[0], iso_to_epoch_ms(self.start.isoformat()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+睡眠趋势汇总测试模块
+"""
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from sleep_monitor.sleep_analysis.report import generate_report
+from sleep_monitor.sleep_analysis.trends import (FieldStats, SleepAggregate, aggregate_range, device_aggregate,
+                                                 period_key, period_range, query_trends)
+from sleep_monitor.utils import history_store
+from sleep_monitor.utils.history_store import HistoryStore
+
+
+def import_night(store, night, heart_rate, device_id='band-1'):
+    """导入一晚：10分钟清醒后睡眠50分钟，每分钟一个样本"""
+    start = datetime.strptime(night, '%Y%m%d') + timedelta(hours=23)
+    samples = [{
+        'timestamp': (start + timedelta(minutes=i)).isoformat(),
+        'heart_rate': heart_rate + i % 5,
+        'movement': 1.0,
+        'sleep_stage': 'awake' if i < 10 else 'light_sleep'
+    } for i in range(60)]
+    store.import_samples(samples, device_id, night=night)
+    generate_report(store, device_id, night)
+
+
+class TestTrends(unittest.TestCase):
+    """睡眠趋势汇总测试类"""
+
+    def setUp(self):
+        """测试初始化"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.store = HistoryStore(os.path.join(self.temp_dir.name, 'history.sqlite3'))
+
+    def tearDown(self):
+        """清理临时文件"""
+        self.store.close()
+        self.temp_dir.cleanup()
+
+    def test_periods(self):
+        """测试ISO周和月份的周期键与日期范围"""
+        self.assertEqual(period_key('20240101', 'week'), '2024-W01')
+        self.assertEqual(period_key('20241230', 'week'), '2025-W01')
+        self.assertEqual(period_range('20240214', 'month'), ('20240201', '20240229'))
+        self.assertEqual(period_range('20240103', 'week'), ('20240101', '20240107'))
+        with self.assertRaises(ValueError):
+            period_key('20240101', 'year')
+
+    def test_field_stats_merge(self):
+        """测试分批加入后合并的统计与一次计算相同，分位数的秩误差在草图精度内"""
+        values = np.random.default_rng(0).normal(60, 8, 5000)
+        merged = FieldStats()
+        for part in np.array_split(values, 7):
+            stats = FieldStats()
+            stats.add_values(part)
+            merged.merge(FieldStats.from_dict(stats.to_dict()))
+
+        summary = merged.summary()
+        self.assertEqual(summary['count'], 5000)
+        self.assertAlmostEqual(summary['mean'], values.mean(), places=1)
+        self.assertAlmostEqual(summary['std'], values.std(), places=1)
+        for q, key in ((0.05, 'p5'), (0.5, 'p50'), (0.95, 'p95')):
+            self.assertLessEqual(abs(np.mean(values <= summary[key]) - q), 0.03)
+
+    def test_rollups(self):
+        """测试报告生成后更新周和月汇总，同一晚重新导入不重复计算"""
+        for day, heart_rate in zip(range(1, 11), range(50, 60)):
+            import_night(self.store, f'202401{day:02d}', heart_rate)
+        import_night(self.store, '20240201', 70)
+        import_night(self.store, '20240103', 52)
+
+        weeks = query_trends(self.store, 'band-1', 'week')
+        self.assertEqual([(item['period'], item['nights']) for item in weeks],
+                         [('2024-W01', 7), ('2024-W02', 3), ('2024-W05', 1)])
+        self.assertEqual(weeks[0]['avg_total_sleep_minutes'], 50.0)
+        self.assertEqual(weeks[0]['avg_sleep_onset_latency_minutes'], 10.0)
+
+        months = query_trends(self.store, 'band-1', 'month', start='20240201')
+        self.assertEqual(len(months), 1)
+        self.assertEqual(months[0]['heart_rate']['min'], 70)
+        self.assertEqual(device_aggregate(self.store, 'band-1').nights, 11)
+
+        # 完整月份使用月汇总，部分月份合并各晚的汇总
+        aggregate = aggregate_range(self.store, 'band-1', '20240105', '20240229')
+        expected = SleepAggregate.merge_all(
+            SleepAggregate.from_dict(stats) for _, stats in self.store.get_night_stats('band-1', '20240105', '20240229'))
+        self.assertEqual(aggregate.nights, 7)
+        self.assertEqual(aggregate.summary(), expected.summary())
+
+        with self.assertRaises(ValueError):
+            aggregate_range(self.store, 'band-1', '20240301', '20240201')
+
+    def test_api(self):
+        """测试趋势接口"""
+        from sleep_monitor.api.sleep_api import app
+
+        import_night(self.store, '20240101', 55)
+        import_night(self.store, '20240108', 60)
+        saved = history_store._default_store
+        history_store._default_store = self.store
+        try:
+            client = app.test_client()
+            weeks = client.get('/api/trends?device_id=band-1').get_json()
+            summary = client.get('/api/trends/summary?device_id=band-1&start=20240101&end=20240131').get_json()
+            invalid = client.get('/api/trends?device_id=band-1&period=year')
+            quantiles = client.get('/api/quantiles?device_id=band-1&q=0,1').get_json()
+        finally:
+            history_store._default_store = saved
+
+        self.assertEqual(len(weeks['items']), 2)
+        self.assertEqual(summary['nights'], 2)
+        self.assertEqual(invalid.status_code, 400)
+        self.assertEqual(quantiles['heart_rate']['quantiles'], {'0.0': 55.0, '1.0': 64.0})
+        self.assertEqual(quantiles['sleep_heart_rate']['count'], 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
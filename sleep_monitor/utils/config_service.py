@@ -0,0 +1,337 @@
+"""
+配置服务
+
+统一加载、校验和分发配置：
+- 配置文件只在变化时解析一次，校验通过后生成不可修改的快照，各组件共享同一份快照
+- 通过轮询文件修改时间发现配置文件的变化，重新加载后通知订阅者
+  （检测器和闹钟通过apply_config就地更新阈值和唤醒设置，不需要重新创建，窗口数据保留）
+- 新配置校验失败时保留当前快照，并记录错误
+"""
+import json
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+# 默认配置，配置文件中缺少的部分使用这里的值
+DEFAULT_CONFIG = {
+    "sleep_detection": {
+        "sampling_rate": 60,  # 采样率（秒）
+        "deep_sleep_hr_threshold": 60,  # 深度睡眠心率阈值
+        "light_sleep_hr_threshold": 70,  # 浅度睡眠心率阈值
+        "movement_threshold": 5  # 体动阈值
+    },
+    "alarm_settings": {
+        "wake_time": "07:00",  # 默认唤醒时间
+        "alarm_window": 30,  # 唤醒时间窗口（分钟）
+        "alarm_duration": 5  # 闹钟持续时间（分钟）
+    },
+    "device_settings": {}
+}
+
+# 默认的配置文件位置：当前目录，其次是sleep_monitor目录
+DEFAULT_CONFIG_PATHS = (
+    'config.json',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.json')
+)
+
+WAKE_TIME_PATTERN = re.compile(r'^([01]?\d|2[0-3]):([0-5]\d)$')
+
+
+class FrozenDict(dict):
+    """不可修改的字典，可以直接序列化为JSON和pickle"""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("配置快照不可修改，请通过ConfigService.update修改配置")
+
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return self.__class__, (dict(self),)
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+    def __copy__(self):
+        return self
+
+
+def freeze(value):
+    """递归转换为不可修改的结构（字典 -> FrozenDict，列表 -> 元组）"""
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value):
+    """递归转换为可以修改的普通字典和列表（需要修改配置副本时使用）"""
+    if isinstance(value, dict):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
+
+
+def merge_config(base, changes):
+    """
+    深度合并配置，changes中的值覆盖base
+    :return: 新的普通字典
+    """
+    merged = thaw(base)
+    for key, value in changes.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_config(merged[key], value)
+        else:
+            merged[key] = thaw(value)
+    return merged
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate_config(config):
+    """
+    校验配置
+    :param config: 已与默认配置合并的配置
+    :raises ValueError: 配置无效
+    """
+    from ..sleep_analysis.anomaly import anomaly_settings
+    from ..sleep_analysis.classifiers import make_thresholds
+    from ..sleep_analysis.resampler import resampling_settings
+
+    if not isinstance(config, dict):
+        raise ValueError("配置必须是JSON对象")
+    for section in ('sleep_detection', 'alarm_settings', 'device_settings'):
+        if not isinstance(config.get(section), dict):
+            raise ValueError(f"配置项 {section} 必须是JSON对象")
+
+    sleep_detection = config['sleep_detection']
+    if not _is_number(sleep_detection.get('sampling_rate')) or sleep_detection['sampling_rate'] <= 0:
+        raise ValueError("sampling_rate 必须是大于0的数字")
+    make_thresholds(sleep_detection)
+    anomaly_settings(sleep_detection)
+    resampling_settings(config)
+
+    alarm_settings = config['alarm_settings']
+    if not isinstance(alarm_settings.get('wake_time'), str) or not WAKE_TIME_PATTERN.match(alarm_settings['wake_time']):
+        raise ValueError(f"wake_time 必须是HH:MM格式: {alarm_settings.get('wake_time')!r}")
+    if not _is_number(alarm_settings.get('alarm_window')) or alarm_settings['alarm_window'] < 0:
+        raise ValueError("alarm_window 必须是不小于0的数字")
+    if not _is_number(alarm_settings.get('alarm_duration')) or alarm_settings['alarm_duration'] <= 0:
+        raise ValueError("alarm_duration 必须是大于0的数字")
+
+
+def load_config_file(path, defaults=None):
+    """
+    读取并校验单个配置文件（不监视变化，命令行工具使用）
+    :param path: 配置文件路径
+    :param defaults: 默认配置，默认为DEFAULT_CONFIG
+    :return: 配置快照
+    :raises OSError: 文件无法读取
+    :raises ValueError: 文件不是有效的JSON或配置无效
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        file_config = json.load(f)
+    if not isinstance(file_config, dict):
+        raise ValueError("配置必须是JSON对象")
+    config = merge_config(defaults if defaults is not None else DEFAULT_CONFIG, file_config)
+    validate_config(config)
+    return freeze(config)
+
+
+class ConfigService:
+    """配置服务"""
+
+    def __init__(self, paths=None, defaults=None):
+        """
+        初始化配置服务并加载配置
+        :param paths: 依次查找的配置文件路径，默认为DEFAULT_CONFIG_PATHS
+        :param defaults: 默认配置，默认为DEFAULT_CONFIG
+        """
+        self.paths = tuple(paths) if paths is not None else DEFAULT_CONFIG_PATHS
+        self.defaults = defaults if defaults is not None else DEFAULT_CONFIG
+        self.path = None  # 实际使用的配置文件，没有配置文件时为None
+        self.version = 0  # 每次配置变化加1
+
+        self._snapshot = None
+        self._file_state = None  # (修改时间, 大小)，用于判断文件是否变化
+        self._subscribers = []
+        self._lock = threading.RLock()
+        self._watch_stop = threading.Event()
+        self._watch_thread = None
+
+        self.reload(force=True)
+        if self._snapshot is None:
+            # 配置文件无效时使用默认配置启动
+            self._set_snapshot(self._parse({}))
+
+    def get(self):
+        """当前的配置快照（不可修改）"""
+        return self._snapshot
+
+    snapshot = property(get)
+
+    def subscribe(self, callback):
+        """
+        订阅配置变化
+        :param callback: callback(snapshot)，配置变化后调用（可能在监视线程中调用）
+        :return: 取消订阅的函数
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+
+    def attach(self, component):
+        """
+        让组件跟随配置变化（组件需要提供apply_config(config)方法）
+        :return: 取消订阅的函数
+        """
+        return self.subscribe(component.apply_config)
+
+    def _find_file(self):
+        """查找第一个存在的配置文件"""
+        for path in self.paths:
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def _stat(self, path):
+        if path is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self, force=False):
+        """
+        配置文件变化时重新加载（只检查修改时间和大小，未变化时不读取文件）
+        :param force: 忽略文件状态，强制读取
+        :return: 配置是否发生了变化
+        """
+        with self._lock:
+            path = self._find_file()
+            state = self._stat(path)
+            if not force and path == self.path and state == self._file_state:
+                return False
+
+            self.path = path
+            self._file_state = state
+            try:
+                if path is None:
+                    if self._snapshot is None:
+                        logger.warning("配置文件 config.json 未找到，使用默认配置")
+                    snapshot = self._parse({})
+                else:
+                    snapshot = load_config_file(path, self.defaults)
+                    logger.info(f"成功加载配置文件: {path}")
+            except (OSError, ValueError) as e:
+                logger.error(f"配置文件 {path} 无效，保留当前配置: {e}")
+                return False
+            return self._replace(snapshot)
+
+    def update(self, changes, persist=False):
+        """
+        修改配置（深度合并），校验通过后通知订阅者
+        :param changes: 需要修改的部分，如 {'sleep_detection': {'deep_sleep_hr_threshold': 58}}
+        :param persist: 是否写回配置文件
+        :return: 配置是否发生了变化
+        :raises ValueError: 修改后的配置无效
+        """
+        with self._lock:
+            snapshot = self._parse(merge_config(self._snapshot, changes))
+            changed = self._replace(snapshot)
+            if persist:
+                self._write(snapshot)
+            return changed
+
+    def _parse(self, config):
+        """与默认配置合并并校验，返回快照"""
+        config = merge_config(self.defaults, config)
+        validate_config(config)
+        return freeze(config)
+
+    def _replace(self, snapshot):
+        """替换快照，配置不同时通知订阅者"""
+        if snapshot == self._snapshot:
+            return False
+        self._set_snapshot(snapshot)
+        if self.version > 1:
+            logger.info(f"配置已更新（版本 {self.version}）")
+        return True
+
+    def _set_snapshot(self, snapshot):
+        self._snapshot = snapshot
+        self.version += 1
+        for callback in list(self._subscribers):
+            try:
+                callback(snapshot)
+            except Exception as e:
+                logger.error(f"应用配置变化失败: {e}")
+
+    def _write(self, config):
+        """原子地写回配置文件"""
+        path = self.path or self.paths[0]
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(config, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+        self.path = path
+        self._file_state = self._stat(path)
+
+    def start_watching(self, interval=2.0):
+        """
+        启动后台线程，定期检查配置文件是否变化
+        :param interval: 检查间隔（秒）
+        """
+        if self._watch_thread is not None and self._watch_thread.is_alive():
+            return
+        self._watch_stop.clear()
+        self._watch_thread = threading.Thread(target=self._watch, args=(interval,),
+                                              name='config-watcher', daemon=True)
+        self._watch_thread.start()
+
+    def stop_watching(self, timeout=None):
+        """停止监视线程"""
+        self._watch_stop.set()
+        if self._watch_thread is not None:
+            self._watch_thread.join(timeout)
+        self._watch_thread = None
+
+    def _watch(self, interval):
+        while not self._watch_stop.wait(interval):
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"检查配置文件时出错: {e}")
+
+
+_default_service = None
+_default_lock = threading.Lock()
+
+
+def get_config_service():
+    """进程内共享的配置服务（使用默认的配置文件位置），第一次调用时加载"""
+    global _default_service
+    with _default_lock:
+        if _default_service is None:
+            _default_service = ConfigService()
+        return _default_service
+
+
+def load_config():
+    """当前配置的快照"""
+    return get_config_service().get()
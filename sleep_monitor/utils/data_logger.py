@@ -5,20 +5,41 @@
 """
 import json
 import csv
+import logging
 from datetime import datetime
 import os
+import time
 from typing import List, Dict, Optional
 
+from . import metrics
+from .time_utils import with_timestamp
+
+logger = logging.getLogger(__name__)
+
+_FLUSH_SECONDS = metrics.histogram('data_logger_flush_seconds', '写入一批睡眠数据的耗时（秒）', ('format',))
+_WRITTEN_BYTES = metrics.counter('data_logger_written_bytes_total', '写入磁盘的字节数', ('format',))
+_FLUSH_BYTES = metrics.histogram('data_logger_flush_bytes', '每批写入的字节数', ('format',),
+                                 buckets=metrics.BYTES_BUCKETS)
+
+
+def _record_flush(fmt, started, size):
+    """记录一次写入的耗时和字节数"""
+    _FLUSH_SECONDS.labels(fmt).observe(time.perf_counter() - started)
+    _WRITTEN_BYTES.labels(fmt).inc(size)
+    _FLUSH_BYTES.labels(fmt).observe(size)
+
 
 class DataLogger:
     """数据记录器"""
     
-    def __init__(self, data_dir="data"):
+    def __init__(self, data_dir="data", history=None):
         """
         初始化数据记录器
         :param data_dir: 数据存储目录
+        :param history: 历史数据存储（HistoryStore，可选），记录的数据同时写入，供历史查询接口使用
         """
         self.data_dir = data_dir
+        self.history = history
         self.ensure_data_dir()
     
     def ensure_data_dir(self):
@@ -32,6 +53,7 @@ class DataLogger:
         :param data: 睡眠数据
         :param filename: 文件名（可选，默认使用日期命名）
         """
+        started = time.perf_counter()
         if filename is None:
             date_str = datetime.now().strftime("%Y%m%d")
             filename = f"sleep_data_{date_str}.json"
@@ -47,12 +69,42 @@ class DataLogger:
             except (json.JSONDecodeError, FileNotFoundError):
                 existing_data = []
         
-        # 添加新数据
-        existing_data.append(data)
+        # 添加新数据（传感器样本只有ts字段，写入文件时补上ISO时间）
+        existing_data.append(with_timestamp(data))
         
         # 写入文件
         with open(filepath, 'w', encoding='utf-8') as f:
             json.dump(existing_data, f, ensure_ascii=False, indent=2)
+            size = f.tell()
+        _record_flush('json', started, size)
+        
+        if self.history is not None:
+            self.history.add_samples([data])
+    
+    def append_sleep_data(self, data_list: List[Dict], filename: Optional[str] = None):
+        """
+        以JSON Lines格式追加记录睡眠数据，只写入新数据，不读取已有文件
+        :param data_list: 睡眠数据列表
+        :param filename: 文件名（可选，默认使用日期命名）
+        """
+        if not data_list:
+            return
+        
+        if filename is None:
+            date_str = datetime.now().strftime("%Y%m%d")
+            filename = f"sleep_data_{date_str}.jsonl"
+        
+        started = time.perf_counter()
+        filepath = os.path.join(self.data_dir, filename)
+        
+        payload = ''.join(json.dumps(with_timestamp(data), ensure_ascii=False) + '\n'
+                          for data in data_list).encode('utf-8')
+        with open(filepath, 'ab') as f:
+            f.write(payload)
+        _record_flush('jsonl', started, len(payload))
+        
+        if self.history is not None:
+            self.history.add_samples(data_list)
     
     def log_sleep_data_csv(self, data_list: List[Dict], filename: Optional[str] = None):
         """
@@ -67,8 +119,10 @@ class DataLogger:
             date_str = datetime.now().strftime("%Y%m%d")
             filename = f"sleep_data_{date_str}.csv"
         
+        started = time.perf_counter()
         filepath = os.path.join(self.data_dir, filename)
         
+        data_list = [with_timestamp(data) for data in data_list]
         with open(filepath, 'w', newline='', encoding='utf-8') as csvfile:
             fieldnames = data_list[0].keys()
             writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
@@ -76,6 +130,8 @@ class DataLogger:
             writer.writeheader()
             for data in data_list:
                 writer.writerow(data)
+            size = csvfile.tell()
+        _record_flush('csv', started, size)
     
     def load_sleep_data(self, filename: Optional[str] = None):
         """
@@ -94,10 +150,27 @@ class DataLogger:
         
         try:
             with open(filepath, 'r', encoding='utf-8') as f:
+                if filename.endswith('.jsonl'):
+                    return self._load_lines(f, filename)
                 return json.load(f)
         except (json.JSONDecodeError, FileNotFoundError):
             return []
     
+    @staticmethod
+    def _load_lines(f, filename):
+        """
+        逐行解析JSON Lines文件，无法解析的行（如追加写入中断留下的不完整的最后一行）跳过并记录
+        """
+        records = []
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                logger.warning(f"跳过 {filename} 第{line_number}行无法解析的数据: {e}")
+        return records
+    
     def export_to_json(self, data: List[Dict], filename: str):
         """
         导出数据到JSON文件
@@ -118,8 +191,9 @@ class DataLogger:
         if date_str is None:
             date_str = datetime.now().strftime("%Y%m%d")
         
-        filename = f"sleep_data_{date_str}.json"
-        data = self.load_sleep_data(filename)
+        # 合并逐条记录的JSON文件和追加写入的JSON Lines文件
+        data = self.load_sleep_data(f"sleep_data_{date_str}.json")
+        data += self.load_sleep_data(f"sleep_data_{date_str}.jsonl")
         
         if not data:
             return {}
@@ -0,0 +1,109 @@
+"""
+进程内事件总线
+
+发布者（如异常检测）把事件发布到总线，订阅者（如API的推送连接）各自有一个有界队列：
+- 发布不阻塞：队列满时丢弃最旧的事件并计数，慢的订阅者不影响检测线程和其他订阅者
+- 订阅者列表在订阅和取消订阅时整体替换，发布时不需要加锁
+"""
+import threading
+from collections import deque
+
+from . import metrics
+
+# 每个订阅者最多缓存的事件数
+DEFAULT_QUEUE_SIZE = 256
+
+_DROPPED = metrics.counter('event_bus_dropped_total', '订阅者队列已满而丢弃的事件数')
+
+
+class Subscription:
+    """一个订阅者的事件队列"""
+
+    def __init__(self, bus, maxsize=DEFAULT_QUEUE_SIZE, predicate=None):
+        """
+        :param bus: 所属的EventBus
+        :param maxsize: 队列长度
+        :param predicate: 事件过滤函数，predicate(event)为真的事件才进入队列
+        """
+        self.bus = bus
+        self.predicate = predicate
+        self.dropped = 0
+        self.closed = False
+        self._queue = deque(maxlen=maxsize)
+        self._condition = threading.Condition()
+
+    def offer(self, event):
+        """加入一个事件（发布时调用，不阻塞）"""
+        if self.predicate is not None and not self.predicate(event):
+            return
+        with self._condition:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+                _DROPPED.inc()
+            self._queue.append(event)
+            self._condition.notify()
+
+    def get(self, timeout=None):
+        """
+        取出一个事件
+        :param timeout: 最长等待时间（秒），None时一直等待
+        :return: 事件，超时或已取消订阅时返回None
+        """
+        with self._condition:
+            if not self._queue and not self.closed:
+                self._condition.wait(timeout)
+            return self._queue.popleft() if self._queue else None
+
+    def close(self):
+        """取消订阅，正在等待的get立即返回"""
+        self.bus.unsubscribe(self)
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+    def __len__(self):
+        return len(self._queue)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class EventBus:
+    """进程内事件总线"""
+
+    def __init__(self):
+        self._subscribers = ()
+        self._lock = threading.Lock()
+
+    def subscribe(self, maxsize=DEFAULT_QUEUE_SIZE, predicate=None):
+        """
+        订阅事件
+        :param maxsize: 队列长度
+        :param predicate: 事件过滤函数
+        :return: Subscription（用完后调用close或使用with语句）
+        """
+        subscription = Subscription(self, maxsize, predicate)
+        with self._lock:
+            self._subscribers = self._subscribers + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """取消订阅"""
+        with self._lock:
+            self._subscribers = tuple(item for item in self._subscribers if item is not subscription)
+
+    def publish(self, event):
+        """
+        发布事件到全部订阅者
+        :return: 订阅者数
+        """
+        subscribers = self._subscribers
+        for subscription in subscribers:
+            subscription.offer(event)
+        return len(subscribers)
+
+    def __len__(self):
+        return len(self._subscribers)
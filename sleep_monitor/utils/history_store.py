@@ -0,0 +1,558 @@
+"""
+历史数据存储
+
+将样本和每晚总结保存到SQLite数据库，按 (设备, 时间) 建立索引：
+- 按时间范围和设备查询时只读取需要的行，不加载整个数据文件
+- 游标分页（keyset）：下一页从上一页最后一行之后继续，翻页代价与页码无关
+- 支持只返回需要的字段，以及在数据库中按时间桶降采样
+"""
+import base64
+import json
+import os
+import sqlite3
+import threading
+
+from .time_utils import sample_epoch_ms_column
+
+SAMPLE_FIELDS = ('heart_rate', 'movement', 'sleep_stage', 'provenance')
+
+DEFAULT_DEVICE_ID = 'default'
+DEFAULT_HISTORY_PATH = os.path.join('data', 'history.sqlite3')
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+# 导入数据时每个事务写入的样本数
+IMPORT_BATCH_SIZE = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    device_id TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    heart_rate REAL,
+    movement REAL,
+    sleep_stage TEXT,
+    provenance TEXT,
+    PRIMARY KEY (device_id, ts)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS devices (
+    device_id TEXT PRIMARY KEY,
+    first_ts INTEGER,
+    last_ts INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS summaries (
+    device_id TEXT NOT NULL,
+    night TEXT NOT NULL,
+    start_ts INTEGER,
+    end_ts INTEGER,
+    summary TEXT NOT NULL,
+    PRIMARY KEY (device_id, night)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS reports (
+    device_id TEXT NOT NULL,
+    night TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    report TEXT NOT NULL,
+    PRIMARY KEY (device_id, night)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS night_stats (
+    device_id TEXT NOT NULL,
+    night TEXT NOT NULL,
+    stats TEXT NOT NULL,
+    PRIMARY KEY (device_id, night)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS rollups (
+    device_id TEXT NOT NULL,
+    period TEXT NOT NULL,
+    period_key TEXT NOT NULL,
+    stats TEXT NOT NULL,
+    PRIMARY KEY (device_id, period, period_key)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS profiles (
+    device_id TEXT PRIMARY KEY,
+    profile TEXT NOT NULL
+);
+"""
+
+# 降采样时各字段的聚合方式：数值取平均，阶段和来源取桶内最后一个样本的值
+# （SQLite中与MAX()一起查询的普通列取自最大值所在的行）
+_BUCKET_COLUMNS = {
+    'heart_rate': 'AVG(heart_rate)',
+    'movement': 'AVG(movement)',
+    'sleep_stage': 'sleep_stage',
+    'provenance': 'provenance'
+}
+
+
+def encode_cursor(position):
+    """将分页位置编码为不透明的游标字符串"""
+    text = json.dumps(position, separators=(',', ':'))
+    return base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    解析游标
+    :raises ValueError: 游标无效
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"无效的分页游标: {cursor!r}") from e
+    if not isinstance(position, dict):
+        raise ValueError(f"无效的分页游标: {cursor!r}")
+    return position
+
+
+def _check_limit(limit):
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    limit = int(limit)
+    if limit <= 0:
+        raise ValueError("limit 必须大于0")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def _check_fields(fields):
+    if fields is None:
+        return SAMPLE_FIELDS
+    unknown = [field for field in fields if field not in SAMPLE_FIELDS]
+    if unknown:
+        raise ValueError(f"未知的字段: {', '.join(unknown)}，可用字段: {', '.join(SAMPLE_FIELDS)}")
+    return tuple(field for field in SAMPLE_FIELDS if field in fields)
+
+
+class HistoryStore:
+    """历史数据存储"""
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH):
+        """
+        打开（或创建）历史数据库
+        :param path: 数据库文件路径（每个线程使用自己的连接，因此不支持 ':memory:'）
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        """当前线程的数据库连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        """关闭所有线程的连接"""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+    # ---- 样本 ----
+
+    def add_samples(self, samples, device_id=DEFAULT_DEVICE_ID):
+        """
+        写入样本（同一设备同一时间的样本会被覆盖）
+        :param samples: 样本字典列表，样本中的device_id字段优先于参数
+        :param device_id: 默认设备ID
+        :return: 写入的样本数
+        """
+        samples = list(samples)
+        return self._write_samples(samples, sample_epoch_ms_column(samples).tolist(), device_id)
+
+    def _write_samples(self, samples, timestamps, device_id):
+        """写入样本，timestamps为各样本的时间（epoch毫秒）"""
+        rows = []
+        ranges = {}
+        for sample, ts in zip(samples, timestamps):
+            device = sample.get('device_id') or device_id
+            rows.append((device, ts, sample.get('heart_rate'), sample.get('movement'),
+                         sample.get('sleep_stage'), sample.get('provenance')))
+            first, last = ranges.get(device, (ts, ts))
+            ranges[device] = (min(first, ts), max(last, ts))
+        if not rows:
+            return 0
+
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO samples (device_id, ts, heart_rate, movement, sleep_stage, provenance) '
+                'VALUES (?, ?, ?, ?, ?, ?)', rows)
+            conn.executemany(
+                'INSERT INTO devices (device_id, first_ts, last_ts) VALUES (?, ?, ?) '
+                'ON CONFLICT (device_id) DO UPDATE SET '
+                'first_ts = MIN(first_ts, excluded.first_ts), last_ts = MAX(last_ts, excluded.last_ts)',
+                [(device, first, last) for device, (first, last) in ranges.items()])
+        return len(rows)
+
+    def import_samples(self, samples, device_id=DEFAULT_DEVICE_ID, night=None):
+        """
+        分批导入样本（适合逐条读取的数据文件，不需要一次加载到内存）
+        :param samples: 样本迭代器
+        :param device_id: 设备ID
+        :param night: 夜晚日期（YYYYMMDD），指定时根据导入的样本生成该晚的总结
+        :return: 导入的样本数
+        """
+        count = 0
+        start_ts = end_ts = None
+        batch = []
+
+        def flush():
+            # 每批的时间列整列解析
+            nonlocal count, start_ts, end_ts
+            timestamps = sample_epoch_ms_column(batch)
+            if timestamps.size:
+                first, last = int(timestamps.min()), int(timestamps.max())
+                start_ts = first if start_ts is None else min(start_ts, first)
+                end_ts = last if end_ts is None else max(end_ts, last)
+            count += self._write_samples(batch, timestamps.tolist(), device_id)
+            batch.clear()
+
+        for sample in samples:
+            if 'device_id' not in sample:
+                sample = dict(sample, device_id=device_id)
+            batch.append(sample)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                flush()
+        flush()
+
+        if night is not None and count:
+            summary = self.summarize(device_id, start_ts, end_ts + 1)
+            summary['date'] = night
+            self.put_summary(device_id, night, summary, start_ts, end_ts)
+        return count
+
+    def import_file(self, path, device_id=DEFAULT_DEVICE_ID, night=None):
+        """
+        导入已存储的数据文件（json、jsonl或csv）
+        :return: 导入的样本数
+        """
+        from ..sensors.replay_sensor import iter_stored_samples
+        return self.import_samples(iter_stored_samples(path), device_id, night)
+
+    def query_samples(self, device_id=DEFAULT_DEVICE_ID, start=None, end=None, fields=None,
+                      limit=DEFAULT_PAGE_SIZE, cursor=None, bucket=None):
+        """
+        按时间范围查询样本
+        :param device_id: 设备ID
+        :param start: 开始时间（epoch毫秒，包含）
+        :param end: 结束时间（epoch毫秒，不包含）
+        :param fields: 需要返回的字段（SAMPLE_FIELDS的子集），ts总是返回
+        :param limit: 每页的行数（不超过MAX_PAGE_SIZE）
+        :param cursor: 上一页返回的游标
+        :param bucket: 降采样的时间桶（秒），指定时每个桶返回一行（数值取平均，并返回桶内的样本数count）
+        :return: (行字典列表, 下一页的游标，没有更多数据时为None)
+        :raises ValueError: 参数无效
+        """
+        fields = _check_fields(fields)
+        limit = _check_limit(limit)
+        if cursor is not None:
+            position = decode_cursor(cursor).get('ts')
+            if not isinstance(position, int):
+                raise ValueError(f"无效的分页游标: {cursor!r}")
+            start = position if start is None else max(start, position)
+
+        where = ['device_id = ?']
+        params = [device_id]
+        if start is not None:
+            where.append('ts >= ?')
+            params.append(int(start))
+        if end is not None:
+            where.append('ts < ?')
+            params.append(int(end))
+        where = ' AND '.join(where)
+
+        if bucket is None:
+            columns = ', '.join(('ts',) + fields)
+            sql = f'SELECT {columns} FROM samples WHERE {where} ORDER BY ts LIMIT ?'
+            names = ('ts',) + fields
+            step = 1
+        else:
+            step = int(bucket * 1000)
+            if step <= 0:
+                raise ValueError("bucket 必须大于0")
+            columns = ', '.join(['ts / ? * ? AS bucket_ts', 'MAX(ts)'] + [_BUCKET_COLUMNS[f] for f in fields] + ['COUNT(*)'])
+            sql = (f'SELECT {columns} FROM samples WHERE {where} '
+                   f'GROUP BY bucket_ts ORDER BY bucket_ts LIMIT ?')
+            params = [step, step] + params
+            names = ('ts', None) + fields + ('count',)
+
+        rows = self._connect().execute(sql, params + [limit + 1]).fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor({'ts': rows[-1][0] + step})
+
+        items = [{name: value for name, value in zip(names, row) if name is not None} for row in rows]
+        return items, next_cursor
+
+    def load_columns(self, device_id, start=None, end=None, fields=None):
+        """
+        按列读取时间范围内的全部样本（用于图表和统计的向量化计算）
+        :param start: 开始时间（epoch毫秒，包含）
+        :param end: 结束时间（epoch毫秒，不包含）
+        :param fields: 需要的字段（SAMPLE_FIELDS的子集）
+        :return: {'ts': [...], 字段: [...]}，按时间排序
+        """
+        fields = _check_fields(fields)
+        names = ('ts',) + fields
+        columns = {name: [] for name in names}
+        appends = [columns[name].append for name in names]
+        rows = self._connect().execute(
+            f'SELECT {", ".join(names)} FROM samples WHERE device_id = ? AND ts >= ? AND ts < ? ORDER BY ts',
+            (device_id, start if start is not None else -2 ** 63, end if end is not None else 2 ** 63 - 1))
+        for row in rows:
+            for append, value in zip(appends, row):
+                append(value)
+        return columns
+
+    def summarize(self, device_id, start=None, end=None):
+        """
+        在数据库中统计时间范围内的样本（与DataLogger.get_daily_summary的结果格式相同）
+        :param start: 开始时间（epoch毫秒，包含）
+        :param end: 结束时间（epoch毫秒，不包含）
+        :return: 总结字典
+        """
+        where = 'device_id = ? AND ts >= ? AND ts < ?'
+        params = (device_id, start if start is not None else -2 ** 63, end if end is not None else 2 ** 63 - 1)
+        conn = self._connect()
+        total, avg_hr, max_hr, min_hr, avg_movement = conn.execute(
+            f'SELECT COUNT(*), AVG(heart_rate), MAX(heart_rate), MIN(heart_rate), AVG(movement) '
+            f'FROM samples WHERE {where}', params).fetchone()
+        stages = conn.execute(
+            f'SELECT sleep_stage, COUNT(*) FROM samples WHERE {where} AND sleep_stage IS NOT NULL '
+            f'GROUP BY sleep_stage', params).fetchall()
+        return {
+            'total_records': total,
+            'avg_heart_rate': avg_hr or 0,
+            'max_heart_rate': max_hr or 0,
+            'min_heart_rate': min_hr or 0,
+            'avg_movement': avg_movement or 0,
+            'sleep_stage_distribution': dict(stages)
+        }
+
+    def devices(self):
+        """
+        已存储数据的设备
+        :return: [{'device_id', 'first_ts', 'last_ts'}] 列表
+        """
+        rows = self._connect().execute('SELECT device_id, first_ts, last_ts FROM devices ORDER BY device_id')
+        return [{'device_id': device, 'first_ts': first, 'last_ts': last} for device, first, last in rows]
+
+    # ---- 每晚总结 ----
+
+    def put_summary(self, device_id, night, summary, start_ts=None, end_ts=None):
+        """
+        保存一晚的总结（已存在时替换，该晚已生成的报告同时删除）
+        :param night: 夜晚日期（YYYYMMDD）
+        :param summary: 总结字典
+        :param start_ts: 该晚第一个样本的时间（epoch毫秒）
+        :param end_ts: 该晚最后一个样本的时间（epoch毫秒）
+        """
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO summaries (device_id, night, start_ts, end_ts, summary) VALUES (?, ?, ?, ?, ?)',
+                (device_id, night, start_ts, end_ts, json.dumps(summary, ensure_ascii=False)))
+            conn.execute('DELETE FROM reports WHERE device_id = ? AND night = ?', (device_id, night))
+
+    def get_summary(self, device_id, night):
+        """一晚的总结，不存在时返回None"""
+        row = self._connect().execute(
+            'SELECT summary FROM summaries WHERE device_id = ? AND night = ?', (device_id, night)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_night(self, device_id, night=None):
+        """
+        一晚的时间范围和总结
+        :param night: 夜晚日期（YYYYMMDD），None时为最近一晚
+        :return: {'night', 'start_ts', 'end_ts', 'summary'}，不存在时返回None
+        """
+        if night is None:
+            row = self._connect().execute(
+                'SELECT night, start_ts, end_ts, summary FROM summaries WHERE device_id = ? '
+                'ORDER BY night DESC LIMIT 1', (device_id,)).fetchone()
+        else:
+            row = self._connect().execute(
+                'SELECT night, start_ts, end_ts, summary FROM summaries WHERE device_id = ? AND night = ?',
+                (device_id, night)).fetchone()
+        if row is None:
+            return None
+        night, start_ts, end_ts, summary = row
+        return {'night': night, 'start_ts': start_ts, 'end_ts': end_ts, 'summary': json.loads(summary)}
+
+    # ---- 每晚报告 ----
+
+    def put_report(self, device_id, night, report):
+        """保存一晚的报告（已存在时替换）"""
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO reports (device_id, night, version, report) VALUES (?, ?, ?, ?)',
+                (device_id, night, report.get('version', 0), json.dumps(report, ensure_ascii=False)))
+
+    def get_report(self, device_id, night):
+        """一晚的报告（按主键读取），不存在时返回None"""
+        row = self._connect().execute(
+            'SELECT report FROM reports WHERE device_id = ? AND night = ?', (device_id, night)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def nights_without_report(self, device_id=None, version=None):
+        """
+        有总结但还没有报告的夜晚
+        :param device_id: 只查询该设备，默认查询全部设备
+        :param version: 报告版本低于该值的夜晚也包括在内
+        :return: [(设备ID, 夜晚)] 列表
+        """
+        sql = ('SELECT s.device_id, s.night FROM summaries s LEFT JOIN reports r '
+               'ON r.device_id = s.device_id AND r.night = s.night '
+               'WHERE (r.night IS NULL OR r.version < ?)')
+        params = [version if version is not None else 0]
+        if device_id is not None:
+            sql += ' AND s.device_id = ?'
+            params.append(device_id)
+        return self._connect().execute(sql + ' ORDER BY s.device_id, s.night', params).fetchall()
+
+    # ---- 趋势汇总 ----
+
+    def put_night_stats(self, device_id, night, stats):
+        """保存一晚的可合并汇总"""
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO night_stats (device_id, night, stats) VALUES (?, ?, ?)',
+                         (device_id, night, json.dumps(stats)))
+
+    def get_night_stats(self, device_id, start, end):
+        """
+        日期范围内各晚的汇总
+        :param start: 开始日期（YYYYMMDD，包含）
+        :param end: 结束日期（YYYYMMDD，包含）
+        :return: [(夜晚, 汇总字典)] 列表
+        """
+        rows = self._connect().execute(
+            'SELECT night, stats FROM night_stats WHERE device_id = ? AND night >= ? AND night <= ? ORDER BY night',
+            (device_id, start, end))
+        return [(night, json.loads(stats)) for night, stats in rows]
+
+    def put_rollup(self, device_id, period, key, stats):
+        """保存一个周期（周或月）的汇总"""
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO rollups (device_id, period, period_key, stats) VALUES (?, ?, ?, ?)',
+                         (device_id, period, key, json.dumps(stats)))
+
+    def get_rollup(self, device_id, period, key):
+        """一个周期的汇总，不存在时返回None"""
+        row = self._connect().execute(
+            'SELECT stats FROM rollups WHERE device_id = ? AND period = ? AND period_key = ?',
+            (device_id, period, key)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def query_rollups(self, device_id, period, start_key=None, end_key=None):
+        """
+        按周期键的范围查询汇总
+        :return: [(周期键, 汇总字典)] 列表，按周期键排序
+        """
+        where = ['device_id = ?', 'period = ?']
+        params = [device_id, period]
+        if start_key is not None:
+            where.append('period_key >= ?')
+            params.append(start_key)
+        if end_key is not None:
+            where.append('period_key <= ?')
+            params.append(end_key)
+        rows = self._connect().execute(
+            f'SELECT period_key, stats FROM rollups WHERE {" AND ".join(where)} ORDER BY period_key', params)
+        return [(key, json.loads(stats)) for key, stats in rows]
+
+    def recent_nights(self, device_id, limit):
+        """
+        最近的若干晚
+        :return: [{'night', 'start_ts', 'end_ts'}] 列表，从最近一晚开始
+        """
+        rows = self._connect().execute(
+            'SELECT night, start_ts, end_ts FROM summaries WHERE device_id = ? ORDER BY night DESC LIMIT ?',
+            (device_id, limit))
+        return [{'night': night, 'start_ts': start_ts, 'end_ts': end_ts} for night, start_ts, end_ts in rows]
+
+    # ---- 校准档案 ----
+
+    def put_profile(self, device_id, profile):
+        """保存设备的校准档案（已存在时替换）"""
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO profiles (device_id, profile) VALUES (?, ?)',
+                         (device_id, json.dumps(profile, ensure_ascii=False)))
+
+    def get_profile(self, device_id):
+        """设备的校准档案，不存在时返回None"""
+        row = self._connect().execute('SELECT profile FROM profiles WHERE device_id = ?', (device_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def query_summaries(self, device_id=DEFAULT_DEVICE_ID, start=None, end=None, limit=DEFAULT_PAGE_SIZE, cursor=None):
+        """
+        按日期范围查询每晚总结
+        :param start: 开始日期（YYYYMMDD，包含）
+        :param end: 结束日期（YYYYMMDD，包含）
+        :param limit: 每页的行数
+        :param cursor: 上一页返回的游标
+        :return: (总结列表, 下一页的游标，没有更多数据时为None)
+        :raises ValueError: 参数无效
+        """
+        limit = _check_limit(limit)
+        where = ['device_id = ?']
+        params = [device_id]
+        if cursor is not None:
+            after = decode_cursor(cursor).get('night')
+            if not isinstance(after, str):
+                raise ValueError(f"无效的分页游标: {cursor!r}")
+            where.append('night > ?')
+            params.append(after)
+        if start is not None:
+            where.append('night >= ?')
+            params.append(start)
+        if end is not None:
+            where.append('night <= ?')
+            params.append(end)
+
+        rows = self._connect().execute(
+            f'SELECT night, start_ts, end_ts, summary FROM summaries WHERE {" AND ".join(where)} '
+            f'ORDER BY night LIMIT ?', params + [limit + 1]).fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor({'night': rows[-1][0]})
+
+        items = [{'night': night, 'start_ts': start_ts, 'end_ts': end_ts, 'summary': json.loads(summary)}
+                 for night, start_ts, end_ts, summary in rows]
+        return items, next_cursor
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def get_history_store(config=None):
+    """
+    进程内共享的历史数据存储，第一次调用时打开
+    :param config: 配置参数，数据库位置由 device_settings.history_path 指定（默认为DEFAULT_HISTORY_PATH）
+    """
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            path = (config or {}).get('device_settings', {}).get('history_path', DEFAULT_HISTORY_PATH)
+            _default_store = HistoryStore(path)
+        return _default_store
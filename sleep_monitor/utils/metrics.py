@@ -0,0 +1,375 @@
+"""
+运行指标
+
+低开销的计数器、仪表和直方图，以Prometheus文本格式导出（API的/metrics接口）
+
+热路径上的用法：
+- 指标在模块加载时创建一次，带标签的指标通过labels()取得子指标后缓存使用
+- 记录一次数据只是加锁后更新几个数字，直方图用二分查找定位桶，累计计数在导出时才计算
+- 仪表可以设置为回调函数，只在导出时读取（如队列长度）
+"""
+import bisect
+import math
+import threading
+
+
+# 默认的延迟直方图桶（秒），覆盖微秒级的检测到秒级的网络请求
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 写入字节数使用的桶
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _format_value(value):
+    """按Prometheus文本格式输出数值"""
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value):
+    """转义标签值"""
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    """生成标签部分，如 {endpoint="/api/status",method="GET"}"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    """指标基类，管理带标签的子指标"""
+
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """
+        取得标签值对应的子指标（热路径上应缓存返回值）
+        :param values: 按labelnames顺序的标签值
+        """
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}")
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _unlabelled(self):
+        if self.labelnames:
+            raise ValueError(f"指标 {self.name} 带有标签，请先调用labels()")
+        return self._children[()]
+
+    def reset(self):
+        """清空所有数据"""
+        with self._lock:
+            self._children = {} if self.labelnames else {(): self._new_child()}
+
+    def collect(self):
+        """生成导出的文本行"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        for values, child in sorted(self._children.copy().items()):
+            lines.extend(self._child_lines(values, child))
+        return lines
+
+    def _child_lines(self, values, child):
+        raise NotImplementedError
+
+
+class _CounterChild:
+    """单个计数器"""
+
+    __slots__ = ('_value', '_lock')
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        """增加计数"""
+        if amount < 0:
+            raise ValueError("计数器只能增加")
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    type_name = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        """增加计数（无标签的指标）"""
+        self._unlabelled().inc(amount)
+
+    @property
+    def value(self):
+        return self._unlabelled().value
+
+    def _child_lines(self, values, child):
+        return [f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}']
+
+
+class _GaugeChild:
+    """单个仪表"""
+
+    __slots__ = ('_value', '_lock', '_function')
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+        self._function = None
+
+    def set(self, value):
+        """设置数值"""
+        self._value = value
+
+    def inc(self, amount=1):
+        """增加数值"""
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        """减少数值"""
+        self.inc(-amount)
+
+    def set_function(self, function):
+        """
+        设置回调函数，导出时调用它读取数值
+        :param function: 无参数函数，返回None时不导出该数值
+        """
+        self._function = function
+
+    @property
+    def value(self):
+        if self._function is not None:
+            try:
+                return self._function()
+            except Exception:
+                return None
+        return self._value
+
+
+class Gauge(_Metric):
+    """可增可减的仪表"""
+
+    type_name = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        """设置数值（无标签的指标）"""
+        self._unlabelled().set(value)
+
+    def inc(self, amount=1):
+        """增加数值（无标签的指标）"""
+        self._unlabelled().inc(amount)
+
+    def dec(self, amount=1):
+        """减少数值（无标签的指标）"""
+        self._unlabelled().dec(amount)
+
+    def set_function(self, function):
+        """设置导出时调用的回调函数（无标签的指标）"""
+        self._unlabelled().set_function(function)
+
+    @property
+    def value(self):
+        return self._unlabelled().value
+
+    def _child_lines(self, values, child):
+        value = child.value
+        if value is None:
+            return []
+        return [f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}']
+
+
+class _HistogramChild:
+    """单个直方图"""
+
+    __slots__ = ('_upper_bounds', '_counts', '_sum', '_lock')
+
+    def __init__(self, upper_bounds):
+        self._upper_bounds = upper_bounds
+        self._counts = [0] * (len(upper_bounds) + 1)  # 最后一个为+Inf桶
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """记录一个观测值"""
+        index = bisect.bisect_left(self._upper_bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self):
+        """
+        读取当前数据
+        :return: (各桶的累计计数, 总和, 总数)
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = []
+        running = 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total, running
+
+    @property
+    def count(self):
+        return sum(self._counts)
+
+    @property
+    def sum(self):
+        return self._sum
+
+
+class Histogram(_Metric):
+    """分桶直方图，用于延迟和大小"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """
+        :param buckets: 桶的上界（递增），+Inf桶自动添加
+        """
+        buckets = tuple(float(bound) for bound in buckets)
+        if list(buckets) != sorted(set(buckets)):
+            raise ValueError("直方图的桶必须严格递增")
+        if buckets and buckets[-1] == math.inf:
+            buckets = buckets[:-1]
+        self.buckets = buckets
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        """记录一个观测值（无标签的指标）"""
+        self._unlabelled().observe(value)
+
+    @property
+    def count(self):
+        return self._unlabelled().count
+
+    @property
+    def sum(self):
+        return self._unlabelled().sum
+
+    def _child_lines(self, values, child):
+        cumulative, total, count = child.snapshot()
+        lines = []
+        for bound, bucket_count in zip(self.buckets + (math.inf,), cumulative):
+            labels = _format_labels(self.labelnames, values, ('le', _format_value(bound)))
+            lines.append(f'{self.name}_bucket{labels} {bucket_count}')
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+        lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        """同名指标只创建一次，重复创建时类型和标签必须一致"""
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, labelnames, **kwargs)
+                self._metrics[name] = metric
+            elif type(metric) is not cls or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"指标 {name} 已经以不同的类型或标签注册")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        """取得或创建计数器"""
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        """取得或创建仪表"""
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """取得或创建直方图"""
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name):
+        """按名称取得指标，不存在时返回None"""
+        return self._metrics.get(name)
+
+    def reset(self):
+        """清空所有指标的数据（测试使用）"""
+        for metric in list(self._metrics.values()):
+            metric.reset()
+
+    def render(self):
+        """
+        以Prometheus文本格式（0.0.4）导出所有指标
+        :return: 文本
+        """
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].collect())
+        return '\n'.join(lines) + '\n'
+
+
+# 全局注册表
+REGISTRY = MetricsRegistry()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def counter(name, documentation, labelnames=()):
+    """在全局注册表中取得或创建计数器"""
+    return REGISTRY.counter(name, documentation, labelnames)
+
+
+def gauge(name, documentation, labelnames=()):
+    """在全局注册表中取得或创建仪表"""
+    return REGISTRY.gauge(name, documentation, labelnames)
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    """在全局注册表中取得或创建直方图"""
+    return REGISTRY.histogram(name, documentation, labelnames, buckets)
+
+
+def render():
+    """导出全局注册表"""
+    return REGISTRY.render()
@@ -0,0 +1,174 @@
+"""
+可合并的分位数草图（KLL）
+
+用有限的内存近似任意数量数值的分布：
+- 数值先进入第0层，某一层满时排序后隔一个取一个提升到上一层（上一层每个数值代表两倍的数量）
+- 各层容量从顶层的k向下按2/3递减，总大小约为3k，与数值数量无关
+- 两个草图可以直接合并（按层拼接后压缩），分位数的秩误差约为 1.7/k
+"""
+import math
+import random
+
+DEFAULT_K = 128
+
+# 相邻层容量的比例
+CAPACITY_RATIO = 2 / 3
+
+# 序列化时保留的小数位数
+SERIALIZE_DIGITS = 2
+
+
+class KLLSketch:
+    """KLL分位数草图"""
+
+    def __init__(self, k=DEFAULT_K, seed=None):
+        """
+        :param k: 顶层容量，越大越精确
+        :param seed: 压缩时随机选择奇偶位置的随机数种子
+        """
+        self.k = k
+        self.count = 0
+        self.minimum = None
+        self.maximum = None
+        self.levels = [[]]
+        self._size = 0
+        self._rng = random.Random(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return int(math.ceil(self.k * CAPACITY_RATIO ** depth)) + 1
+
+    def _max_size(self):
+        return sum(self._capacity(level) for level in range(len(self.levels)))
+
+    def update(self, value):
+        """加入一个数值"""
+        self.update_many((value,))
+
+    def update_many(self, values):
+        """
+        加入一组数值（None和NaN忽略）
+        :param values: 数值序列或numpy数组
+        """
+        level0 = self.levels[0]
+        limit = self._max_size()
+        for value in values:
+            if value is None or value != value:
+                continue
+            value = float(value)
+            level0.append(value)
+            self.count += 1
+            self._size += 1
+            if self.minimum is None or value < self.minimum:
+                self.minimum = value
+            if self.maximum is None or value > self.maximum:
+                self.maximum = value
+            if self._size >= limit:
+                self._compress()
+                level0 = self.levels[0]
+                limit = self._max_size()
+
+    def _compress(self):
+        """从底层开始，把超过容量的层压缩一半到上一层，直到总大小低于上限"""
+        for level in range(len(self.levels)):
+            items = self.levels[level]
+            if len(items) < self._capacity(level):
+                continue
+            if level + 1 == len(self.levels):
+                self.levels.append([])
+            items.sort()
+            # 奇数个时保留最后一个在本层，其余隔一个取一个提升
+            keep = [items.pop()] if len(items) % 2 else []
+            offset = self._rng.randint(0, 1)
+            self.levels[level + 1].extend(items[offset::2])
+            self.levels[level] = keep
+            self._size = sum(len(items) for items in self.levels)
+            if self._size < self._max_size():
+                break
+
+    def merge(self, other):
+        """
+        合并另一个草图
+        :return: self
+        """
+        if other.count == 0:
+            return self
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.count += other.count
+        for value in (other.minimum, other.maximum):
+            if self.minimum is None or value < self.minimum:
+                self.minimum = value
+            if self.maximum is None or value > self.maximum:
+                self.maximum = value
+        self._size = sum(len(items) for items in self.levels)
+        while self._size >= self._max_size():
+            self._compress()
+        return self
+
+    def _weighted(self):
+        """按数值排序的 (数值, 权重) 列表，第h层的数值权重为2^h"""
+        return sorted((value, 1 << level) for level, items in enumerate(self.levels) for value in items)
+
+    def quantiles(self, qs):
+        """
+        估计多个分位数
+        :param qs: 0到1之间的分位点列表
+        :return: 对应的数值列表，草图为空时为None
+        """
+        if self.count == 0:
+            return [None for _ in qs]
+        weighted = self._weighted()
+        total = sum(weight for _, weight in weighted)
+        results = []
+        for q in qs:
+            if q <= 0:
+                results.append(self.minimum)
+                continue
+            if q >= 1:
+                results.append(self.maximum)
+                continue
+            target = q * total
+            seen = 0
+            for value, weight in weighted:
+                seen += weight
+                if seen >= target:
+                    results.append(value)
+                    break
+            else:
+                results.append(self.maximum)
+        return results
+
+    def quantile(self, q):
+        """估计一个分位数"""
+        return self.quantiles((q,))[0]
+
+    def rank(self, value):
+        """估计不大于value的数值所占的比例"""
+        if self.count == 0:
+            return None
+        weighted = self._weighted()
+        total = sum(weight for _, weight in weighted)
+        return sum(weight for item, weight in weighted if item <= value) / total
+
+    def to_dict(self):
+        """序列化为紧凑的字典（数值保留SERIALIZE_DIGITS位小数）"""
+        return {
+            'k': self.k,
+            'n': self.count,
+            'min': self.minimum,
+            'max': self.maximum,
+            'levels': [[round(value, SERIALIZE_DIGITS) for value in items] for items in self.levels]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['k'])
+        sketch.count = data['n']
+        sketch.minimum = data['min']
+        sketch.maximum = data['max']
+        sketch.levels = [list(items) for items in data['levels']] or [[]]
+        sketch._size = sum(len(items) for items in sketch.levels)
+        return sketch
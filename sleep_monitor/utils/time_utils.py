@@ -4,9 +4,21 @@
 提供时间相关的工具函数
 """
 from datetime import datetime, timedelta
+from functools import lru_cache
 import time
 
 
+def parse_iso(text):
+    """
+    解析ISO 8601时间字符串
+    :param text: 时间字符串，支持以Z结尾的UTC时间
+    :return: datetime对象
+    """
+    if text.endswith('Z'):
+        text = text[:-1] + '+00:00'
+    return datetime.fromisoformat(text)
+
+
 def format_timestamp(timestamp, format_str="%Y-%m-%d %H:%M:%S"):
     """
     格式化时间戳
@@ -17,7 +29,7 @@ def format_timestamp(timestamp, format_str="%Y-%m-%d %H:%M:%S"):
     if isinstance(timestamp, str):
         # 如果是字符串，尝试解析
         try:
-            timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+            timestamp = parse_iso(timestamp)
         except ValueError:
             return timestamp
     
@@ -35,9 +47,9 @@ def time_diff_minutes(start_time, end_time):
     :return: 分钟差
     """
     if isinstance(start_time, str):
-        start_time = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
+        start_time = parse_iso(start_time)
     if isinstance(end_time, str):
-        end_time = datetime.fromisoformat(end_time.replace('Z', '+00:00'))
+        end_time = parse_iso(end_time)
     
     diff = end_time - start_time
     return int(diff.total_seconds() / 60)
@@ -64,18 +76,23 @@ def get_sleep_cycle_times(start_time, duration_minutes=480):
     :param duration_minutes: 睡眠持续时间（分钟），默认8小时
     :return: 睡眠周期时间点列表
     """
+    return list(iter_sleep_cycle_times(start_time, duration_minutes))
+
+
+def iter_sleep_cycle_times(start_time, duration_minutes=480):
+    """
+    惰性计算睡眠周期时间
+    :param start_time: 睡眠开始时间
+    :param duration_minutes: 睡眠持续时间（分钟），默认8小时
+    :return: TimeRange，按需生成睡眠周期时间点
+    """
     if isinstance(start_time, str):
-        start_time = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
+        start_time = parse_iso(start_time)
     
-    cycle_times = []
     # 一个睡眠周期约为90分钟
     cycle_length = 90
-    
-    for i in range(0, duration_minutes, cycle_length):
-        cycle_time = start_time + timedelta(minutes=i)
-        cycle_times.append(cycle_time)
-    
-    return cycle_times
+    count = len(range(0, duration_minutes, cycle_length))
+    return TimeRange(start_time, timedelta(minutes=cycle_length), count)
 
 
 def get_optimal_wake_time(sleep_start_time, min_sleep_hours=6, max_sleep_hours=9):
@@ -87,7 +104,7 @@ def get_optimal_wake_time(sleep_start_time, min_sleep_hours=6, max_sleep_hours=9
     :return: 最佳唤醒时间列表
     """
     if isinstance(sleep_start_time, str):
-        sleep_start_time = datetime.fromisoformat(sleep_start_time.replace('Z', '+00:00'))
+        sleep_start_time = parse_iso(sleep_start_time)
     
     optimal_times = []
     
@@ -116,7 +133,7 @@ def timestamp_to_local(timestamp):
     :return: 本地时间datetime对象
     """
     if isinstance(timestamp, str):
-        return datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        return parse_iso(timestamp)
     elif isinstance(timestamp, (int, float)):
         return datetime.fromtimestamp(timestamp)
     else:
@@ -131,16 +148,314 @@ def get_time_range(start_time, end_time, interval_minutes=1):
     :param interval_minutes: 时间间隔（分钟）
     :return: 时间点列表
     """
+    return list(iter_time_range(start_time, end_time, interval_minutes))
+
+
+def iter_time_range(start_time, end_time, interval_minutes=1):
+    """
+    惰性获取时间范围内的所有时间点（包含结束时间）
+    :param start_time: 开始时间
+    :param end_time: 结束时间
+    :param interval_minutes: 时间间隔（分钟）
+    :return: TimeRange，可以迭代、切片或转换为datetime64数组，不会一次生成全部datetime对象
+    """
     if isinstance(start_time, str):
-        start_time = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
+        start_time = parse_iso(start_time)
     if isinstance(end_time, str):
-        end_time = datetime.fromisoformat(end_time.replace('Z', '+00:00'))
+        end_time = parse_iso(end_time)
+    
+    step = timedelta(minutes=interval_minutes)
+    if step <= timedelta(0):
+        raise ValueError("时间间隔必须大于0")
+    count = (end_time - start_time) // step + 1 if end_time >= start_time else 0
+    return TimeRange(start_time, step, count)
+
+
+class TimeRange:
+    """
+    等间隔时间点序列，类似range：只保存开始时间、间隔和数量，按需计算每个时间点
+    """
+    
+    def __init__(self, start, step, count):
+        """
+        :param start: 第一个时间点
+        :param step: 时间间隔（timedelta）
+        :param count: 时间点数量
+        """
+        self.start = start
+        self.step = step
+        self.count = max(0, count)
+    
+    def __len__(self):
+        return self.count
     
-    time_range = []
-    current_time = start_time
+    def __iter__(self):
+        current = self.start
+        for _ in range(self.count):
+            yield current
+            current += self.step
     
-    while current_time <= end_time:
-        time_range.append(current_time)
-        current_time += timedelta(minutes=interval_minutes)
+    def __getitem__(self, index):
+        positions = range(self.count)[index]
+        if isinstance(index, slice):
+            start = self.start + self.step * positions.start if positions else self.start
+            return TimeRange(start, self.step * positions.step, len(positions))
+        return self.start + self.step * positions
     
-    return time_range
\ No newline at end of file
+    def __repr__(self):
+        return f"TimeRange(start={self.start!r}, step={self.step!r}, count={self.count})"
+    
+    @property
+    def step_ms(self):
+        """时间间隔（毫秒）"""
+        return self.step // timedelta(milliseconds=1)
+    
+    def as_datetime64(self):
+        """
+        转换为datetime64[ms]数组（np.arange），带时区的时间按其本地时间表示
+        :return: numpy数组
+        """
+        import numpy as np
+        
+        start = np.datetime64(self.start.replace(tzinfo=None), 'ms')
+        return start + np.arange(self.count, dtype=np.int64) * np.timedelta64(self.step_ms, 'ms')
+    
+    def as_epoch_ms(self):
+        """
+        转换为epoch毫秒数组
+        :return: int64数组
+        """
+        import numpy as np
+        
+        if self.start.tzinfo is not None:
+            return to_epoch_ms(self.start) + np.arange(self.count, dtype=np.int64) * self.step_ms
+        return local_datetime64_to_epoch_ms(self.as_datetime64())
+
+
+def time_range_array(start_time, end_time, interval_minutes=1):
+    """
+    获取时间范围内所有时间点的datetime64数组（包含结束时间）
+    :param start_time: 开始时间
+    :param end_time: 结束时间
+    :param interval_minutes: 时间间隔（分钟）
+    :return: datetime64[ms]数组
+    """
+    return iter_time_range(start_time, end_time, interval_minutes).as_datetime64()
+
+
+def sleep_cycle_time_array(start_time, duration_minutes=480):
+    """
+    获取睡眠周期时间点的datetime64数组
+    :param start_time: 睡眠开始时间
+    :param duration_minutes: 睡眠持续时间（分钟）
+    :return: datetime64[ms]数组
+    """
+    return iter_sleep_cycle_times(start_time, duration_minutes).as_datetime64()
+
+
+# 内部时间表示：epoch毫秒整数。ISO字符串只在API边界（存储、接口返回）解析和生成
+def now_ms():
+    """当前时间的epoch毫秒"""
+    return time.time_ns() // 1000000
+
+
+def datetime_to_epoch_ms(moment):
+    """将datetime对象（不带时区时按本地时间）转换为epoch毫秒"""
+    return int(moment.replace(microsecond=0).timestamp()) * 1000 + moment.microsecond // 1000
+
+
+def iso_to_epoch_ms(text):
+    """
+    将ISO 8601时间字符串转换为epoch毫秒
+    :param text: 时间字符串，不带时区时按本地时间处理
+    :return: epoch毫秒
+    """
+    return datetime_to_epoch_ms(parse_iso(text))
+
+
+def to_epoch_ms(value):
+    """
+    将各种时间表示转换为epoch毫秒
+    :param value: ISO字符串、datetime对象或epoch秒（int/float）
+    :return: epoch毫秒
+    """
+    if isinstance(value, str):
+        return iso_to_epoch_ms(value)
+    if isinstance(value, datetime):
+        return datetime_to_epoch_ms(value)
+    return int(value * 1000)
+
+
+def sample_epoch_ms(sensor_data):
+    """
+    获取样本时间（epoch毫秒）
+    优先使用采集时记录的ts字段，其次解析timestamp（ISO字符串或epoch秒），都没有时使用当前时间
+    :param sensor_data: 传感器数据
+    :return: epoch毫秒
+    """
+    ts = sensor_data.get('ts')
+    if ts is not None:
+        return ts
+    timestamp = sensor_data.get('timestamp')
+    if timestamp is None:
+        return now_ms()
+    return to_epoch_ms(timestamp)
+
+
+def sample_timestamp(sensor_data):
+    """
+    样本时间的ISO字符串（API和文件边界使用）
+    传感器只记录ts字段，需要输出时才格式化；已有ISO字符串的timestamp字段时直接使用
+    :param sensor_data: 传感器数据
+    :return: ISO时间字符串
+    """
+    timestamp = sensor_data.get('timestamp')
+    if isinstance(timestamp, str):
+        return timestamp
+    return epoch_ms_to_iso(sample_epoch_ms(sensor_data))
+
+
+def with_timestamp(sensor_data):
+    """
+    输出前补上ISO时间字段：样本只有ts字段时返回加上timestamp字段的副本，否则返回原样本
+    :param sensor_data: 传感器数据
+    :return: 包含timestamp字段的传感器数据
+    """
+    if 'timestamp' in sensor_data or 'ts' not in sensor_data:
+        return sensor_data
+    return dict(sensor_data, timestamp=epoch_ms_to_iso(sensor_data['ts']))
+
+
+def epoch_ms_to_datetime(ms):
+    """将epoch毫秒转换为本地时间datetime对象"""
+    return datetime.fromtimestamp(ms // 1000).replace(microsecond=ms % 1000 * 1000)
+
+
+def epoch_ms_to_iso(ms):
+    """将epoch毫秒转换为本地时间ISO字符串（API边界使用）"""
+    return epoch_ms_to_datetime(ms).isoformat()
+
+
+@lru_cache(maxsize=4096)
+def _local_offset_ms(hour):
+    """本地时间整点（epoch小时数，按本地时间的字段计算）相对UTC的偏移（毫秒）"""
+    fields = time.gmtime(hour * 3600)[:6]
+    return hour * 3600000 - int(time.mktime(fields + (0, 0, -1))) * 1000
+
+
+@lru_cache(maxsize=4096)
+def _utc_offset_ms(hour):
+    """UTC整点（epoch小时数）所在时刻的本地时区偏移（毫秒）"""
+    return time.localtime(hour * 3600).tm_gmtoff * 1000
+
+
+def _offsets(hours, offset_of):
+    """按小时去重后计算时区偏移，再展开到每个元素"""
+    import numpy as np
+
+    unique_hours, inverse = np.unique(hours, return_inverse=True)
+    offsets = np.fromiter((offset_of(int(hour)) for hour in unique_hours), dtype=np.int64, count=len(unique_hours))
+    return offsets[inverse].reshape(np.shape(hours))
+
+
+def local_datetime64_to_epoch_ms(values):
+    """
+    将表示本地时间的datetime64数组转换为epoch毫秒数组
+    :param values: datetime64数组（本地时间）
+    :return: int64数组
+    """
+    import numpy as np
+
+    wall_ms = np.asarray(values, dtype='datetime64[ms]').astype(np.int64)
+    return wall_ms - _offsets(wall_ms // 3600000, _local_offset_ms)
+
+
+def epoch_ms_to_local_datetime64(values):
+    """
+    将epoch毫秒数组转换为表示本地时间的datetime64数组
+    :param values: epoch毫秒数组
+    :return: datetime64[ms]数组（本地时间）
+    """
+    import numpy as np
+
+    epoch_ms = np.asarray(values, dtype=np.int64)
+    return (epoch_ms + _offsets(epoch_ms // 3600000, _utc_offset_ms)).astype('datetime64[ms]')
+
+
+def parse_timestamps(column):
+    """
+    批量将时间列转换为epoch毫秒
+    ISO字符串整列交给numpy解析（不逐个调用fromisoformat），Z和 ±HH:MM 时区后缀整列识别一次后去掉并换算，
+    没有时区的按本地时间处理；numpy无法解析的格式（如紧凑格式）逐个转换
+    :param column: ISO时间字符串序列、epoch秒序列，或表示本地时间的datetime64数组
+    :return: int64数组
+    """
+    import numpy as np
+
+    if isinstance(column, np.ndarray) and np.issubdtype(column.dtype, np.datetime64):
+        return local_datetime64_to_epoch_ms(column)
+    values = np.asarray(column)
+    if values.dtype.kind in 'iuf':
+        return (values * 1000).astype(np.int64)
+    if values.dtype.kind != 'U' or not values.size:
+        return np.fromiter((to_epoch_ms(value) for value in column), dtype=np.int64)
+
+    # 每个字符串按字符展开为二维数组（末尾以空字符补齐），按长度定位时区后缀
+    values = np.ascontiguousarray(values.ravel())
+    chars = values.view('U1').reshape(values.size, -1).copy()
+    codes = chars.view(np.int32)
+    lengths = np.char.str_len(values)
+    rows = np.arange(values.size)
+
+    def char_at(offset):
+        return codes[rows, np.maximum(lengths - offset, 0)]
+
+    utc = char_at(1) == ord('Z')
+    sign = char_at(6)
+    offset = ((sign == ord('+')) | (sign == ord('-'))) & (char_at(3) == ord(':')) & (lengths > 10)
+    digits = [char_at(position) - ord('0') for position in (5, 4, 2, 1)]
+    offset_ms = ((digits[0] * 10 + digits[1]) * 60 + digits[2] * 10 + digits[3]) * 60000
+    offset_ms = np.where(offset, np.where(sign == ord('-'), -offset_ms, offset_ms), 0).astype(np.int64)
+
+    # 去掉后缀：把后缀位置的字符置为空字符
+    for position in range(1, 7):
+        suffix = (utc & (position == 1)) | offset
+        if suffix.any():
+            chars[rows[suffix], lengths[suffix] - position] = ''
+    try:
+        wall = chars.view(values.dtype).ravel().astype('datetime64[ms]')
+    except ValueError:
+        return np.fromiter((to_epoch_ms(value) for value in column), dtype=np.int64)
+
+    aware = utc | offset
+    if aware.all():
+        return wall.astype(np.int64) - offset_ms
+    result = local_datetime64_to_epoch_ms(wall)
+    if aware.any():
+        result[aware] = wall[aware].astype(np.int64) - offset_ms[aware]
+    return result
+
+
+def sample_epoch_ms_column(samples):
+    """
+    批量获取样本时间（epoch毫秒），与逐个调用sample_epoch_ms的结果相同，timestamp列整列解析
+    :param samples: 传感器数据列表
+    :return: int64数组
+    """
+    import numpy as np
+
+    result = np.empty(len(samples), dtype=np.int64)
+    missing = []
+    for i, sample in enumerate(samples):
+        ts = sample.get('ts')
+        if ts is None:
+            missing.append(i)
+        else:
+            result[i] = ts
+    if missing:
+        timestamps = [samples[i].get('timestamp') for i in missing]
+        if all(isinstance(timestamp, str) for timestamp in timestamps):
+            result[missing] = parse_timestamps(timestamps)
+        else:
+            result[missing] = [sample_epoch_ms(samples[i]) for i in missing]
+    return result